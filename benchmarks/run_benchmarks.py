@@ -0,0 +1,266 @@
+"""
+Benchmarks of the helper commands and methods against synthetic migration histories.
+
+Each scenario generates, in a temporary directory, a set of fake apps with migration packages and a local SQLite
+database whose django_migrations table holds one record per migration, applied in an interleaved order across the
+apps (with cross-app dependencies). The hot paths (squash_migrations, previous_record, the record index, the
+migration_records output, the rollback planner and the commands) are then timed and their queries counted.
+
+Usage (from the root of the repository)::
+
+    python benchmarks/run_benchmarks.py --output bench_output.json
+    python benchmarks/run_benchmarks.py --scenario 100000:500 --repeat 1
+
+Scenarios run in child processes of their own (Django can only be set up once per process). The results are written
+as JSON so that runs of different releases can be compared.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_SCENARIOS = ['1000:10', '10000:100']
+APP_PREFIX = 'bench_app_'
+CROSS_APP_DEPENDENCY_RATE = 0.1
+
+
+def generate_history(rows: int, app_count: int, seed: int) -> List[Tuple[str, str, List[Tuple[str, str]]]]:
+    """
+    Generates the migrations of the scenario, in the order they are applied: (app, name, dependencies).
+    Apps are applied in bursts of random length so that their records are interleaved.
+    """
+    rng = random.Random(seed)
+    apps = [f'{APP_PREFIX}{i}' for i in range(app_count)]
+    counts = {app: 0 for app in apps}
+    latest = {}  # type: Dict[str, str]
+    history = []
+    while len(history) < rows:
+        app = rng.choice(apps)
+        for _ in range(rng.randint(1, 5)):
+            if len(history) >= rows:
+                break
+            counts[app] += 1
+            name = f'{counts[app]:04d}_auto'
+            dependencies = [(app, latest[app])] if app in latest else []
+            others = [other for other in latest if other != app]
+            if others and rng.random() < CROSS_APP_DEPENDENCY_RATE:
+                other = rng.choice(others)
+                dependencies.append((other, latest[other]))
+            latest[app] = name
+            history.append((app, name, dependencies))
+    return history
+
+
+def write_apps(root: Path, history: List[Tuple[str, str, List[Tuple[str, str]]]]) -> List[str]:
+    """
+    Writes the fake apps and their migration packages under the root directory.
+
+    :returns: the names of the apps
+    """
+    apps = []
+    for app, name, dependencies in history:
+        migrations_dir = root / app / 'migrations'
+        if app not in apps:
+            apps.append(app)
+            migrations_dir.mkdir(parents=True)
+            (root / app / '__init__.py').write_text('')
+            (migrations_dir / '__init__.py').write_text('')
+        (migrations_dir / f'{name}.py').write_text(
+            'from django.db import migrations\n\n\n'
+            'class Migration(migrations.Migration):\n'
+            f'    dependencies = {dependencies!r}\n'
+            '    operations = []\n'
+        )
+    return apps
+
+
+def measure(func: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    """
+    Runs the function "repeat" times, timing each run and counting the queries of the last run.
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    timings = []
+    queries = 0
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        queries = len(context.captured_queries)
+    return {
+        'seconds': {
+            'min': min(timings),
+            'median': statistics.median(timings),
+            'max': max(timings),
+        },
+        'queries': queries,
+    }
+
+
+def run_scenario(work_dir: Path, rows: int, app_count: int, repeat: int, seed: int) -> List[Dict[str, Any]]:
+    """
+    Sets up Django for the scenario (in this process) and runs the benchmarks. The generated apps and the DB are
+    written to the work directory given.
+    """
+    history = generate_history(rows, app_count, seed)
+    apps = write_apps(work_dir, history)
+    sys.path.insert(0, str(work_dir))
+    sys.path.insert(0, str(REPO_ROOT))
+
+    import django
+    from django.conf import settings
+
+    settings.configure(
+        INSTALLED_APPS=['vmigration_helper.apps.VMigrationHelperConfig'] + apps,
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': str(work_dir / 'db.sqlite3')}},
+        USE_TZ=True,
+        VMIGRATION_HELPER_STATE_DIR=str(work_dir / 'state'),
+    )
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection
+    from django.db.migrations.loader import MigrationLoader
+    from django.db.migrations.recorder import MigrationRecorder
+
+    from vmigration_helper.helpers.migration_graph import CachedMigrationLoader
+    from vmigration_helper.helpers.migration_record_index import MigrationRecordIndex
+    from vmigration_helper.helpers.migration_records import MigrationRecordsHelper
+    from vmigration_helper.helpers.rollback_planner import RollbackPlanner
+
+    recorder = MigrationRecorder(connection)
+    recorder.ensure_schema()
+    applied = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    recorder.migration_qs.bulk_create(
+        [
+            MigrationRecorder.Migration(app=app, name=name, applied=applied + timedelta(seconds=i))
+            for i, (app, name, _) in enumerate(history)
+        ],
+        batch_size=1000,
+    )
+    # Roll back the last half of the history.
+    to_id = rows // 2
+
+    def helper() -> MigrationRecordsHelper:
+        return MigrationRecordsHelper(MigrationRecorder(connection))
+
+    def records_to_roll_back() -> list:
+        return helper().get_index().range(after_id=to_id)[::-1]
+
+    def previous_records() -> None:
+        records_helper = helper()
+        for migration in records_helper.squash_migrations(records_helper.get_index().range(after_id=to_id)[::-1]):
+            records_helper.previous_record(migration)
+
+    def load_graph_from_disk() -> None:
+        # Forget the imported migration modules so they are really imported again (as in a new process).
+        for module_name in [name for name in sys.modules if name.startswith(APP_PREFIX) and '.migrations.' in name]:
+            del sys.modules[module_name]
+        MigrationLoader(connection)
+
+    def call_quietly(*args, **kwargs) -> Callable[[], None]:
+        def call() -> None:
+            with contextlib.redirect_stdout(io.StringIO()):
+                call_command(*args, **kwargs)
+        return call
+
+    rollback_records = records_to_roll_back()
+    CachedMigrationLoader(None)  # warm the graph cache
+    cached_loader = CachedMigrationLoader(connection)
+
+    benchmarks = {
+        'index_load': lambda: MigrationRecordIndex.load(recorder.migration_qs),
+        'squash_migrations': lambda: MigrationRecordsHelper.squash_migrations(rollback_records),
+        'previous_record': previous_records,
+        'graph_load_uncached': load_graph_from_disk,
+        'graph_load_cached': lambda: CachedMigrationLoader(connection),
+        'rollback_planner': lambda: RollbackPlanner(helper(), cached_loader).plan(records_to_roll_back()),
+        'migration_records_console': call_quietly('migration_records'),
+        'migration_records_csv': call_quietly('migration_records', format='csv'),
+        'migration_records_jsonl': call_quietly('migration_records', format='jsonl'),
+        'migration_current_id': call_quietly('migration_current_id'),
+        'migration_rollback_dry_run': call_quietly('migration_rollback', str(to_id), dry_run=True),
+        'migration_rollback_dry_run_legacy_plan': call_quietly(
+            'migration_rollback', str(to_id), dry_run=True, legacy_plan=True
+        ),
+    }
+
+    results = []
+    try:
+        for name, func in benchmarks.items():
+            result = measure(func, repeat)
+            results.append({'scenario': {'rows': rows, 'apps': app_count}, 'benchmark': name, **result})
+            print(f'{rows:>7} rows {app_count:>4} apps  {name:<40} {result["seconds"]["median"]:.4f}s '
+                  f'{result["queries"]} queries', file=sys.stderr)
+    finally:
+        connection.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        '--scenario',
+        action='append',
+        help=f'A scenario as "<rows>:<apps>". Can be repeated. Default is: {" ".join(DEFAULT_SCENARIOS)}'
+    )
+    parser.add_argument('--repeat', type=int, default=3, help='The number of times to run each benchmark')
+    parser.add_argument('--seed', type=int, default=42, help='The seed of the generated histories')
+    parser.add_argument('--output', help='The file to write the results to (JSON). Default is stdout.')
+    parser.add_argument('--run-scenario', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        # Child process: run one scenario and print its results.
+        rows, app_count = (int(value) for value in args.run_scenario.split(':'))
+        # The generated apps and DB are removed once the results are printed.
+        with tempfile.TemporaryDirectory(prefix='vmigration-bench-') as work_dir:
+            print(json.dumps(run_scenario(Path(work_dir), rows, app_count, args.repeat, args.seed)))
+        return
+
+    results = []
+    for scenario in args.scenario or DEFAULT_SCENARIOS:
+        completed = subprocess.run(
+            [
+                sys.executable, __file__, '--run-scenario', scenario,
+                '--repeat', str(args.repeat), '--seed', str(args.seed),
+            ],
+            check=True, stdout=subprocess.PIPE, text=True, env={**os.environ, 'DJANGO_SETTINGS_MODULE': ''},
+        )
+        results.extend(json.loads(completed.stdout))
+
+    import django
+    report = {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -13,6 +13,8 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.urls import include, path
 
 urlpatterns = [
+    path('vmigration-helper/', include('vmigration_helper.urls')),
 ]
@@ -0,0 +1,8 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [('graph_a', '0001_initial')]
+
+    operations = []
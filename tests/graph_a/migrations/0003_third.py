@@ -0,0 +1,8 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [('graph_a', '0002_second'), ('graph_b', '0002_second')]
+
+    operations = []
@@ -0,0 +1,12 @@
+from django.db import migrations
+
+
+def forwards(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [('graph_c', '0001_initial')]
+
+    operations = [migrations.RunPython(forwards)]
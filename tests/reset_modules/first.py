@@ -0,0 +1,11 @@
+from django.core.management import call_command
+from django.db.migrations.recorder import MigrationRecorder
+from django.test import SimpleTestCase
+
+
+class MigrateBack(SimpleTestCase):
+    databases = {'default'}
+
+    def test_migrate_back(self):
+        call_command('migrate', 'graph_b', '0001_initial', verbosity=0)
+        self.assertFalse(MigrationRecorder.Migration.objects.filter(app='graph_b', name='0002_second').exists())
@@ -0,0 +1,12 @@
+from django.core.management import call_command
+from django.db.migrations.recorder import MigrationRecorder
+from django.test import SimpleTestCase
+
+
+class Reset(SimpleTestCase):
+    databases = {'default'}
+
+    def test_reset(self):
+        # Reset after the first module
+        self.assertTrue(MigrationRecorder.Migration.objects.filter(app='graph_b', name='0003_third').exists())
+        call_command('migrate', 'graph_a', '0002_second', verbosity=0)
@@ -0,0 +1,19 @@
+"""
+Settings of the tests: the sample project, plus apps whose migrations (without operations) make a small graph with
+dependencies across apps. Run the tests with:
+
+    python manage.py test tests --settings tests.settings
+"""
+from main.settings import *  # noqa: F401,F403
+from main.settings import INSTALLED_APPS
+
+INSTALLED_APPS = INSTALLED_APPS + ['tests.graph_a', 'tests.graph_b', 'tests.graph_c']
+
+# A second connection, for the commands running against several connections
+DATABASES = {
+    **DATABASES,  # noqa: F405
+    'other': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'other.sqlite3',  # noqa: F405
+    },
+}
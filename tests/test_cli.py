@@ -0,0 +1,86 @@
+import io
+import json
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.db.migrations.recorder import MigrationRecorder
+from django.test import TestCase
+from django.utils import timezone
+
+from vmigration_helper import cli
+from vmigration_helper.helpers.record_writer import FORMATS
+
+
+class CliTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # A long app name (for the width of the console format) applied later than the other records
+        cls.late_id = MigrationRecorder.Migration.objects.create(
+            app='an_app_with_a_long_name', name='0001_initial', applied=timezone.now() + timedelta(days=1)
+        ).id
+
+    def cli(self, *args: str) -> str:
+        out = io.StringIO()
+        with redirect_stdout(out):
+            cli.main(['--pythonpath=', *args])
+        return out.getvalue()
+
+    def cli_error(self, *args: str):
+        out, err = io.StringIO(), io.StringIO()
+        with redirect_stdout(out), redirect_stderr(err), self.assertRaises(SystemExit) as cm:
+            cli.main(['--pythonpath=', *args])
+        return cm.exception.code, out.getvalue(), err.getvalue()
+
+    def command(self, name: str, *args: str) -> str:
+        out = io.StringIO()
+        with redirect_stdout(out):
+            call_command(name, *args)
+        return out.getvalue()
+
+    def test_current_id(self):
+        self.assertEqual(self.cli('current-id'), self.command('migration_current_id'))
+        self.assertEqual(self.cli('current-id'), f'{self.late_id}\n')
+        self.assertEqual(self.cli('current-id', '--json'), self.command('migration_current_id', '--json'))
+
+    def test_records(self):
+        for print_format in FORMATS:
+            with self.subTest(print_format):
+                output = self.cli('records', '--format', print_format)
+                self.assertEqual(output, self.command('migration_records', '--format', print_format))
+                self.assertIn('an_app_with_a_long_name', output)
+
+    def test_records_filters(self):
+        applied_after = (timezone.now() + timedelta(hours=1)).isoformat()
+        for filters in (
+            ['--app', 'graph_a', '--app', 'graph_c'],
+            ['--since-id', '3', '--until-id', '6'],
+            ['--applied-after', applied_after],
+            ['--app', 'nothing'],
+        ):
+            with self.subTest(filters):
+                args = ['--format', 'csv', *filters]
+                self.assertEqual(self.cli('records', *args), self.command('migration_records', *args))
+        self.assertEqual(
+            self.cli('records', '--format', 'jsonl', '--applied-after', applied_after).count('\n'), 1
+        )
+
+    def test_records_in_chunks(self):
+        for print_format in FORMATS:
+            with self.subTest(print_format):
+                args = ['--format', print_format, '--chunk-size', '2']
+                self.assertEqual(self.cli('records', *args), self.command('migration_records', *args))
+        self.assertEqual(
+            self.cli('records', '--format', 'csv', '--chunk-size', '1'), self.cli('records', '--format', 'csv')
+        )
+
+    def test_invalid_applied_after(self):
+        code, out, err = self.cli_error('records', '--applied-after', 'yesterday')
+        self.assertEqual((code, out), (2, ''))
+        self.assertIn('Invalid date and time for --applied-after: yesterday', err)
+
+    def test_unknown_connection(self):
+        code, _, err = self.cli_error('--connection-name', 'nope', 'current-id')
+        self.assertEqual(code, 2)
+        self.assertIn('nope', err)
@@ -0,0 +1,60 @@
+import io
+import threading
+from contextlib import redirect_stdout
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings, SimpleTestCase, TransactionTestCase
+
+from vmigration_helper.helpers.command import max_jobs_for_connection, PrefixedWriter
+from vmigration_helper.helpers.migration_records import MigrationRecordsHelper
+from tests.utils import StateDirTestMixin
+
+
+class PrefixedWriterTests(SimpleTestCase):
+
+    def test_lines_prefixed(self):
+        out = io.StringIO()
+        writer = PrefixedWriter(out, threading.Lock(), '[a] ')
+        writer.write('one\ntw')
+        self.assertEqual(out.getvalue(), '[a] one\n')
+        writer.write('o\n')
+        writer.write('three')
+        writer.flush()
+        self.assertEqual(out.getvalue(), '[a] one\n[a] two\n[a] three\n')
+
+
+class MaxJobsTests(SimpleTestCase):
+
+    def test_sqlite(self):
+        self.assertEqual(max_jobs_for_connection(SimpleNamespace(vendor='sqlite', alias='default'), 4), 1)
+
+    @override_settings(VMIGRATION_HELPER_MAX_JOBS_PER_CONNECTION={'primary': 2})
+    def test_limit(self):
+        self.assertEqual(max_jobs_for_connection(SimpleNamespace(vendor='postgresql', alias='primary'), 4), 2)
+        self.assertEqual(max_jobs_for_connection(SimpleNamespace(vendor='postgresql', alias='primary'), 1), 1)
+        self.assertEqual(max_jobs_for_connection(SimpleNamespace(vendor='postgresql', alias='other'), 4), 4)
+
+
+class InProcessJobsTests(StateDirTestMixin, TransactionTestCase):
+
+    def tearDown(self):
+        call_command('migrate', verbosity=0)
+
+    @patch('vmigration_helper.helpers.command.max_jobs_for_connection', lambda connection, jobs: jobs)
+    def test_groups_run_one_at_a_time(self):
+        # As if the database allowed concurrent jobs: in-process migrations still run one group at a time.
+        connection.prepare_database()
+        helper = MigrationRecordsHelper()
+        call_command('migrate', 'graph_a', 'zero', verbosity=0)
+        to_id = helper.latest_migration_id()
+        call_command('migrate', 'graph_b', verbosity=0)
+        out = io.StringIO()
+        with redirect_stdout(out):
+            call_command('migration_rollback', str(to_id), '--in-process', '--jobs', '4', verbosity=0)
+        self.assertIn('In-process migrations run one group at a time', out.getvalue())
+        self.assertIn('with up to 1 job(s)', out.getvalue())
+        helper.invalidate_index()
+        self.assertEqual(helper.get_index().max_id, to_id)
@@ -0,0 +1,77 @@
+import io
+import json
+import threading
+from contextlib import redirect_stdout
+from typing import List
+
+from django.core.management import call_command, CommandError
+from django.test import SimpleTestCase, TransactionTestCase
+
+from vmigration_helper.helpers.connection_fanout import ConnectionResult, fan_out
+
+
+class FanOutTests(SimpleTestCase):
+
+    def run_fan_out(self, *args, **kwargs) -> List[ConnectionResult]:
+        """
+        Runs fan_out in a thread, failing the test if it does not return within a few seconds.
+        """
+        results = []
+        thread = threading.Thread(target=lambda: results.extend(fan_out(*args, **kwargs)), daemon=True)
+        thread.start()
+        thread.join(10)
+        self.assertFalse(thread.is_alive(), 'fan_out did not return')
+        return results
+
+    def fail_for_other(self, alias: str) -> str:
+        if alias == 'other':
+            raise RuntimeError('failed')
+        return alias.upper()
+
+    def test_one_connection_fails(self):
+        results = self.run_fan_out(['default', 'other'], self.fail_for_other)
+        self.assertEqual([(result.alias, result.value, result.error) for result in results], [
+            ('default', 'DEFAULT', None),
+            ('other', None, 'RuntimeError: failed'),
+        ])
+
+    def test_unknown_alias(self):
+        # Closing the connection of an unknown alias fails: its error is reported instead of the worker dying.
+        results = self.run_fan_out(['nosuch', 'default'], str.upper)
+        self.assertEqual(
+            [(result.alias, result.value) for result in results], [('nosuch', 'NOSUCH'), ('default', 'DEFAULT')]
+        )
+        self.assertIn('ConnectionDoesNotExist', results[0].error)
+        self.assertIsNone(results[1].error)
+
+    def test_timeout(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def slow_other(alias: str) -> str:
+            if alias == 'other':
+                release.wait(10)
+            return alias
+
+        # With one worker, the worker stuck on "other" is replaced so that "default" still runs.
+        results = self.run_fan_out(['other', 'default'], slow_other, max_workers=1, timeout=0.2)
+        self.assertEqual([(result.alias, result.value, result.error) for result in results], [
+            ('other', None, 'Timed out after 0.2 seconds'),
+            ('default', 'default', None),
+        ])
+
+
+class MultipleConnectionsCommandTests(TransactionTestCase):
+    databases = {'default', 'other'}
+
+    def test_unknown_connection(self):
+        with self.assertRaisesMessage(CommandError, 'Unknown connection(s): nosuch'):
+            call_command('migration_current_id', '--connection-name', 'default', '--connection-name', 'nosuch')
+
+    def test_current_ids(self):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            call_command('migration_current_id', '--all-connections', '--json')
+        ids = {alias: result['id'] for alias, result in json.loads(out.getvalue()).items()}
+        self.assertEqual(sorted(ids), ['default', 'other'])
+        self.assertTrue(all(ids.values()))
@@ -0,0 +1,110 @@
+import io
+import json
+from contextlib import redirect_stderr, redirect_stdout
+from typing import List, Tuple
+
+from django.core.management import call_command, CommandError
+from django.db.migrations.recorder import MigrationRecorder
+from django.test import TestCase
+
+from tests.utils import StateDirTestMixin
+
+
+class MigrationBatchTests(StateDirTestMixin, TestCase):
+
+    def batch(self, lines: List[str], *args: str) -> Tuple[int, str, str]:
+        """
+        Runs the batch of the lines given.
+
+        :returns: the exit code, stdout and stderr of the batch
+        """
+        script = self.state_dir / 'script.txt'
+        script.write_text('\n'.join(lines) + '\n')
+        stdout, stderr = io.StringIO(), io.StringIO()
+        exit_code = 0
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            try:
+                call_command('migration_batch', str(script), *args)
+            except SystemExit as e:
+                exit_code = e.code
+        return exit_code, stdout.getvalue(), stderr.getvalue()
+
+    def latest_id(self) -> int:
+        return MigrationRecorder.Migration.objects.latest('id').id
+
+    def test_delimited(self):
+        exit_code, out, err = self.batch([
+            '# comment',
+            'migration_current_id',
+            '',
+            'records --format csv --app graph_c',
+        ])
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(err, '')
+        current_id, records = out.split('--- 0\n')[:2]
+        self.assertEqual(current_id.strip(), str(self.latest_id()))
+        self.assertEqual(records.splitlines()[0], 'ID,Applied,App,Name')
+        self.assertEqual([line.split(',')[2] for line in records.splitlines()[1:]], ['graph_c', 'graph_c'])
+        self.assertTrue(out.endswith('--- 0\n'))
+
+    def test_custom_delimiter(self):
+        exit_code, out, _ = self.batch(['current_id', 'current_id'], '--delimiter', '@@')
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(out, f'{self.latest_id()}\n@@ 0\n' * 2)
+
+    def test_failures(self):
+        exit_code, out, err = self.batch([
+            'nope',
+            'records --applied-after yesterday',
+            'migration_batch',
+            'current_id',
+        ])
+        self.assertEqual(exit_code, 1)
+        self.assertEqual(out.splitlines(), ['--- 1', '--- 1', '--- 1', str(self.latest_id()), '--- 0'])
+        self.assertEqual(err.splitlines(), [
+            'CommandError: Unknown command: nope',
+            'CommandError: Invalid date and time for --applied-after: yesterday',
+            'CommandError: Unknown command: migration_batch',
+        ])
+
+    def test_stop_on_error(self):
+        exit_code, out, _ = self.batch(['current_id', 'nope', 'current_id'], '--stop-on-error')
+        self.assertEqual(exit_code, 1)
+        self.assertEqual(out.splitlines(), [str(self.latest_id()), '--- 0', '--- 1'])
+
+    def test_jsonl(self):
+        exit_code, out, err = self.batch(
+            ['current_id', 'nope', 'records --format jsonl --app graph_c'], '--output', 'jsonl'
+        )
+        self.assertEqual(exit_code, 1)
+        self.assertEqual(err, '')
+        results = [json.loads(line) for line in out.splitlines()]
+        self.assertEqual(len(results), 3)
+        self.assertEqual(
+            [(result['command'], result['exit_code'], result['error']) for result in results],
+            [
+                ('current_id', 0, None),
+                ('nope', 1, 'CommandError: Unknown command: nope'),
+                ('records --format jsonl --app graph_c', 0, None),
+            ],
+        )
+        self.assertEqual(results[0]['output'], f'{self.latest_id()}\n')
+        self.assertEqual(
+            [json.loads(line)['name'] for line in results[2]['output'].splitlines()], ['0001_initial', '0002_data']
+        )
+        self.assertTrue(all(result['seconds'] >= 0 for result in results))
+
+    def test_commands_share_the_records(self):
+        exit_code, out, _ = self.batch([
+            'records --format csv --app graph_c',
+            'delete graph_c 0002_data --yes',
+            'records --format csv --app graph_c',
+        ])
+        self.assertEqual(exit_code, 0)
+        before, _, after = out.split('--- 0\n')[:3]
+        self.assertIn('0002_data', before)
+        self.assertNotIn('0002_data', after)
+
+    def test_missing_script(self):
+        with self.assertRaisesMessage(CommandError, 'Cannot read'):
+            call_command('migration_batch', str(self.state_dir / 'missing.txt'))
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta, timezone
+
+from django.test import SimpleTestCase
+
+from vmigration_helper.helpers.migration_diff import DIFF_ONLY_LEFT, DIFF_ONLY_RIGHT, DIFF_SKEW, MigrationDiff
+
+APPLIED = datetime(2024, 12, 6, 18, 15, 3, tzinfo=timezone.utc)
+
+
+def records(*rows):
+    """
+    Returns the records of the (id, app, name[, seconds after APPLIED]) rows given, in (app, name) order.
+    """
+    return sorted(
+        [(row[0], APPLIED + timedelta(seconds=row[3] if len(row) > 3 else 0), row[1], row[2]) for row in rows],
+        key=lambda record: (record[2], record[3]),
+    )
+
+
+class MigrationDiffTests(SimpleTestCase):
+
+    def test_same_records(self):
+        left = records((1, 'a', '0001_initial'), (2, 'b', '0001_initial'))
+        # IDs differ between environments: only (app, name) is compared
+        right = records((7, 'a', '0001_initial'), (3, 'b', '0001_initial'))
+        diff = MigrationDiff(left, right)
+        self.assertEqual(list(diff.entries()), [])
+        self.assertEqual(diff.targets(), [])
+        self.assertEqual(diff.counts['common'], 2)
+
+    def test_merge_join(self):
+        left = records(
+            (1, 'a', '0001_initial'), (2, 'a', '0002_second'), (3, 'b', '0001_initial'), (4, 'd', '0001_initial'),
+        )
+        right = records(
+            (1, 'a', '0001_initial'), (2, 'b', '0001_initial'), (3, 'b', '0002_second'), (4, 'c', '0001_initial'),
+        )
+        diff = MigrationDiff(left, right)
+        entries = [(entry.kind, entry.app, entry.name) for entry in diff.entries()]
+        self.assertEqual(entries, [
+            (DIFF_ONLY_LEFT, 'a', '0002_second'),
+            (DIFF_ONLY_RIGHT, 'b', '0002_second'),
+            (DIFF_ONLY_RIGHT, 'c', '0001_initial'),
+            (DIFF_ONLY_LEFT, 'd', '0001_initial'),
+        ])
+        self.assertEqual(diff.counts[DIFF_ONLY_LEFT], 2)
+        self.assertEqual(diff.counts[DIFF_ONLY_RIGHT], 2)
+        self.assertEqual(diff.counts['common'], 2)
+        self.assertEqual((diff.counts['left'], diff.counts['right']), (4, 4))
+        # Roll back the apps changed latest on the right first, then migrate forward in the order of the left.
+        self.assertEqual(diff.targets(), [
+            ('c', 'zero'), ('b', '0001_initial'), ('a', '0002_second'), ('d', '0001_initial'),
+        ])
+
+    def test_one_side_empty(self):
+        diff = MigrationDiff([], records((1, 'a', '0001_initial'), (2, 'a', '0002_second')))
+        self.assertEqual([entry.kind for entry in diff.entries()], [DIFF_ONLY_RIGHT, DIFF_ONLY_RIGHT])
+        self.assertEqual(diff.targets(), [('a', 'zero')])
+
+    def test_skew(self):
+        left = records((1, 'a', '0001_initial'), (2, 'a', '0002_second'))
+        right = records((1, 'a', '0001_initial', 5), (2, 'a', '0002_second', 120))
+        diff = MigrationDiff(left, right, max_skew=60)
+        entries = list(diff.entries())
+        self.assertEqual([(entry.kind, entry.name, entry.skew) for entry in entries], [
+            (DIFF_SKEW, '0002_second', 120.0),
+        ])
+        self.assertEqual(diff.largest_skew, 120.0)
+        self.assertEqual(diff.targets(), [])
+
+    def test_out_of_order(self):
+        right = [(1, APPLIED, 'b', '0001_initial'), (2, APPLIED, 'a', '0001_initial')]
+        diff = MigrationDiff([], right, right_name='other')
+        with self.assertRaisesMessage(ValueError, 'The records of other are not in (app, name) order'):
+            list(diff.entries())
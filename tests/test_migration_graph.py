@@ -0,0 +1,125 @@
+import io
+import json
+import os
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.test import SimpleTestCase, TestCase
+
+from vmigration_helper.helpers.migration_graph import CachedMigration, CachedMigrationLoader, irreversible_operations
+from tests.utils import StateDirTestMixin
+
+GRAPH_APPS = ('graph_a', 'graph_b', 'graph_c')
+
+
+def touch(path: Path, testcase: SimpleTestCase) -> None:
+    """
+    Moves the mtime of the file given forward (to change its fingerprint), restoring it when the test is done.
+    """
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    testcase.addCleanup(os.utime, path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+
+class CachedMigrationLoaderTests(StateDirTestMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cache_path = self.state_dir / 'graph_cache.json'
+
+    def test_cache_is_written_then_used(self):
+        loader = CachedMigrationLoader(None)
+        self.assertTrue(self.cache_path.exists())
+        self.assertTrue(set(GRAPH_APPS) <= set(loader.loaded_apps))
+        self.assertEqual(loader.cached_apps, [])
+
+        cached_loader = CachedMigrationLoader(None)
+        self.assertEqual(cached_loader.loaded_apps, [])
+        self.assertTrue(set(GRAPH_APPS) <= set(cached_loader.cached_apps))
+        self.assertIsInstance(cached_loader.graph.nodes['graph_a', '0003_third'], CachedMigration)
+
+    def test_same_graph_as_django(self):
+        CachedMigrationLoader(None)
+        cached_loader = CachedMigrationLoader(None)
+        loader = MigrationLoader(None)
+        self.assertEqual(set(cached_loader.graph.nodes), set(loader.graph.nodes))
+        self.assertEqual(cached_loader.migrated_apps, loader.migrated_apps)
+        self.assertEqual(cached_loader.unmigrated_apps, loader.unmigrated_apps)
+        for key in loader.graph.nodes:
+            self.assertEqual(cached_loader.graph.forwards_plan(key), loader.graph.forwards_plan(key))
+            self.assertEqual(cached_loader.graph.backwards_plan(key), loader.graph.backwards_plan(key))
+
+    def test_cached_reversibility(self):
+        CachedMigrationLoader(None)
+        migration = CachedMigrationLoader(None).graph.nodes['graph_c', '0002_data']
+        self.assertIsInstance(migration, CachedMigration)
+        self.assertEqual(len(irreversible_operations(migration)), 1)
+        self.assertEqual(irreversible_operations(migration), irreversible_operations(
+            MigrationLoader(None).graph.nodes['graph_c', '0002_data']
+        ))
+        with self.assertRaises(RuntimeError):
+            migration.apply(None, None)
+
+    def test_changed_file_reloads_its_app_only(self):
+        CachedMigrationLoader(None)
+        touch(Path(__file__).parent / 'graph_b' / 'migrations' / '0002_second.py', self)
+        loader = CachedMigrationLoader(None)
+        self.assertEqual(loader.loaded_apps, ['graph_b'])
+        self.assertIn('graph_a', loader.cached_apps)
+        # The cache was updated
+        self.assertEqual(CachedMigrationLoader(None).loaded_apps, [])
+
+    def test_other_settings_invalidate_the_cache(self):
+        CachedMigrationLoader(None)
+        with self.settings(MIGRATION_MODULES={'graph_c': 'tests.graph_c.migrations'}):
+            loader = CachedMigrationLoader(None)
+        self.assertEqual(loader.cached_apps, [])
+
+    def test_corrupt_cache(self):
+        self.cache_path.write_text('{"key": ')
+        loader = CachedMigrationLoader(None)
+        self.assertEqual(loader.cached_apps, [])
+        self.assertIn(('graph_a', '0003_third'), loader.graph.nodes)
+        # It was replaced with a valid cache
+        self.assertEqual(CachedMigrationLoader(None).loaded_apps, [])
+
+    def test_malformed_app_entry(self):
+        CachedMigrationLoader(None)
+        cache = json.loads(self.cache_path.read_text())
+        cache['apps']['graph_a']['migrations']['0002_second'] = {'dependencies': 'nope'}
+        cache['apps']['graph_b'] = []
+        self.cache_path.write_text(json.dumps(cache))
+        loader = CachedMigrationLoader(None)
+        self.assertEqual(sorted(loader.loaded_apps), ['graph_a', 'graph_b'])
+        self.assertIn('graph_c', loader.cached_apps)
+
+    def test_unwritable_cache(self):
+        cache_path = self.state_dir / 'missing' / 'graph_cache.json'
+        (self.state_dir / 'missing').write_text('not a directory')
+        loader = CachedMigrationLoader(None, cache_path=cache_path)
+        self.assertIn(('graph_a', '0003_third'), loader.graph.nodes)
+
+
+class CachedMigrationLoaderAppliedTests(StateDirTestMixin, TestCase):
+
+    def test_applied_migrations(self):
+        CachedMigrationLoader(None)
+        loader = CachedMigrationLoader(connection)
+        self.assertEqual(set(loader.applied_migrations), set(MigrationLoader(connection).applied_migrations))
+
+
+class MigrationGraphCacheCommandTests(StateDirTestMixin, SimpleTestCase):
+
+    def graph_cache(self, *args: str) -> str:
+        out = io.StringIO()
+        with redirect_stdout(out):
+            call_command('migration_graph_cache', *args)
+        return out.getvalue()
+
+    def test_build_and_clear(self):
+        self.assertIn('0 app(s) from the cache', self.graph_cache())
+        self.assertIn('0 app(s) loaded from disk', self.graph_cache())
+        self.assertIn('0 app(s) from the cache', self.graph_cache('--clear'))
@@ -0,0 +1,61 @@
+from django.test import SimpleTestCase
+
+from vmigration_helper.helpers.migration_record_index import IndexedRecord, MigrationRecordIndex
+
+ROWS = [
+    (1, 'a', '0001_initial'),
+    (2, 'b', '0001_initial'),
+    (4, 'a', '0002_second'),
+    (5, 'b', '0002_second'),
+    (9, 'a', '0003_third'),
+]
+
+
+class MigrationRecordIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        self.index = MigrationRecordIndex(ROWS)
+
+    def test_previous(self):
+        self.assertEqual(self.index.previous('a', 9), IndexedRecord(4, 'a', '0002_second'))
+        # IDs without a record of the app (or of any app) in between
+        self.assertEqual(self.index.previous('a', 5), IndexedRecord(4, 'a', '0002_second'))
+        self.assertEqual(self.index.previous('b', 3), IndexedRecord(2, 'b', '0001_initial'))
+        self.assertEqual(self.index.previous('a', 100), IndexedRecord(9, 'a', '0003_third'))
+
+    def test_previous_none(self):
+        self.assertIsNone(self.index.previous('a', 1))
+        self.assertIsNone(self.index.previous('b', 2))
+        self.assertIsNone(self.index.previous('unknown', 9))
+
+    def test_range(self):
+        self.assertEqual([record.id for record in self.index.range()], [1, 2, 4, 5, 9])
+        self.assertEqual([record.id for record in self.index.range(after_id=2)], [4, 5, 9])
+        self.assertEqual([record.id for record in self.index.range(after_id=3, until_id=5)], [4, 5])
+        self.assertEqual([record.id for record in self.index.range(until_id=4)], [1, 2, 4])
+        self.assertEqual(self.index.range(after_id=9), [])
+        self.assertEqual(self.index.range(after_id=5, until_id=4), [])
+        self.assertEqual(self.index.range(after_id=4, until_id=5), [IndexedRecord(5, 'b', '0002_second')])
+
+    def test_fingerprint(self):
+        fingerprint = self.index.fingerprint()
+        self.assertEqual(fingerprint, MigrationRecordIndex(ROWS).fingerprint())
+        self.assertEqual(fingerprint, self.index.fingerprint(until_id=9))
+        self.assertEqual(self.index.fingerprint(until_id=5), self.index.fingerprint(until_id=8))
+        self.assertEqual(self.index.fingerprint(until_id=5), MigrationRecordIndex(ROWS[:4]).fingerprint())
+        self.assertNotEqual(self.index.fingerprint(until_id=4), self.index.fingerprint(until_id=5))
+
+    def test_fingerprint_changes(self):
+        fingerprint = self.index.fingerprint()
+        renamed = ROWS[:2] + [(4, 'a', '0002_renamed')] + ROWS[3:]
+        renumbered = ROWS[:2] + [(3, 'a', '0002_second')] + ROWS[3:]
+        self.assertNotEqual(fingerprint, MigrationRecordIndex(renamed).fingerprint())
+        self.assertNotEqual(fingerprint, MigrationRecordIndex(renumbered).fingerprint())
+        self.assertNotEqual(fingerprint, MigrationRecordIndex(ROWS[:-1]).fingerprint())
+        self.assertNotEqual(fingerprint, MigrationRecordIndex(ROWS + [(10, 'c', '0001_initial')]).fingerprint())
+
+    def test_latest_and_max_id(self):
+        self.assertEqual(self.index.latest('b'), IndexedRecord(5, 'b', '0002_second'))
+        self.assertIsNone(self.index.latest('unknown'))
+        self.assertEqual(self.index.max_id, 9)
+        self.assertEqual(MigrationRecordIndex([]).max_id, 0)
@@ -0,0 +1,140 @@
+import io
+import re
+from contextlib import redirect_stdout
+from unittest.mock import patch
+
+from django.core.management import call_command, CommandError
+from django.db.migrations.recorder import MigrationRecorder
+from django.test import TestCase
+
+from vmigration_helper.helpers.migration_records import MigrationRecordsHelper
+
+APP = 'deleted_app'
+
+
+class DeleteMigrationsTests(TestCase):
+
+    def setUp(self):
+        self.helper = MigrationRecordsHelper()
+        records = MigrationRecorder.Migration.objects.bulk_create(
+            [MigrationRecorder.Migration(app=APP, name=f'{i:04}_migration') for i in range(1, 8)]
+        )
+        self.ids = sorted(MigrationRecorder.Migration.objects.filter(app=APP).values_list('id', flat=True))
+        self.assertEqual(len(self.ids), len(records))
+
+    def remaining(self):
+        return list(MigrationRecorder.Migration.objects.filter(app=APP).order_by('id').values_list('id', flat=True))
+
+    def test_batches(self):
+        progress = []
+        deleted = self.helper.delete_migrations(
+            self.ids[:5], batch_size=2, progress=lambda done, total: progress.append((done, total))
+        )
+        self.assertEqual(deleted, 5)
+        self.assertEqual(progress, [(2, 5), (4, 5), (5, 5)])
+        self.assertEqual(self.remaining(), self.ids[5:])
+
+    def test_batches_not_atomic(self):
+        progress = []
+        deleted = self.helper.delete_migrations(
+            self.ids, batch_size=3, atomic=False, progress=lambda done, total: progress.append((done, total))
+        )
+        self.assertEqual(deleted, 7)
+        self.assertEqual(progress, [(3, 7), (6, 7), (7, 7)])
+        self.assertEqual(self.remaining(), [])
+
+    def test_unknown_ids(self):
+        self.assertEqual(self.helper.delete_migrations([self.ids[0], max(self.ids) + 100], batch_size=1), 1)
+        self.assertEqual(self.remaining(), self.ids[1:])
+
+    def fail_after_first_batch(self, done, total):
+        raise RuntimeError('failed')
+
+    def test_failure_atomic(self):
+        with self.assertRaises(RuntimeError):
+            self.helper.delete_migrations(self.ids, batch_size=2, progress=self.fail_after_first_batch)
+        self.assertEqual(self.remaining(), self.ids)
+
+    def test_failure_not_atomic(self):
+        with self.assertRaises(RuntimeError):
+            self.helper.delete_migrations(self.ids, batch_size=2, atomic=False, progress=self.fail_after_first_batch)
+        self.assertEqual(self.remaining(), self.ids[2:])
+
+    def test_index_invalidated(self):
+        self.assertIn(self.ids[0], [record.id for record in self.helper.get_index().range()])
+        self.helper.delete_migrations(self.ids[:1])
+        self.assertNotIn(self.ids[0], [record.id for record in self.helper.get_index().range()])
+
+
+class PreviousAndFindTests(TestCase):
+
+    def setUp(self):
+        self.helper = MigrationRecordsHelper()
+        self.records = [
+            MigrationRecorder.Migration.objects.create(app=app, name=name)
+            for app, name in [
+                (APP, '0001_initial'), ('other_app', '0001_initial'), (APP, '0002_second'), (APP, '0003_third'),
+            ]
+        ]
+
+    def test_previous_migration(self):
+        previous = self.helper.previous_migration(self.records[3])
+        self.assertIsInstance(previous, MigrationRecorder.Migration)
+        self.assertEqual(previous, self.records[2])
+        self.assertEqual(previous.applied, self.records[2].applied)
+        self.assertIsNone(self.helper.previous_migration(self.records[1]))
+
+    def test_previous_record(self):
+        self.helper.get_index()
+        with self.assertNumQueries(0):
+            previous = self.helper.previous_record(self.records[2])
+        self.assertEqual((previous.id, previous.app, previous.name), (self.records[0].id, APP, '0001_initial'))
+
+    def test_find_migrations(self):
+        with self.assertNumQueries(1):
+            found = self.helper.find_migrations([(APP, '0002_second'), ('other_app', '0001_initial'), (APP, 'nosuch')])
+        self.assertEqual([record.id for record in found], [self.records[1].id, self.records[2].id])
+
+    def test_find_migrations_of_app(self):
+        found = self.helper.find_migrations(
+            [('other_app', '0001_initial')], app=APP, name_pattern=re.compile('000[13]_.*')
+        )
+        self.assertEqual([record.id for record in found], [self.records[0].id, self.records[1].id, self.records[3].id])
+        self.assertEqual(self.helper.find_migrations([]), [])
+
+
+class MigrationDeleteCommandTests(TestCase):
+
+    def setUp(self):
+        MigrationRecorder.Migration.objects.create(app=APP, name='0001_initial')
+
+    def delete(self, *args, stdin: str = '') -> str:
+        out = io.StringIO()
+        with redirect_stdout(out), patch('sys.stdin', io.StringIO(stdin)):
+            call_command('migration_delete', *args)
+        return out.getvalue()
+
+    def remaining(self):
+        return list(MigrationRecorder.Migration.objects.filter(app=APP).values_list('name', flat=True))
+
+    def test_file_from_stdin_requires_yes(self):
+        with self.assertRaisesMessage(CommandError, '--yes is required with "--file -"'):
+            self.delete('--file', '-', stdin=f'nosuch:0001\n{APP}:0001_initial\n')
+        self.assertEqual(self.remaining(), ['0001_initial'])
+
+    def test_file_from_stdin(self):
+        out = self.delete('--file', '-', '--yes', stdin=f'# comment\nnosuch:0001\n\n{APP}:0001_initial\n')
+        self.assertIn('No records found for nosuch:0001', out)
+        self.assertIn('Migration records deleted: 1', out)
+        self.assertEqual(self.remaining(), [])
+
+    def test_no_confirmation(self):
+        # stdin is empty: the confirmation gets no answer.
+        out = self.delete(f'{APP}:0001_initial')
+        self.assertIn('Nothing done.', out)
+        self.assertEqual(self.remaining(), ['0001_initial'])
+
+    def test_confirmation(self):
+        out = self.delete(f'{APP}:0001_initial', stdin='yes\n')
+        self.assertIn('Migration records deleted: 1', out)
+        self.assertEqual(self.remaining(), [])
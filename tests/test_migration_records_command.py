@@ -0,0 +1,93 @@
+import io
+import json
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta, timezone
+
+from django.core.management import call_command, CommandError
+from django.db.migrations.recorder import MigrationRecorder
+from django.test import TestCase, TransactionTestCase
+
+APPLIED = datetime(2024, 12, 6, 18, 15, 3, tzinfo=timezone.utc)
+
+
+def records(*args: str):
+    """
+    Runs migration_records with the arguments given, returning the records listed (as JSON lines).
+    """
+    out = io.StringIO()
+    with redirect_stdout(out):
+        call_command('migration_records', '--format', 'jsonl', *args)
+    return [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+class MigrationRecordsFilterTests(TestCase):
+
+    def setUp(self):
+        self.ids = [
+            MigrationRecorder.Migration.objects.create(
+                app=app, name=name, applied=APPLIED + timedelta(days=day)
+            ).id
+            for day, (app, name) in enumerate([
+                ('filtered_a', '0001_initial'),
+                ('filtered_b', '0001_initial'),
+                ('filtered_a', '0002_second'),
+            ])
+        ]
+
+    def names(self, *args: str):
+        return [(record['app'], record['name']) for record in records(*args) if record['app'].startswith('filtered')]
+
+    def test_app(self):
+        self.assertEqual(
+            self.names('--app', 'filtered_a'), [('filtered_a', '0001_initial'), ('filtered_a', '0002_second')]
+        )
+        self.assertEqual(len(self.names('--app', 'filtered_a', '--app', 'filtered_b')), 3)
+
+    def test_ids(self):
+        self.assertEqual(
+            self.names('--since-id', str(self.ids[1])), [('filtered_b', '0001_initial'), ('filtered_a', '0002_second')]
+        )
+        self.assertEqual(
+            self.names('--since-id', str(self.ids[0]), '--until-id', str(self.ids[1])),
+            [('filtered_a', '0001_initial'), ('filtered_b', '0001_initial')],
+        )
+
+    def test_applied_after(self):
+        self.assertEqual(self.names('--applied-after', '2024-12-08T00:00:00+00:00'), [('filtered_a', '0002_second')])
+        # In the current time zone when naive
+        self.assertEqual(len(self.names('--applied-after', '2024-12-06T18:15:02')), 3)
+
+    def test_applied_after_invalid(self):
+        with self.assertRaisesMessage(CommandError, 'Invalid date and time for --applied-after: yesterday'):
+            records('--applied-after', 'yesterday')
+        with self.assertRaisesMessage(CommandError, 'Invalid date and time for --applied-after: 2024-13-01T00:00:00'):
+            records('--applied-after', '2024-13-01T00:00:00')
+
+    def test_console(self):
+        out = io.StringIO()
+        # The width of the app column is that of the records listed: no other query
+        with redirect_stdout(out), self.assertNumQueries(1):
+            call_command('migration_records', '--app', 'filtered_b')
+        self.assertEqual(out.getvalue().splitlines(), [
+            '    ID Applied                         App Name',
+            f'{self.ids[1]:6} 2024-12-07T18:15:03+0000 filtered_b 0001_initial',
+        ])
+
+
+class MultipleConnectionsRecordsTests(TransactionTestCase):
+    databases = {'default', 'other'}
+
+    def test_records_of_each_connection(self):
+        MigrationRecorder.Migration.objects.using('other').create(app='only_other', name='0001_initial')
+        listed = records('--connection-name', 'default', '--connection-name', 'other', '--chunk-size', '7')
+        self.assertEqual([record['connection'] for record in listed], sorted(record['connection'] for record in listed))
+        for alias in ('default', 'other'):
+            self.assertEqual(
+                [record['id'] for record in listed if record['connection'] == alias],
+                list(MigrationRecorder.Migration.objects.using(alias).order_by('id').values_list('id', flat=True)),
+            )
+        self.assertEqual(listed[-1]['app'], 'only_other')
+
+    def test_invalid_applied_after(self):
+        with self.assertRaisesMessage(CommandError, 'Invalid date and time for --applied-after'):
+            records('--all-connections', '--applied-after', 'yesterday')
@@ -0,0 +1,120 @@
+import io
+from contextlib import redirect_stdout
+
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+
+from vmigration_helper.helpers.migration_record_index import MigrationRecordIndex
+from vmigration_helper.helpers.migration_records import MigrationRecordsHelper
+from vmigration_helper.helpers.migration_snapshots import MigrationSnapshot, MigrationSnapshotStore
+from tests.utils import StateDirTestMixin
+
+SNAPSHOT = MigrationSnapshot(
+    name='before', max_id=3, applied={'a': '0002_second', 'b': '0001_initial'}, created='2024-12-06T18:15:03+00:00'
+)
+
+
+class PlanRestoreTests(SimpleTestCase):
+
+    def test_nothing_changed(self):
+        index = MigrationRecordIndex([(1, 'a', '0001_initial'), (2, 'b', '0001_initial'), (3, 'a', '0002_second')])
+        self.assertEqual(SNAPSHOT.plan_restore(index), [])
+
+    def test_capture(self):
+        index = MigrationRecordIndex([(1, 'a', '0001_initial'), (2, 'b', '0001_initial'), (3, 'a', '0002_second')])
+        snapshot = MigrationSnapshot.capture('before', index)
+        self.assertEqual((snapshot.max_id, snapshot.applied), (SNAPSHOT.max_id, SNAPSHOT.applied))
+
+    def test_roll_back_latest_changed_first(self):
+        index = MigrationRecordIndex([
+            (1, 'a', '0001_initial'),
+            (2, 'b', '0001_initial'),
+            (3, 'a', '0002_second'),
+            (4, 'a', '0003_third'),
+            (5, 'c', '0001_initial'),
+            (6, 'b', '0002_second'),
+        ])
+        self.assertEqual(SNAPSHOT.plan_restore(index), [('b', '0001_initial'), ('c', 'zero'), ('a', '0002_second')])
+
+    def test_migrate_forward(self):
+        # a was rolled back, and the record of b was deleted (e.g. with migration_delete): both go forward again.
+        index = MigrationRecordIndex([(1, 'a', '0001_initial')])
+        self.assertEqual(SNAPSHOT.plan_restore(index), [('a', '0002_second'), ('b', '0001_initial')])
+
+    def test_record_ids_do_not_matter(self):
+        # The records were recreated with other IDs since the snapshot.
+        index = MigrationRecordIndex([(10, 'b', '0001_initial'), (11, 'a', '0001_initial'), (12, 'a', '0002_second')])
+        self.assertEqual(SNAPSHOT.plan_restore(index), [])
+
+
+class MigrationSnapshotStoreTests(StateDirTestMixin, SimpleTestCase):
+
+    def test_save_and_get(self):
+        store = MigrationSnapshotStore()
+        self.assertIsNone(store.get('before'))
+        self.assertFalse(store.save(SNAPSHOT))
+        self.assertEqual(store.get('before'), SNAPSHOT)
+        self.assertTrue((self.state_dir / 'snapshots.json').exists())
+        replacement = SNAPSHOT._replace(max_id=7)
+        self.assertTrue(store.save(replacement))
+        self.assertEqual(store.list(), [replacement])
+
+    def test_per_connection(self):
+        path = self.state_dir / 'other.json'
+        MigrationSnapshotStore(path).save(SNAPSHOT)
+        other = MigrationSnapshotStore(path, connection_name='other')
+        self.assertEqual(other.list(), [])
+        other.save(SNAPSHOT._replace(name='other'))
+        self.assertEqual([snapshot.name for snapshot in MigrationSnapshotStore(path).list()], ['before'])
+
+
+class MigrationSnapshotCommandTests(StateDirTestMixin, TransactionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        connection.prepare_database()
+        self.helper = MigrationRecordsHelper()
+
+    def tearDown(self):
+        call_command('migrate', verbosity=0)
+
+    def snapshot(self, *args: str) -> str:
+        out = io.StringIO()
+        with redirect_stdout(out):
+            call_command('migration_snapshot', *args, verbosity=0)
+        return out.getvalue()
+
+    def graph_state(self):
+        self.helper.invalidate_index()
+        index = self.helper.get_index()
+        return {app: index.latest(app).name if index.latest(app) else None for app in ('graph_a', 'graph_b')}
+
+    def test_save_and_restore(self):
+        call_command('migrate', 'graph_a', '0001_initial', verbosity=0)
+        expected = self.graph_state()
+        self.assertIn('Snapshot before saved', self.snapshot('save', 'before'))
+        self.assertIn('before (ID', self.snapshot('list'))
+
+        # Migrate graph_a forward: the restore rolls it back
+        call_command('migrate', 'graph_a', verbosity=0)
+        self.assertEqual(self.graph_state()['graph_a'], '0003_third')
+        self.snapshot('restore', 'before', '--in-process')
+        self.assertEqual(self.graph_state(), expected)
+        self.assertIn('Already at snapshot before', self.snapshot('restore', 'before', '--in-process'))
+
+        # Roll graph_a back further: the restore migrates it forward
+        call_command('migrate', 'graph_a', 'zero', verbosity=0)
+        self.snapshot('restore', 'before', '--in-process')
+        self.assertEqual(self.graph_state(), expected)
+
+    def test_restore_dry_run(self):
+        self.snapshot('save', 'before')
+        call_command('migrate', 'graph_a', '0002_second', verbosity=0)
+        out = self.snapshot('restore', 'before', '--dry-run')
+        self.assertIn('graph_a 0003_third', out)
+        self.assertEqual(self.graph_state()['graph_a'], '0002_second')
+
+    def test_unknown_snapshot(self):
+        with self.assertRaisesMessage(CommandError, 'No snapshot named missing'):
+            self.snapshot('restore', 'missing')
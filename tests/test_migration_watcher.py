@@ -0,0 +1,144 @@
+import io
+import json
+import threading
+from contextlib import redirect_stdout
+from typing import Callable, List, Optional
+from unittest import mock
+
+from django.core.management import call_command, CommandError
+from django.db import DatabaseError
+from django.db.migrations.recorder import MigrationRecorder
+from django.test import TestCase
+
+from vmigration_helper.helpers.migration_records import MigrationRecordsHelper
+from vmigration_helper.helpers.migration_watcher import EVENT_ADDED, EVENT_REMOVED, MigrationWatcher
+from vmigration_helper.management.commands.migration_watch import Command as WatchCommand
+
+Migration = MigrationRecorder.Migration
+
+
+class MigrationWatcherTests(TestCase):
+
+    def setUp(self):
+        self.watcher = MigrationWatcher(MigrationRecordsHelper(), chunk_size=3)
+        self.watcher.load()
+
+    def assertInSync(self):
+        records = list(Migration.objects.order_by('id').values_list('id', 'app', 'name'))
+        self.assertEqual(list(zip(self.watcher.ids, self.watcher.apps, self.watcher.names)), records)
+
+    def events(self) -> List[tuple]:
+        return [(change['event'], change['id'], change['app'], change['name']) for change in self.watcher.poll()]
+
+    def test_load(self):
+        self.assertInSync()
+        self.assertEqual(self.watcher.max_id, Migration.objects.latest('id').id)
+
+    def test_no_changes(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.watcher.poll(), [])
+
+    def test_added(self):
+        first = Migration.objects.create(app='graph_a', name='0004_new')
+        second = Migration.objects.create(app='graph_b', name='0004_new')
+        changes = self.watcher.poll()
+        self.assertEqual(
+            [(change['event'], change['id'], change['app'], change['name']) for change in changes],
+            [(EVENT_ADDED, first.id, 'graph_a', '0004_new'), (EVENT_ADDED, second.id, 'graph_b', '0004_new')],
+        )
+        self.assertTrue(all('applied' in change for change in changes))
+        self.assertInSync()
+        self.assertEqual(self.watcher.poll(), [])
+
+    def test_removed(self):
+        old = Migration.objects.filter(app='graph_a').order_by('id').last()
+        oldest = Migration.objects.order_by('id').first()
+        Migration.objects.filter(id__in=[old.id, oldest.id]).delete()
+        self.assertEqual(self.events(), [
+            (EVENT_REMOVED, old.id, 'graph_a', old.name),
+            (EVENT_REMOVED, oldest.id, oldest.app, oldest.name),
+        ])
+        self.assertInSync()
+        self.assertEqual(self.watcher.poll(), [])
+
+    def test_latest_removed(self):
+        latest = Migration.objects.latest('id')
+        Migration.objects.filter(id=latest.id).delete()
+        self.assertEqual(self.events(), [(EVENT_REMOVED, latest.id, latest.app, latest.name)])
+        self.assertInSync()
+
+    def test_removed_and_added(self):
+        # The count does not change, but the max ID does
+        removed = Migration.objects.get(app='graph_b', name='0001_initial')
+        Migration.objects.filter(id=removed.id).delete()
+        added = Migration.objects.create(app='graph_b', name='0001_initial')
+        self.assertEqual(self.events(), [
+            (EVENT_REMOVED, removed.id, 'graph_b', '0001_initial'),
+            (EVENT_ADDED, added.id, 'graph_b', '0001_initial'),
+        ])
+        self.assertInSync()
+
+    def test_all_removed(self):
+        count = Migration.objects.count()
+        Migration.objects.all().delete()
+        self.assertEqual(len(self.events()), count)
+        self.assertEqual((self.watcher.max_id, len(self.watcher.ids)), (0, 0))
+
+
+class StopEvent:
+    """
+    Stands in for the stop event of the watch command: records the intervals waited instead of waiting, calling the
+    function given (if any) on each wait.
+    """
+
+    def __init__(self, on_wait: Optional[Callable[[int], None]] = None) -> None:
+        self.intervals = []  # type: List[float]
+        self.on_wait = on_wait
+
+    def is_set(self) -> bool:
+        return False
+
+    def wait(self, interval: float) -> None:
+        self.intervals.append(interval)
+        if self.on_wait:
+            self.on_wait(len(self.intervals))
+
+
+class MigrationWatchCommandTests(TestCase):
+
+    def watch(self, stop: StopEvent, polls: int) -> List[dict]:
+        command = WatchCommand()
+        command._lock = threading.Lock()
+        command._stop = stop
+        out = io.StringIO()
+        with redirect_stdout(out):
+            command._watch('default', {'interval': 1.0, 'max_interval': 4.0, 'polls': polls})
+        return [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_backoff(self):
+        def on_wait(waits: int) -> None:
+            if waits == 3:
+                Migration.objects.create(app='graph_a', name='0004_new')
+
+        stop = StopEvent(on_wait)
+        events = self.watch(stop, polls=5)
+        # Doubles while nothing changes (up to --max-interval), back to --interval after a change
+        self.assertEqual(stop.intervals, [1.0, 2.0, 4.0, 1.0, 2.0])
+        self.assertEqual([event['event'] for event in events], ['watching', 'added'])
+        self.assertLess(events[0]['max_id'], events[1]['id'])
+        self.assertEqual(
+            (events[1]['connection'], events[1]['app'], events[1]['name']), ('default', 'graph_a', '0004_new')
+        )
+
+    def test_error(self):
+        stop = StopEvent()
+        with mock.patch.object(MigrationWatcher, 'poll', side_effect=[DatabaseError('gone'), []]):
+            events = self.watch(stop, polls=2)
+        self.assertEqual(stop.intervals, [1.0, 4.0])
+        self.assertEqual([event['event'] for event in events], ['watching', 'error'])
+        self.assertEqual(events[1]['error'], 'gone')
+
+    def test_invalid_intervals(self):
+        for args in (['--interval', '0'], ['--interval', '5', '--max-interval', '2']):
+            with self.subTest(args), self.assertRaises(CommandError):
+                call_command('migration_watch', *args)
@@ -0,0 +1,109 @@
+import io
+import json
+from contextlib import redirect_stderr, redirect_stdout
+
+from django.core.management import call_command, CommandError
+from django.db import connection, connections
+from django.test import TestCase
+
+from vmigration_helper.helpers.profiling import Profiler
+from tests.utils import StateDirTestMixin
+
+
+def query(alias: str = 'default') -> None:
+    with connections[alias].cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+class ProfilerTests(TestCase):
+
+    def profile(self, enabled: bool = True) -> Profiler:
+        profiler = Profiler(enabled=enabled)
+        connection.ensure_connection()
+        profiler.install()
+        self.addCleanup(profiler.uninstall)
+        return profiler
+
+    def test_queries_are_attributed_to_the_innermost_phase(self):
+        profiler = self.profile()
+        with profiler.phase('outer', app='graph_a'):
+            query()
+            with profiler.phase('inner'):
+                query()
+                query()
+        query()
+
+        summary = profiler.summary(command='test')
+        self.assertEqual(summary['command'], 'test')
+        self.assertEqual(summary['queries']['count'], 4)
+        self.assertEqual(summary['queries']['by_connection']['default']['count'], 4)
+        outer, inner = summary['phases']
+        self.assertEqual((outer['phase'], outer['app'], outer['queries']), ('outer', 'graph_a', 1))
+        self.assertEqual((inner['phase'], inner['queries']), ('inner', 2))
+        self.assertGreaterEqual(outer['seconds'], inner['seconds'])
+        self.assertLessEqual(outer['started'], inner['started'])
+        json.dumps(summary)
+
+    def test_uninstall(self):
+        profiler = self.profile()
+        query()
+        profiler.uninstall()
+        self.assertNotIn(profiler, connection.execute_wrappers)
+        query()
+        self.assertEqual(profiler.summary()['queries']['count'], 1)
+
+    def test_phase_of_a_failing_block(self):
+        profiler = self.profile()
+        with self.assertRaises(ValueError):
+            with profiler.phase('failing'):
+                raise ValueError
+        self.assertEqual([entry['phase'] for entry in profiler.summary()['phases']], ['failing'])
+
+    def test_subprocesses(self):
+        profiler = Profiler()
+        profiler.record_subprocess('python manage.py migrate graph_a 0002_second', 1.5, 1)
+        self.assertEqual(
+            profiler.summary()['subprocesses'],
+            [{'command': 'python manage.py migrate graph_a 0002_second', 'seconds': 1.5, 'returncode': 1}],
+        )
+
+    def test_disabled(self):
+        profiler = self.profile(enabled=False)
+        self.assertNotIn(profiler, connection.execute_wrappers)
+        with profiler.phase('ignored'):
+            query()
+        profiler.record_subprocess('python manage.py migrate', 1.0, 0)
+        summary = profiler.summary()
+        self.assertEqual((summary['queries']['count'], summary['phases'], summary['subprocesses']), (0, [], []))
+
+
+class ProfileOptionTests(StateDirTestMixin, TestCase):
+
+    def test_profile_file(self):
+        profile_file = self.state_dir / 'profile.json'
+        with redirect_stdout(io.StringIO()):
+            call_command('migration_records', '--profile-file', str(profile_file))
+        summary = json.loads(profile_file.read_text())
+        self.assertEqual(
+            (summary['command'], summary['connections'], summary['status']), ('migration_records', ['default'], 'ok')
+        )
+        self.assertGreaterEqual(summary['queries']['count'], 1)
+        self.assertIn('connect', [entry['phase'] for entry in summary['phases']])
+
+    def test_profile_to_stderr(self):
+        stderr = io.StringIO()
+        with redirect_stdout(io.StringIO()), redirect_stderr(stderr):
+            call_command('migration_records', '--profile', '--format', 'jsonl')
+        self.assertEqual(json.loads(stderr.getvalue())['status'], 'ok')
+
+    def test_profile_of_a_failed_command(self):
+        stderr = io.StringIO()
+        with redirect_stdout(io.StringIO()), redirect_stderr(stderr), self.assertRaises(CommandError):
+            call_command('migration_records', '--profile', '--applied-after', 'yesterday')
+        self.assertEqual(json.loads(stderr.getvalue())['status'], 'error')
+
+    def test_no_profile(self):
+        stderr = io.StringIO()
+        with redirect_stdout(io.StringIO()), redirect_stderr(stderr):
+            call_command('migration_records')
+        self.assertEqual(stderr.getvalue(), '')
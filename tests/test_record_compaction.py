@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+from typing import List, Tuple
+
+from django.db.migrations import Migration
+from django.test import SimpleTestCase
+
+from vmigration_helper.helpers.migration_record_index import MigrationRecordIndex
+from vmigration_helper.helpers.record_compaction import plan_compaction
+
+
+def disk(*migrations: Tuple[str, str, List[Tuple[str, str]]]) -> SimpleNamespace:
+    """
+    Returns a stand-in for the MigrationLoader of the (app, name, replaces) migrations on disk given.
+    """
+    disk_migrations = {}
+    for app, name, replaces in migrations:
+        migration = Migration(name, app)
+        migration.replaces = replaces
+        disk_migrations[app, name] = migration
+    return SimpleNamespace(disk_migrations=disk_migrations, migrated_apps={app for app, _ in disk_migrations})
+
+
+class PlanCompactionTests(SimpleTestCase):
+
+    def test_squash_completed(self):
+        # The replaced migration files and the "replaces" of the squashed migration were removed.
+        index = MigrationRecordIndex([
+            (1, 'a', '0001_initial'),
+            (2, 'a', '0002_second'),
+            (3, 'b', '0001_initial'),
+            (4, 'a', '0001_squashed_0002'),
+            (5, 'a', '0003_third'),
+        ])
+        loader = disk(('a', '0001_squashed_0002', []), ('a', '0003_third', []), ('b', '0001_initial', []))
+        plan = plan_compaction(index, loader)
+        self.assertEqual([record.id for record in plan.superseded], [1, 2])
+        self.assertEqual(plan.squashed, [])
+
+    def test_replaced_records_kept(self):
+        replaces = [('a', '0001_initial'), ('a', '0002_second')]
+        index = MigrationRecordIndex([
+            (1, 'a', '0001_initial'),
+            (2, 'a', '0002_second'),
+            (3, 'a', '0001_squashed_0002'),
+        ])
+        loader = disk(
+            ('a', '0001_initial', []), ('a', '0002_second', []), ('a', '0001_squashed_0002', replaces),
+        )
+        plan = plan_compaction(index, loader)
+        self.assertEqual(plan.superseded, [])
+        self.assertEqual(len(plan.squashed), 1)
+        squashed = plan.squashed[0]
+        self.assertEqual((squashed.app, squashed.name, squashed.fully_recorded), ('a', '0001_squashed_0002', True))
+        self.assertEqual([record.id for record in squashed.replaced_records], [1, 2])
+
+    def test_replaced_records_not_fully_recorded(self):
+        replaces = [('a', '0001_initial'), ('a', '0002_second')]
+        index = MigrationRecordIndex([(1, 'a', '0001_initial')])
+        loader = disk(('a', '0001_initial', []), ('a', '0002_second', []), ('a', '0001_squashed_0002', replaces))
+        plan = plan_compaction(index, loader)
+        self.assertEqual([squashed.fully_recorded for squashed in plan.squashed], [False])
+
+    def test_kept_records(self):
+        index = MigrationRecordIndex([
+            (1, 'a', '0001_initial'),
+            # Missing from disk, but no migration on disk was recorded after it
+            (2, 'a', '0002_gone'),
+            (3, 'b', '0001_gone'),
+            # App without migrations on disk
+            (4, 'c', '0001_initial'),
+        ])
+        loader = disk(('a', '0001_initial', []), ('b', '0002_second', []))
+        self.assertEqual(plan_compaction(index, loader).superseded, [])
+
+    def test_apps(self):
+        index = MigrationRecordIndex([
+            (1, 'a', '0001_gone'),
+            (2, 'b', '0001_gone'),
+            (3, 'a', '0002_second'),
+            (4, 'b', '0002_second'),
+        ])
+        loader = disk(('a', '0002_second', []), ('b', '0002_second', []))
+        self.assertEqual([record.id for record in plan_compaction(index, loader).superseded], [1, 2])
+        self.assertEqual([record.id for record in plan_compaction(index, loader, apps=['b']).superseded], [2])
@@ -0,0 +1,105 @@
+import io
+import json
+from datetime import datetime, timezone
+
+from django.test import SimpleTestCase
+
+from vmigration_helper.helpers.record_writer import (
+    FORMAT_CONSOLE, FORMAT_CSV, FORMAT_JSONL, FORMAT_TSV, MigrationRecordWriter, RecordSpool
+)
+
+APPLIED = datetime(2024, 12, 6, 18, 15, 3, tzinfo=timezone.utc)
+RECORDS = [
+    (1, APPLIED, 'auth', '0001_initial'),
+    (12, APPLIED, 'contenttypes', '0002_remove_content_type_name'),
+]
+
+
+def write(print_format: str, records=RECORDS, **kwargs) -> str:
+    out = io.StringIO()
+    writer = MigrationRecordWriter(out, print_format, **kwargs)
+    writer.write_header()
+    writer.write_records(records)
+    writer.flush()
+    return out.getvalue()
+
+
+class MigrationRecordWriterTests(SimpleTestCase):
+
+    def test_csv(self):
+        self.assertEqual(write(FORMAT_CSV).splitlines(), [
+            'ID,Applied,App,Name',
+            '1,2024-12-06T18:15:03+0000,auth,0001_initial',
+            '12,2024-12-06T18:15:03+0000,contenttypes,0002_remove_content_type_name',
+        ])
+
+    def test_tsv(self):
+        self.assertEqual(write(FORMAT_TSV).splitlines()[:2], [
+            'ID\tApplied\tApp\tName',
+            '1\t2024-12-06T18:15:03+0000\tauth\t0001_initial',
+        ])
+
+    def test_jsonl(self):
+        lines = write(FORMAT_JSONL).splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [
+            {'id': 1, 'applied': '2024-12-06T18:15:03+0000', 'app': 'auth', 'name': '0001_initial'},
+            {
+                'id': 12,
+                'applied': '2024-12-06T18:15:03+0000',
+                'app': 'contenttypes',
+                'name': '0002_remove_content_type_name',
+            },
+        ])
+
+    def test_console(self):
+        self.assertEqual(write(FORMAT_CONSOLE).splitlines(), [
+            '    ID Applied                           App Name',
+            '     1 2024-12-06T18:15:03+0000         auth 0001_initial',
+            '    12 2024-12-06T18:15:03+0000 contenttypes 0002_remove_content_type_name',
+        ])
+
+    def test_console_width_of_first_buffer(self):
+        # The width is fixed once the first buffer (the header and one record) is full.
+        lines = write(FORMAT_CONSOLE, buffer_size=2).splitlines()
+        self.assertEqual(lines[:2], [
+            '    ID Applied                    App Name',
+            '     1 2024-12-06T18:15:03+0000  auth 0001_initial',
+        ])
+        self.assertEqual(lines[2], '    12 2024-12-06T18:15:03+0000 contenttypes 0002_remove_content_type_name')
+
+    def test_console_fixed_width(self):
+        self.assertEqual(write(FORMAT_CONSOLE, records=RECORDS[:1], app_name_width=8).splitlines(), [
+            '    ID Applied                       App Name',
+            '     1 2024-12-06T18:15:03+0000     auth 0001_initial',
+        ])
+
+    def test_connection_column(self):
+        out = io.StringIO()
+        writer = MigrationRecordWriter(out, FORMAT_CSV, connection_width=7)
+        writer.write_header()
+        writer.write_records(RECORDS[:1], connection='replica')
+        writer.write_line(writer.format_error('other', 'failed'))
+        writer.flush()
+        self.assertEqual(out.getvalue().splitlines(), [
+            'Connection,ID,Applied,App,Name',
+            'replica,1,2024-12-06T18:15:03+0000,auth,0001_initial',
+            'other,DB ERROR: failed',
+        ])
+
+    def test_unsupported_format(self):
+        with self.assertRaisesMessage(ValueError, 'Unsupported format "xml"'):
+            MigrationRecordWriter(io.StringIO(), 'xml')
+
+
+class RecordSpoolTests(SimpleTestCase):
+
+    def test_read_back(self):
+        spool = RecordSpool()
+        self.addCleanup(spool.close)
+        records = [(i, APPLIED, 'app' * (i % 4), f'{i:04}_migration') for i in range(1, 8)]
+        spool.write(iter(records), chunk_size=3)
+        self.assertEqual(spool.count, 7)
+        self.assertEqual(spool.app_name_width, 9)
+        self.assertEqual(list(spool.read()), records)
+        # Can be read again
+        self.assertEqual(list(spool.read()), records)
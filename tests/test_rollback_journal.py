@@ -0,0 +1,110 @@
+import io
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.db.migrations.exceptions import IrreversibleError
+from django.test import override_settings, TransactionTestCase
+
+from vmigration_helper.helpers.migration_records import MigrationRecordsHelper
+from vmigration_helper.helpers.rollback_journal import RollbackJournal, STATUS_COMPLETED, STATUS_FAILED
+from tests.utils import StateDirTestMixin
+
+
+class RollbackJournalTests(StateDirTestMixin, TransactionTestCase):
+    """
+    Rolls back the graph apps (see tests/graph_*) in-process. graph_c.0002_data cannot be unapplied, so a rollback to
+    before it completes its first target (graph_a, applied after it) and fails on the second.
+    """
+
+    def setUp(self):
+        super().setUp()
+        connection.prepare_database()
+        self.helper = MigrationRecordsHelper()
+        call_command('migrate', 'graph_c', '0001_initial', fake=True, verbosity=0)
+        call_command('migrate', 'graph_a', 'zero', verbosity=0)
+        self.to_id = self.helper.latest_migration_id()
+        call_command('migrate', 'graph_c', verbosity=0)
+        self.graph_c_id = self.helper.latest_migration_id()
+        call_command('migrate', 'graph_a', verbosity=0)
+        call_command('migrate', 'graph_b', verbosity=0)
+
+    def tearDown(self):
+        call_command('migrate', verbosity=0)
+
+    def rollback(self, *args: str) -> str:
+        out = io.StringIO()
+        with redirect_stdout(out):
+            call_command('migration_rollback', *args, '--in-process', '--force', verbosity=0)
+        return out.getvalue()
+
+    def applied(self, app: str):
+        self.helper.invalidate_index()
+        return [record.name for record in self.helper.get_index().range() if record.app == app]
+
+    def journals(self):
+        return sorted((self.state_dir / 'journals').glob('*.json'))
+
+    def fail_rollback(self) -> Path:
+        """
+        Runs the rollback that fails on graph_c, returning its journal.
+        """
+        with self.assertRaises(IrreversibleError):
+            self.rollback(str(self.to_id))
+        [path] = self.journals()
+        journal = RollbackJournal.load(path)
+        self.assertEqual(journal.status, STATUS_FAILED)
+        self.assertEqual(journal.remaining_targets(), [('graph_c', '0001_initial')])
+        self.assertEqual(self.applied('graph_a'), [])
+        return path
+
+    def test_resume(self):
+        path = self.fail_rollback()
+        # Unapply graph_c.0002_data by hand, as one would after a failed target.
+        call_command('migrate', 'graph_c', '0001_initial', fake=True, verbosity=0)
+        out = self.rollback('--resume', str(path))
+        self.assertIn('1 of 2 target(s) already completed', out)
+        self.assertEqual(self.applied('graph_c'), ['0001_initial'])
+        # Completed journals in the default location are deleted.
+        self.assertEqual(self.journals(), [])
+
+    def test_resume_checkpoint_mismatch(self):
+        path = self.fail_rollback()
+        call_command('migrate', 'graph_a', '0001_initial', verbosity=0)
+        with self.assertRaisesMessage(CommandError, 'do not match the checkpoint of the journal'):
+            self.rollback('--resume', str(path))
+        self.assertEqual(RollbackJournal.load(path).status, STATUS_FAILED)
+        self.assertEqual(self.applied('graph_a'), ['0001_initial'])
+
+    def test_journal_kept(self):
+        path = self.state_dir / 'journal.json'
+        self.rollback(str(self.graph_c_id), '--journal', str(path))
+        self.assertEqual(RollbackJournal.load(path).status, STATUS_COMPLETED)
+        self.assertEqual(self.applied('graph_a'), [])
+
+    def test_state_dir_not_writable(self):
+        not_a_dir = self.state_dir / 'file'
+        not_a_dir.write_text('')
+        err = io.StringIO()
+        with override_settings(VMIGRATION_HELPER_STATE_DIR=str(not_a_dir)), redirect_stderr(err):
+            self.rollback(str(self.graph_c_id))
+        self.assertIn('rolling back without one', err.getvalue())
+        self.assertEqual(self.applied('graph_a'), [])
+
+    def test_journal_not_writable(self):
+        not_a_dir = self.state_dir / 'file'
+        not_a_dir.write_text('')
+        with self.assertRaisesMessage(CommandError, 'Could not write the journal'):
+            self.rollback(str(self.graph_c_id), '--journal', str(not_a_dir / 'journal.json'))
+        self.assertEqual(self.applied('graph_a'), ['0001_initial', '0002_second', '0003_third'])
+
+    def test_clean_journals(self):
+        path = self.fail_rollback()
+        out = self.rollback('--clean-journals')
+        self.assertIn('0 journal(s) deleted', out)
+        # Once a record is added, the journal can no longer be resumed.
+        call_command('migrate', 'graph_a', '0001_initial', verbosity=0)
+        out = self.rollback('--clean-journals')
+        self.assertIn('1 journal(s) deleted', out)
+        self.assertFalse(path.exists())
@@ -0,0 +1,121 @@
+import io
+import json
+from contextlib import redirect_stdout
+
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+
+from vmigration_helper.helpers.migration_record_index import IndexedRecord, MigrationRecordIndex
+from vmigration_helper.helpers.migration_records import MigrationRecordsHelper
+from vmigration_helper.helpers.rollback_plan import RollbackPlan
+from vmigration_helper.helpers.rollback_planner import PreflightIssue, SEVERITY_ERROR
+from tests.utils import StateDirTestMixin
+
+ROWS = [(1, 'a', '0001_initial'), (2, 'b', '0001_initial'), (3, 'a', '0002_second'), (4, 'b', '0002_second')]
+
+
+class RollbackPlanTests(StateDirTestMixin, SimpleTestCase):
+
+    def create(self, rows=ROWS) -> RollbackPlan:
+        issue = PreflightIssue(SEVERITY_ERROR, 'b', '0002_second', 'Raw Python operation cannot be reversed')
+        return RollbackPlan.create(
+            'default', 2, MigrationRecordIndex(rows), [('b', '0001_initial'), ('a', '0001_initial')],
+            [[('b', '0001_initial')], [('a', '0001_initial')]], [issue],
+        )
+
+    def test_create(self):
+        plan = self.create()
+        self.assertEqual(plan.records, [IndexedRecord(3, 'a', '0002_second'), IndexedRecord(4, 'b', '0002_second')])
+        self.assertEqual(plan.check(MigrationRecordIndex(ROWS)), [])
+
+    def test_save_and_load(self):
+        plan = self.create()
+        path = self.state_dir / 'plan.json'
+        plan.save(path)
+        self.assertEqual(RollbackPlan.load(path), plan)
+
+    def test_load_invalid(self):
+        path = self.state_dir / 'plan.json'
+        with self.assertRaisesMessage(ValueError, 'No plan found'):
+            RollbackPlan.load(path)
+        path.write_text('{"version": ')
+        with self.assertRaisesMessage(ValueError, 'is not a valid plan'):
+            RollbackPlan.load(path)
+        path.write_text(json.dumps({**self.create().to_json(), 'version': 0}))
+        with self.assertRaisesMessage(ValueError, 'not a plan of version'):
+            RollbackPlan.load(path)
+
+    def test_check_records_rolled_back(self):
+        problems = self.create().check(MigrationRecordIndex(ROWS[:3]))
+        self.assertEqual(problems, ['record 4 (b 0002_second) is no longer recorded as planned'])
+
+    def test_check_records_added(self):
+        problems = self.create().check(MigrationRecordIndex([*ROWS, (5, 'c', '0001_initial')]))
+        self.assertEqual(problems, ['record 5 (c 0001_initial) was added'])
+
+    def test_check_records_changed_before_the_id(self):
+        problems = self.create().check(MigrationRecordIndex([(1, 'a', '0001_initial'), *ROWS[2:]]))
+        self.assertEqual(problems, ['records up to ID 2 changed'])
+
+
+class RollbackPlanFileTests(StateDirTestMixin, TransactionTestCase):
+    """
+    Plans the rollback of graph_a.0003_third (see tests/graph_a) to a file, then runs it.
+    """
+
+    def setUp(self):
+        super().setUp()
+        connection.prepare_database()
+        self.helper = MigrationRecordsHelper()
+        call_command('migrate', 'graph_a', '0002_second', verbosity=0)
+        self.to_id = self.helper.latest_migration_id()
+        call_command('migrate', 'graph_a', verbosity=0)
+        self.plan_path = self.state_dir / 'plan.json'
+
+    def tearDown(self):
+        call_command('migrate', verbosity=0)
+
+    def rollback(self, *args: str) -> str:
+        out = io.StringIO()
+        with redirect_stdout(out):
+            call_command('migration_rollback', *args, '--in-process', verbosity=0)
+        return out.getvalue()
+
+    def applied(self, app: str):
+        self.helper.invalidate_index()
+        return [record.name for record in self.helper.get_index().range() if record.app == app]
+
+    def test_plan_out_then_in(self):
+        out = self.rollback(str(self.to_id), '--plan-out', str(self.plan_path))
+        self.assertIn(f'Plan of 1 target(s) written to {self.plan_path}', out)
+        self.assertIn('0003_third', self.applied('graph_a'))
+        plan = RollbackPlan.load(self.plan_path)
+        self.assertEqual((plan.to_id, plan.targets), (self.to_id, [('graph_a', '0002_second')]))
+
+        self.rollback('--plan-in', str(self.plan_path))
+        self.assertEqual(self.applied('graph_a'), ['0001_initial', '0002_second'])
+
+    def test_records_changed(self):
+        self.rollback(str(self.to_id), '--plan-out', str(self.plan_path))
+        call_command('migrate', 'graph_b', '0002_second', verbosity=0)
+        with self.assertRaisesMessage(CommandError, 'The migration records changed since the plan was made'):
+            self.rollback('--plan-in', str(self.plan_path))
+        self.assertIn('0003_third', self.applied('graph_a'))
+
+    def test_other_id(self):
+        self.rollback(str(self.to_id), '--plan-out', str(self.plan_path))
+        with self.assertRaisesMessage(CommandError, f'The plan rolls back to ID {self.to_id}, not 1'):
+            self.rollback('1', '--plan-in', str(self.plan_path))
+
+    def test_other_connection(self):
+        self.rollback(str(self.to_id), '--plan-out', str(self.plan_path))
+        plan = RollbackPlan.load(self.plan_path)
+        plan._replace(connection='other').save(self.plan_path)
+        with self.assertRaisesMessage(CommandError, 'The plan was made for connection other, not default'):
+            self.rollback('--plan-in', str(self.plan_path))
+
+    def test_invalid_plan(self):
+        self.plan_path.write_text('[]')
+        with self.assertRaisesMessage(CommandError, 'not a plan of version'):
+            self.rollback('--plan-in', str(self.plan_path))
@@ -0,0 +1,135 @@
+import io
+from typing import List, Set, Tuple
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.test import TransactionTestCase
+
+from vmigration_helper.helpers.migration_records import MigrationRecordsHelper
+from vmigration_helper.helpers.migration_runner import InProcessMigrationRunner
+from vmigration_helper.helpers.rollback_planner import RollbackPlanner, SEVERITY_ERROR
+
+GRAPH_APPS = ('graph_a', 'graph_b')
+
+# The order the migrations of the graph apps (see tests/graph_*) are applied in, as (app, target) pairs. graph_b
+# depends on graph_a, and graph_a.0003_third on graph_b.0002_second.
+INTERLEAVED = [
+    ('graph_a', '0001_initial'),
+    ('graph_b', '0001_initial'),
+    ('graph_a', '0002_second'),
+    ('graph_b', '0002_second'),
+    ('graph_a', '0003_third'),
+    ('graph_b', '0003_third'),
+]
+BY_APP = [
+    ('graph_a', '0002_second'),
+    ('graph_b', '0002_second'),
+    ('graph_b', '0003_third'),
+    ('graph_a', '0003_third'),
+]
+
+
+class RollbackPlannerTests(TransactionTestCase):
+    """
+    Rolls back migration histories of the graph apps with the targets planned, and checks the migrations still applied
+    are exactly those recorded up to the ID rolled back to.
+    """
+
+    def setUp(self):
+        connection.prepare_database()
+        self.helper = MigrationRecordsHelper()
+
+    def tearDown(self):
+        call_command('migrate', verbosity=0)
+
+    def apply_history(self, history: List[Tuple[str, str]]) -> None:
+        """
+        Unapplies the graph apps, then migrates to the targets given in order so that their records are appended in
+        that order.
+        """
+        call_command('migrate', 'graph_a', 'zero', verbosity=0)
+        for app, name in history:
+            call_command('migrate', app, name, verbosity=0)
+        self.helper.invalidate_index()
+
+    def applied(self) -> Set[Tuple[str, str]]:
+        self.helper.invalidate_index()
+        return {(record.app, record.name) for record in self.helper.get_index().range()}
+
+    def plan(self, to_id: int) -> List[Tuple[str, str]]:
+        records = self.helper.get_index().range(after_id=to_id)[::-1]
+        return RollbackPlanner(self.helper, MigrationLoader(connection)).plan(records)
+
+    def roll_back(self, to_id: int) -> List[Tuple[str, str]]:
+        """
+        Plans and runs the rollback to the ID given, checking the migrations applied afterwards.
+
+        :returns: the targets run
+        """
+        expected = {(record.app, record.name) for record in self.helper.get_index().range(until_id=to_id)}
+        targets = self.plan(to_id)
+        runner = InProcessMigrationRunner(connection, stdout=io.StringIO())
+        for app, name in targets:
+            runner.run(app, name)
+        self.assertEqual(self.applied(), expected)
+        return targets
+
+    def graph_record_ids(self) -> List[int]:
+        return [record.id for record in self.helper.get_index().range() if record.app in GRAPH_APPS]
+
+    def assert_every_rollback(self, history: List[Tuple[str, str]]) -> None:
+        # Roll back to just before the first record of the graph apps, and to each of their records. The records get
+        # new IDs each time the history is applied again.
+        self.apply_history(history)
+        for position in range(len(self.graph_record_ids()) + 1):
+            self.apply_history(history)
+            ids = self.graph_record_ids()
+            to_id = ([ids[0] - 1] + ids)[position]
+            with self.subTest(position=position):
+                targets = self.roll_back(to_id)
+                self.assertEqual(len({app for app, _ in targets}), len(targets), 'more than one target per app')
+
+    def test_interleaved_history(self):
+        self.assert_every_rollback(INTERLEAVED)
+
+    def test_history_by_app(self):
+        self.assert_every_rollback(BY_APP)
+
+    def test_dependent_app_rolled_back_once(self):
+        self.apply_history(INTERLEAVED)
+        ids = self.graph_record_ids()
+        # Rolling back to graph_b.0001_initial: graph_b goes back first (which also unapplies graph_a.0003_third), so
+        # graph_a is migrated once, straight to 0001_initial.
+        self.assertEqual(self.roll_back(ids[1]), [('graph_b', '0001_initial'), ('graph_a', '0001_initial')])
+
+    def test_rollback_side_effect_skipped(self):
+        self.apply_history(BY_APP)
+        ids = self.graph_record_ids()
+        # Unapplying graph_a.0001_initial unapplies all of graph_b, so no target is planned for graph_b.
+        self.assertEqual(self.roll_back(ids[0] - 1), [('graph_a', 'zero')])
+
+    def test_nothing_to_roll_back(self):
+        self.assertEqual(self.plan(self.helper.get_index().max_id), [])
+
+    def test_preflight(self):
+        planner = RollbackPlanner(self.helper, MigrationLoader(connection))
+        issues = planner.preflight([('graph_c', 'zero'), ('graph_b', '0001_initial')])
+        self.assertEqual(
+            [(issue.severity, issue.app, issue.name) for issue in issues],
+            [(SEVERITY_ERROR, 'graph_c', '0002_data')],
+        )
+        issues = planner.preflight([('graph_a', 'unknown')])
+        self.assertEqual([(issue.severity, issue.app) for issue in issues], [(SEVERITY_ERROR, 'graph_a')])
+
+    def test_group_independent(self):
+        planner = RollbackPlanner(self.helper, MigrationLoader(connection))
+        self.assertEqual(
+            planner.group_independent([('graph_c', 'zero'), ('graph_b', 'zero')]),
+            [[('graph_c', 'zero')], [('graph_b', 'zero')]],
+        )
+        # Unapplying graph_a.0001_initial unapplies all of graph_b: the targets overlap.
+        self.assertEqual(
+            planner.group_independent([('graph_b', '0001_initial'), ('graph_c', 'zero'), ('graph_a', 'zero')]),
+            [[('graph_b', '0001_initial'), ('graph_a', 'zero')], [('graph_c', 'zero')]],
+        )
@@ -0,0 +1,112 @@
+import io
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import mock
+
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.db.migrations import Migration, RunPython, RunSQL
+from django.test import SimpleTestCase, TransactionTestCase
+
+from vmigration_helper.helpers.migration_records import MigrationRecordsHelper
+from vmigration_helper.helpers.rollback_sql import non_sql_operations
+from tests.utils import StateDirTestMixin
+
+
+def forwards(apps, schema_editor):
+    pass
+
+
+class NonSqlOperationsTests(SimpleTestCase):
+
+    def test_non_sql_operations(self):
+        migration = Migration('0002_data', 'app')
+        migration.operations = [
+            RunPython(forwards, forwards),
+            RunPython(forwards, RunPython.noop),
+            RunPython(forwards),
+            RunSQL('SELECT 1', 'SELECT 2'),
+        ]
+        # The one without reverse_code is irreversible, which the rollback pre-flight check reports.
+        self.assertEqual(non_sql_operations(migration), [migration.operations[0].describe()])
+
+
+class EmitSqlTests(StateDirTestMixin, TransactionTestCase):
+    """
+    Writes the SQL of rollbacks of the graph apps (see tests/graph_*), whose migrations have no operations except for
+    graph_c.0002_data, a RunPython without reverse_code.
+    """
+
+    def setUp(self):
+        super().setUp()
+        connection.prepare_database()
+        self.helper = MigrationRecordsHelper()
+        call_command('migrate', 'graph_c', '0001_initial', fake=True, verbosity=0)
+        self.graph_c_id = self.helper.latest_migration_id()
+        call_command('migrate', 'graph_c', verbosity=0)
+        call_command('migrate', 'graph_a', '0002_second', verbosity=0)
+        self.graph_a_id = self.helper.latest_migration_id()
+        call_command('migrate', 'graph_a', verbosity=0)
+        self.sql_path = self.state_dir / 'rollback.sql'
+
+    def tearDown(self):
+        call_command('migrate', verbosity=0)
+
+    def emit_sql(self, *args: str) -> str:
+        out = io.StringIO()
+        with redirect_stdout(out), redirect_stderr(io.StringIO()):
+            call_command('migration_rollback', *args, verbosity=0)
+        return out.getvalue()
+
+    def records(self):
+        self.helper.invalidate_index()
+        return self.helper.get_index().range()
+
+    def test_emit_sql(self):
+        records = self.records()
+        out = self.emit_sql(str(self.graph_a_id), '--emit-sql', str(self.sql_path))
+        self.assertEqual(out, f'SQL to unapply 1 migration(s) written to {self.sql_path}\n')
+        script = self.sql_path.read_text()
+        self.assertIn(f'-- Rollback of default to migration record ID {self.graph_a_id}', script)
+        self.assertIn('-- Unapply graph_a.0003_third', script)
+        self.assertIn(
+            'DELETE FROM "django_migrations" WHERE "app" = \'graph_a\' AND "name" = \'0003_third\';', script
+        )
+        # Nothing was rolled back
+        self.assertEqual(self.records(), records)
+
+    def test_emit_sql_to_stdout(self):
+        out = self.emit_sql(str(self.graph_a_id), '--emit-sql', '-')
+        self.assertTrue(out.startswith(f'-- Rollback of default to migration record ID {self.graph_a_id}\n'))
+        self.assertIn('-- Unapply graph_a.0003_third', out)
+
+    def test_irreversible_migration(self):
+        with self.assertRaisesMessage(CommandError, 'Did not write the SQL because of the errors above'):
+            self.emit_sql(str(self.graph_c_id), '--emit-sql', str(self.sql_path))
+        self.assertFalse(self.sql_path.exists())
+
+        self.emit_sql(str(self.graph_c_id), '--emit-sql', str(self.sql_path), '--force')
+        script = self.sql_path.read_text()
+        self.assertIn('-- Unapply graph_c.0002_data', script)
+        self.assertIn('-- IRREVERSIBLE, NO SQL WRITTEN', script)
+
+    def test_non_sql_operation(self):
+        with mock.patch(
+            'vmigration_helper.helpers.rollback_sql.non_sql_operations', return_value=['Raw Python operation']
+        ):
+            out = io.StringIO()
+            with redirect_stdout(out), self.assertRaisesMessage(CommandError, 'use --force to write the SQL anyway'):
+                call_command('migration_rollback', str(self.graph_a_id), '--emit-sql', str(self.sql_path))
+        self.assertIn('ERROR graph_a 0003_third: cannot be written as SQL: Raw Python operation', out.getvalue())
+        self.assertFalse(self.sql_path.exists())
+
+    def test_preflight_of_stdout_script_goes_to_stderr(self):
+        out, err = io.StringIO(), io.StringIO()
+        with redirect_stdout(out), redirect_stderr(err):
+            call_command('migration_rollback', str(self.graph_c_id), '--emit-sql', '-', '--force')
+        self.assertIn('Pre-flight check: 1 error(s)', err.getvalue())
+        self.assertNotIn('Pre-flight check', out.getvalue())
+        self.assertTrue(out.getvalue().startswith('-- Rollback of default'))
+
+    def test_plan_out(self):
+        with self.assertRaisesMessage(CommandError, '--emit-sql cannot be given with --plan-out'):
+            self.emit_sql(str(self.graph_a_id), '--emit-sql', '-', '--plan-out', str(self.state_dir / 'plan.json'))
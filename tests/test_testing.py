@@ -0,0 +1,37 @@
+import io
+import unittest
+
+from django.core.management import call_command
+from django.db.migrations.recorder import MigrationRecorder
+from django.test import TransactionTestCase
+
+from vmigration_helper.testing import MigrationResetTestRunner
+
+MODULES = ['tests.reset_modules.first', 'tests.reset_modules.second']
+
+
+class MigrationResetTestRunnerTests(TransactionTestCase):
+    """
+    Runs the tests of tests/reset_modules (which migrate the test database) with the runner, over the test database
+    already set up.
+    """
+
+    def tearDown(self):
+        call_command('migrate', verbosity=0)
+
+    def test_reset_between_modules(self):
+        runner = MigrationResetTestRunner(verbosity=0)
+        suite = runner.build_suite(MODULES)
+        runner.resetter.capture(['default'])
+        result = unittest.TextTestRunner(stream=io.StringIO(), verbosity=0).run(suite)
+        self.assertEqual((result.errors, result.failures), ([], []))
+        self.assertEqual(result.testsRun, 2)
+        self.assertEqual(runner.resetter.resets, 1)
+        # No reset after the last module
+        self.assertFalse(MigrationRecorder.Migration.objects.filter(app='graph_a', name='0003_third').exists())
+
+    def test_module_suites(self):
+        runner = MigrationResetTestRunner(verbosity=0)
+        suites = list(runner.build_suite(MODULES))
+        self.assertEqual([suite.countTestCases() for suite in suites], [1, 1])
+        self.assertEqual([suite.resetter for suite in suites], [None, runner.resetter])
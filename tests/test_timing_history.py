@@ -0,0 +1,186 @@
+import io
+import json
+from contextlib import redirect_stderr, redirect_stdout
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings, SimpleTestCase, TransactionTestCase
+
+from vmigration_helper.helpers.migration_records import MigrationRecordsHelper
+from vmigration_helper.helpers.timing_history import MAX_SAMPLES, MigrationTiming, TimingHistory
+from tests.utils import StateDirTestMixin
+
+
+class TimingHistoryTests(StateDirTestMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.path = self.state_dir / 'timings.json'
+
+    def history(self, path=None):
+        """
+        Returns a history of the file given (the default one if None) and what it warned about.
+        """
+        err = io.StringIO()
+        with redirect_stderr(err):
+            history = TimingHistory(path)
+        return history, err
+
+    def test_record_and_estimate(self):
+        history, _ = self.history()
+        history.record('default', [
+            MigrationTiming('app', '0002_second', True, 1.0),
+            MigrationTiming('app', '0002_second', True, 3.0),
+            MigrationTiming('app', '0002_second', True, 2.5),
+            MigrationTiming('app', '0002_second', False, 7.0),
+        ])
+        self.assertEqual(history.estimate('default', 'app', '0002_second'), 2.5)
+        self.assertEqual(history.estimate('default', 'app', '0002_second', backwards=False), 7.0)
+        self.assertIsNone(history.estimate('other', 'app', '0002_second'))
+        self.assertIsNone(history.estimate('default', 'app', '0001_initial'))
+        self.assertFalse(self.path.exists())
+
+        history.save()
+        saved, err = self.history()
+        self.assertEqual(err.getvalue(), '')
+        self.assertEqual(saved.estimate('default', 'app', '0002_second'), 2.5)
+        [stats] = [stat for stat in saved.stats('default') if stat.direction == 'backwards']
+        self.assertEqual((stats.runs, stats.median, stats.max, stats.last), (3, 2.5, 3.0, 2.5))
+
+    def test_samples_are_capped(self):
+        history, _ = self.history()
+        history.record('default', [MigrationTiming('app', '0001_initial', True, i) for i in range(MAX_SAMPLES + 5)])
+        [stats] = history.stats()
+        self.assertEqual((stats.runs, stats.max), (MAX_SAMPLES + 5, MAX_SAMPLES + 4))
+        history.save()
+        entry = json.loads(self.path.read_text())['connections']['default']['app']['0001_initial']['backwards']
+        self.assertEqual(entry['samples'], [float(i) for i in range(5, MAX_SAMPLES + 5)])
+
+    def test_concurrent_saves_are_merged(self):
+        first, _ = self.history()
+        second, _ = self.history()
+        first.record('default', [MigrationTiming('app', '0001_initial', True, 1.0)])
+        second.record('other', [MigrationTiming('app', '0001_initial', True, 2.0)])
+        first.save()
+        second.save()
+        history, _ = self.history()
+        self.assertEqual(history.estimate('default', 'app', '0001_initial'), 1.0)
+        self.assertEqual(history.estimate('other', 'app', '0001_initial'), 2.0)
+
+    def test_corrupt_file(self):
+        self.path.write_text('{"version": ')
+        history, err = self.history()
+        self.assertIn('WARNING: Cannot read the timing history, continuing without it', err.getvalue())
+        self.assertEqual(history.stats(), [])
+
+        # Timings are dropped rather than overwriting the file
+        history.record('default', [MigrationTiming('app', '0001_initial', True, 1.0)])
+        with redirect_stderr(io.StringIO()) as err:
+            history.save()
+        self.assertEqual(err.getvalue(), '')  # Warned once only
+        self.assertEqual(self.path.read_text(), '{"version": ')
+
+    def test_unexpected_content(self):
+        self.path.write_text(json.dumps({'version': 1, 'connections': []}))
+        history, err = self.history()
+        self.assertIn('WARNING: Ignoring the timing history', err.getvalue())
+        self.assertEqual(history.stats(), [])
+
+    def test_unwritable_file(self):
+        (self.state_dir / 'file').write_text('not a directory')
+        history, err = self.history(self.state_dir / 'file' / 'timings.json')
+        self.assertIn('WARNING: Cannot read the timing history', err.getvalue())
+        history.record('default', [MigrationTiming('app', '0001_initial', True, 1.0)])
+        self.assertEqual(history.estimate('default', 'app', '0001_initial'), 1.0)
+        with redirect_stderr(io.StringIO()):
+            history.save()
+
+    def test_unwritable_state_dir(self):
+        (self.state_dir / 'file').write_text('not a directory')
+        with override_settings(VMIGRATION_HELPER_STATE_DIR=str(self.state_dir / 'file' / 'state')):
+            history, err = self.history()
+        self.assertIn('WARNING: Cannot read the timing history', err.getvalue())
+        self.assertEqual(history.stats(), [])
+
+
+class MigrationTimingsCommandTests(StateDirTestMixin, SimpleTestCase):
+
+    def timings(self, *args: str) -> str:
+        out = io.StringIO()
+        with redirect_stdout(out):
+            call_command('migration_timings', *args)
+        return out.getvalue()
+
+    def test_no_history(self):
+        self.assertEqual(self.timings(), 'No timing history for default.\n')
+        self.assertEqual(self.timings('--format', 'jsonl'), '')
+
+    def test_slowest_first(self):
+        history = TimingHistory()
+        history.record('default', [
+            MigrationTiming('graph_a', '0002_second', True, 1.0),
+            MigrationTiming('graph_b', '0002_second', True, 3.0),
+            MigrationTiming('graph_b', '0002_second', False, 2.0),
+        ])
+        history.record('other', [MigrationTiming('graph_c', '0001_initial', True, 9.0)])
+        history.save()
+
+        lines = [json.loads(line) for line in self.timings('--format', 'jsonl').splitlines()]
+        self.assertEqual(
+            [(line['app'], line['direction'], line['median']) for line in lines],
+            [('graph_b', 'backwards', 3.0), ('graph_b', 'forwards', 2.0), ('graph_a', 'backwards', 1.0)],
+        )
+        lines = self.timings('--direction', 'backwards', '--limit', '1').splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn('graph_b 0002_second', lines[1])
+        self.assertNotIn('graph_b', self.timings('--app', 'graph_a'))
+
+
+class RollbackTimingsTests(StateDirTestMixin, TransactionTestCase):
+    """
+    Times rollbacks of graph_a.0003_third (see tests/graph_a).
+    """
+
+    def setUp(self):
+        super().setUp()
+        connection.prepare_database()
+        self.helper = MigrationRecordsHelper()
+        call_command('migrate', 'graph_a', '0002_second', verbosity=0)
+        self.to_id = self.helper.latest_migration_id()
+        call_command('migrate', 'graph_a', verbosity=0)
+        self.path = self.state_dir / 'timings.json'
+
+    def tearDown(self):
+        call_command('migrate', verbosity=0)
+
+    def rollback(self, *args: str):
+        out, err = io.StringIO(), io.StringIO()
+        with redirect_stdout(out), redirect_stderr(err):
+            call_command('migration_rollback', str(self.to_id), '--in-process', *args, verbosity=0)
+        return out.getvalue(), err.getvalue()
+
+    def test_rollback_is_timed(self):
+        self.rollback()
+        estimate = TimingHistory().estimate('default', 'graph_a', '0003_third')
+        self.assertIsNotNone(estimate)
+
+        call_command('migrate', 'graph_a', verbosity=0)
+        out, _ = self.rollback('--dry-run')
+        self.assertIn('Estimated duration (from the timing history of default):', out)
+        self.assertIn('(1 migration(s), 0 without history)', out)
+
+    def test_no_timing_history(self):
+        self.rollback('--no-timing-history')
+        self.assertFalse(self.path.exists())
+
+    def test_dry_run_records_nothing(self):
+        out, _ = self.rollback('--dry-run')
+        self.assertIn('(1 migration(s), 1 without history)', out)
+        self.assertFalse(self.path.exists())
+
+    def test_corrupt_history(self):
+        self.path.write_text('[')
+        _, err = self.rollback()
+        self.assertIn('WARNING: Cannot read the timing history', err)
+        self.assertEqual(self.helper.latest_migration_id(), self.to_id)
+        self.assertEqual(self.path.read_text(), '[')
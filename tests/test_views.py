@@ -0,0 +1,123 @@
+import asyncio
+import json
+from unittest import mock
+
+from django.db import DatabaseError
+from django.db.migrations.recorder import MigrationRecorder
+from django.test import override_settings, TestCase
+from django.urls import reverse
+
+from vmigration_helper.views import CachedState, MigrationStateCache, state_cache
+
+URL = reverse('vmigration_helper:migration_state')
+
+
+class MigrationStateViewTests(TestCase):
+
+    def setUp(self):
+        state_cache.clear()
+        self.addCleanup(state_cache.clear)
+
+    async def test_state(self):
+        response = await self.async_client.get(URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response['Cache-Control'], 'max-age=2')
+        state = json.loads(response.content)
+        latest = await MigrationRecorder.Migration.objects.alatest('id')
+        self.assertEqual((state['connection'], state['id']), ('default', latest.id))
+        self.assertEqual(state['apps']['graph_a'], '0003_third')
+        self.assertEqual(state['apps']['graph_c'], '0002_data')
+
+    async def test_not_modified(self):
+        etag = (await self.async_client.get(URL))['ETag']
+        response = await self.async_client.get(URL, headers={'If-None-Match': etag})
+        self.assertEqual((response.status_code, response.content, response['ETag']), (304, b'', etag))
+        response = await self.async_client.get(URL, headers={'If-None-Match': '"stale", ' + etag})
+        self.assertEqual(response.status_code, 304)
+        response = await self.async_client.get(URL, headers={'If-None-Match': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(VMIGRATION_HELPER_STATE_TTL=60)
+    async def test_cached_for_the_ttl(self):
+        etag = (await self.async_client.get(URL))['ETag']
+        await MigrationRecorder.Migration.objects.acreate(app='graph_a', name='0004_new')
+        response = await self.async_client.get(URL)
+        self.assertEqual(response['ETag'], etag)
+
+        state_cache.clear()
+        response = await self.async_client.get(URL)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(json.loads(response.content)['apps']['graph_a'], '0004_new')
+
+    @override_settings(VMIGRATION_HELPER_STATE_TTL=0)
+    async def test_expired(self):
+        etag = (await self.async_client.get(URL))['ETag']
+        await MigrationRecorder.Migration.objects.acreate(app='graph_a', name='0004_new')
+        self.assertNotEqual((await self.async_client.get(URL))['ETag'], etag)
+
+    async def test_head(self):
+        response = await self.async_client.head(URL)
+        self.assertEqual(response.status_code, 200)
+
+    async def test_method_not_allowed(self):
+        response = await self.async_client.post(URL)
+        self.assertEqual(response.status_code, 405)
+
+    async def test_unknown_connection(self):
+        response = await self.async_client.get(URL, {'connection': 'nope'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(json.loads(response.content), {'error': 'Unknown connection nope'})
+
+    async def test_database_error(self):
+        with mock.patch.object(MigrationStateCache, '_load', side_effect=DatabaseError('no such table')):
+            response = await self.async_client.get(URL)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(json.loads(response.content), {'connection': 'default', 'error': 'no such table'})
+        # Errors are not cached
+        self.assertEqual((await self.async_client.get(URL)).status_code, 200)
+
+
+class MigrationStateCacheTests(TestCase):
+
+    async def test_concurrent_requests_are_coalesced(self):
+        cache = MigrationStateCache()
+        release = asyncio.Event()
+        loads = []
+
+        async def load(alias, ttl):
+            loads.append(alias)
+            await release.wait()
+            return CachedState(alias.encode(), f'"{alias}"', float('inf'))
+
+        with mock.patch.object(MigrationStateCache, '_load', side_effect=load):
+            requests = [asyncio.ensure_future(cache.get('default', 2.0)) for _ in range(5)]
+            other = asyncio.ensure_future(cache.get('other', 2.0))
+            await asyncio.sleep(0)
+            release.set()
+            states = await asyncio.gather(*requests, other)
+            self.assertEqual(sorted(loads), ['default', 'other'])
+            self.assertEqual({state.etag for state in states[:5]}, {'"default"'})
+            self.assertEqual(states[5].etag, '"other"')
+
+            # Served from the cache from now on
+            await cache.get('default', 2.0)
+            self.assertEqual(len(loads), 2)
+
+    async def test_cancelled_request_does_not_cancel_the_others(self):
+        cache = MigrationStateCache()
+        release = asyncio.Event()
+
+        async def load(alias, ttl):
+            await release.wait()
+            return CachedState(b'{}', '"state"', float('inf'))
+
+        with mock.patch.object(MigrationStateCache, '_load', side_effect=load):
+            first = asyncio.ensure_future(cache.get('default', 2.0))
+            second = asyncio.ensure_future(cache.get('default', 2.0))
+            await asyncio.sleep(0)
+            first.cancel()
+            release.set()
+            self.assertEqual((await second).etag, '"state"')
+            with self.assertRaises(asyncio.CancelledError):
+                await first
@@ -0,0 +1,20 @@
+import tempfile
+from pathlib import Path
+
+from django.test import override_settings
+
+
+class StateDirTestMixin:
+    """
+    Points the state directory of the app (settings.VMIGRATION_HELPER_STATE_DIR) to a temporary directory for each
+    test, so that snapshots, journals, caches and timings do not leak between tests.
+    """
+
+    def setUp(self):
+        super().setUp()
+        state_dir = tempfile.TemporaryDirectory(prefix='vmigration-tests-')
+        self.addCleanup(state_dir.cleanup)
+        self.state_dir = Path(state_dir.name)
+        settings_override = override_settings(VMIGRATION_HELPER_STATE_DIR=str(self.state_dir))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
@@ -0,0 +1,197 @@
+"""
+The "vmigration-helper" console script: fast-start versions of the read-only commands ("current-id" and "records").
+
+Unlike "manage.py", the script does not call django.setup(): the settings module is only read for its DATABASES, and
+the migration records are queried with plain SQL on a connection of the database backend, so no installed app is
+imported. The output is the same as that of the migration_current_id and migration_records commands.
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+from vmigration_helper.helpers.record_writer import (
+    FORMAT_CONSOLE, FORMATS, MigrationRecordWriter, parse_applied, Record
+)
+
+MIGRATIONS_TABLE = 'django_migrations'
+
+
+def _connect(alias: str):
+    """
+    Returns the connection (Django's database wrapper, without the app registry) of the alias given.
+    """
+    from django.db import connections
+
+    return connections[alias]
+
+
+def _to_datetime(connection, value) -> datetime:
+    """
+    Converts the "applied" value of a record to an aware (if USE_TZ) datetime, like the ORM does.
+    """
+    from django.conf import settings
+    from django.utils import timezone
+    from django.utils.dateparse import parse_datetime
+
+    if not isinstance(value, datetime):
+        value = parse_datetime(str(value))
+    if settings.USE_TZ and timezone.is_naive(value):
+        value = timezone.make_aware(value, connection.timezone)
+    return value
+
+
+def latest_migration_id(connection) -> int:
+    """
+    Returns the max ID of the migration records, or 0 if there are no records.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT MAX(id) FROM {connection.ops.quote_name(MIGRATIONS_TABLE)}')
+        return cursor.fetchone()[0] or 0
+
+
+def _where(connection, args) -> Tuple[str, List]:
+    """
+    Returns the WHERE clause (and its parameters) of the filters of the "records" sub-command.
+    """
+    conditions = []
+    params = []  # type: List
+    if args.app:
+        conditions.append(f'app IN ({", ".join(["%s"] * len(args.app))})')
+        params.extend(args.app)
+    if args.since_id is not None:
+        conditions.append('id >= %s')
+        params.append(args.since_id)
+    if args.until_id is not None:
+        conditions.append('id <= %s')
+        params.append(args.until_id)
+    if args.applied_after:
+        applied_after = parse_applied(args.applied_after)
+        if applied_after is None:
+            raise ValueError(f'Invalid date and time for --applied-after: {args.applied_after}')
+        conditions.append('applied > %s')
+        params.append(connection.ops.adapt_datetimefield_value(applied_after))
+    return (f' WHERE {" AND ".join(conditions)}' if conditions else ''), params
+
+
+def iter_records(connection, args) -> Iterator[Record]:
+    """
+    Yields the (id, applied, app, name) records matching the filters, in ascending order of ID, fetching them in
+    chunks.
+    """
+    where, params = _where(connection, args)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT id, applied, app, name FROM {connection.ops.quote_name(MIGRATIONS_TABLE)}{where} ORDER BY id',
+            params,
+        )
+        while True:
+            rows = cursor.fetchmany(args.chunk_size)
+            if not rows:
+                break
+            for record_id, applied, app, name in rows:
+                yield record_id, _to_datetime(connection, applied), app, name
+
+
+def current_id(args) -> None:
+    connection = _connect(args.connection_name)
+    latest_id = latest_migration_id(connection)
+    if args.json:
+        print(json.dumps({args.connection_name: {'id': latest_id}}))
+    else:
+        print(latest_id)
+
+
+def records(args) -> None:
+    connection = _connect(args.connection_name)
+    writer = MigrationRecordWriter(sys.stdout, args.format, buffer_size=args.chunk_size)
+    writer.write_header()
+    writer.write_records(iter_records(connection, args))
+    writer.flush()
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='vmigration-helper',
+        description='Fast-start read-only migration helper commands (no django.setup()).',
+    )
+    parser.add_argument(
+        '--settings',
+        help='The Python path of the settings module. Defaults to the DJANGO_SETTINGS_MODULE environment variable.'
+    )
+    parser.add_argument(
+        '--pythonpath',
+        default='.',
+        help='A directory to add to the Python path (e.g. where the settings module is). Default is: "."'
+    )
+    parser.add_argument(
+        '--connection-name',
+        default='default',
+        help='The connection to use. Default is: "default"'
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    current_id_parser = subparsers.add_parser('current-id', help='Show the ID of the last migration record')
+    current_id_parser.add_argument(
+        '--json',
+        action='store_true',
+        help='Show the ID as a JSON document keyed by connection name'
+    )
+    current_id_parser.set_defaults(func=current_id)
+
+    records_parser = subparsers.add_parser('records', help='Show the migration records')
+    records_parser.add_argument(
+        '--format',
+        default=FORMAT_CONSOLE,
+        choices=FORMATS,
+        help=f'The format to display the migration records ({", ".join(FORMATS)}). Default is: "{FORMAT_CONSOLE}"'
+    )
+    records_parser.add_argument('--app', action='append', help='Only show records of this app. Can be repeated.')
+    records_parser.add_argument(
+        '--since-id', type=int, help='Only show records with IDs greater than or equal to this ID'
+    )
+    records_parser.add_argument('--until-id', type=int, help='Only show records with IDs less than or equal to this ID')
+    records_parser.add_argument(
+        '--applied-after',
+        help='Only show records applied after this date and time (ISO 8601, e.g. "2024-12-06T18:15:03+00:00")'
+    )
+    records_parser.add_argument(
+        '--chunk-size', type=int, default=2000, help='The number of records to fetch from the DB at a time'
+    )
+    records_parser.set_defaults(func=records)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = create_parser().parse_args(argv)
+    if args.pythonpath:
+        sys.path.insert(0, os.path.abspath(args.pythonpath))
+    if args.settings:
+        os.environ['DJANGO_SETTINGS_MODULE'] = args.settings
+    if not os.environ.get('DJANGO_SETTINGS_MODULE'):
+        print('ERROR: no settings module; use --settings or set DJANGO_SETTINGS_MODULE', file=sys.stderr)
+        sys.exit(2)
+
+    from django.db import DatabaseError
+    from django.db.utils import ConnectionDoesNotExist
+
+    try:
+        args.func(args)
+    except ConnectionDoesNotExist as e:
+        print(f'ERROR: {e}', file=sys.stderr)
+        sys.exit(2)
+    except ValueError as e:
+        print(f'ERROR: {e}', file=sys.stderr)
+        sys.exit(2)
+    except DatabaseError as e:
+        if args.command == 'current-id' and args.json:
+            print(json.dumps({args.connection_name: {'error': str(e)}}))
+        else:
+            print(f'DB ERROR: {e}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,68 @@
+import json
+import sys
+import threading
+import time
 from abc import ABC
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, TextIO, Tuple
 
-from django.core.management import BaseCommand
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
 from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.backends.base.base import BaseDatabaseWrapper
 from django.db.migrations.recorder import MigrationRecorder
 
+from django.db.migrations.loader import MigrationLoader
+
+from vmigration_helper.helpers.connection_fanout import ConnectionResult, fan_out
+from vmigration_helper.helpers.migration_graph import create_migration_loader
 from vmigration_helper.helpers.migration_records import MigrationRecordsHelper
+from vmigration_helper.helpers.migration_runner import (
+    InProcessMigrationRunner, MIGRATE_COMMAND, MigrationRunner, SubprocessMigrationRunner
+)
+from vmigration_helper.helpers.profiling import Profiler
+from vmigration_helper.helpers.timing_history import TimingHistory
+
+MAX_CONNECTION_WORKERS = 8
+MAX_JOBS_PER_CONNECTION_SETTING = 'VMIGRATION_HELPER_MAX_JOBS_PER_CONNECTION'
+
+
+class PrefixedWriter:
+    """
+    Writes lines to an output shared by several threads, prefixing each line (e.g. with the app being migrated).
+    Partial lines are held until they are complete so that lines of different threads do not mix.
+    """
+
+    def __init__(self, out: TextIO, lock: threading.Lock, prefix: str = '') -> None:
+        self.out = out
+        self.lock = lock
+        self.prefix = prefix
+        self._partial = ''
+
+    def write(self, text: str) -> int:
+        lines = (self._partial + text).split('\n')
+        self._partial = lines.pop()
+        if lines:
+            with self.lock:
+                self.out.write(''.join(f'{self.prefix}{line}\n' for line in lines))
+                self.out.flush()
+        return len(text)
+
+    def flush(self) -> None:
+        if self._partial:
+            self.write('\n')
+
+
+def max_jobs_for_connection(connection: BaseDatabaseWrapper, jobs: int) -> int:
+    """
+    Returns how many migrations may run concurrently on the connection: at most the jobs requested, capped by
+    ``settings.VMIGRATION_HELPER_MAX_JOBS_PER_CONNECTION`` (a dict of connection name to limit) if set for the
+    connection. SQLite does not allow concurrent writes, so it is always limited to 1.
+    """
+    if connection.vendor == 'sqlite':
+        return 1
+    limit = getattr(settings, MAX_JOBS_PER_CONNECTION_SETTING, {}).get(connection.alias)
+    return max(1, min(jobs, limit) if limit else jobs)
 
 
 class MigrationCommand(BaseCommand, ABC):
@@ -14,34 +72,181 @@ class MigrationCommand(BaseCommand, ABC):
     This class provides a place for common concerns to all migration commands to be implemented. For instance, it
     registers the "connection-name" optional parameter to the command and surfaces the parameter as
     the "connection_name" property.
+
+    Commands setting ``supports_multiple_connections`` also accept "connection-name" more than once (or
+    "all-connections") and can run against every connection concurrently with run_for_connections().
+
+    Commands setting ``uses_migration_graph`` get the "no-graph-cache" optional parameter, honored by
+    create_migration_loader().
+
+    All commands accept "profile" (and "profile-file"): the wall time of the phases of the command, the SQL queries
+    issued and the subprocesses run are recorded by the "profiler" property and a JSON summary is written to stderr
+    (or the file given) when the command ends. Normal output is not affected.
+
+    A command run by another (see migration_batch) can be given a ``shared_migration_helper``, which
+    create_migration_helper() returns instead of preparing a connection of its own when it is for the same connection.
     """
 
+    supports_multiple_connections = False
+    uses_migration_graph = False
+    profiler = Profiler(enabled=False)
+    shared_migration_helper = None  # type: Optional[MigrationRecordsHelper]
+
     def add_arguments(self, parser):
+        if self.supports_multiple_connections:
+            parser.add_argument(
+                '--connection-name',
+                action='append',
+                help=(
+                    'The connection to use for migration commands. Defaults to django.db.DEFAULT_DB_ALIAS. '
+                    'Can be repeated to run against several connections.'
+                )
+            )
+            parser.add_argument(
+                '--all-connections',
+                action='store_true',
+                help='Run against all the connections in settings.DATABASES'
+            )
+            parser.add_argument(
+                '--connection-timeout',
+                type=float,
+                help='The max number of seconds to allow for each connection when running against several connections'
+            )
+            parser.add_argument(
+                '--max-workers',
+                type=int,
+                default=MAX_CONNECTION_WORKERS,
+                help=(
+                    'The max number of connections to run against at the same time. '
+                    f'Default is: {MAX_CONNECTION_WORKERS}'
+                )
+            )
+        else:
+            parser.add_argument(
+                '--connection-name',
+                default=DEFAULT_DB_ALIAS,
+                help=f'The connection to use for migration commands. Defaults to django.db.DEFAULT_DB_ALIAS'
+            )
+        if self.uses_migration_graph:
+            parser.add_argument(
+                '--no-graph-cache',
+                action='store_true',
+                help='Load the migration graph from the migration files instead of the graph cache'
+            )
+        parser.add_argument(
+            '--profile',
+            action='store_true',
+            help='Write a JSON summary of the time spent per phase, the SQL queries and the subprocesses to stderr'
+        )
         parser.add_argument(
-            '--connection-name',
-            default=DEFAULT_DB_ALIAS,
-            help=f'The connection to use for migration commands. Defaults to django.db.DEFAULT_DB_ALIAS'
+            '--profile-file',
+            help='Write the JSON summary of "--profile" to this file instead of stderr (implies "--profile")'
         )
 
     def execute(self, *args, **options):
-        self.connection_name = options["connection_name"]
-        super().execute(*args, **options)
+        connection_names = options["connection_name"] or [DEFAULT_DB_ALIAS]
+        if isinstance(connection_names, str):
+            connection_names = [connection_names]
+        if options.get("all_connections"):
+            connection_names = list(connections)
+        if len(connection_names) > 1 and not self.supports_multiple_connections:
+            raise CommandError('This command supports only one connection')
+        unknown_names = [name for name in connection_names if name not in connections]
+        if unknown_names:
+            raise CommandError(f'Unknown connection(s): {", ".join(unknown_names)}')
+        self.connection_names = list(dict.fromkeys(connection_names))
+        self.connection_name = self.connection_names[0]
+        self.connection_timeout = options.get("connection_timeout")
+        self.max_workers = options.get("max_workers") or MAX_CONNECTION_WORKERS
+        self.use_graph_cache = not options.get("no_graph_cache")
+
+        profile_file = options.get("profile_file")
+        self.profiler = Profiler(enabled=bool(options.get("profile") or profile_file))
+        self.profiler.install()
+        status = 'error'
+        try:
+            super().execute(*args, **options)
+            status = 'ok'
+        finally:
+            self.profiler.uninstall()
+            if self.profiler.enabled:
+                self.write_profile(status, profile_file)
+
+    def write_profile(self, status: str, profile_file: Optional[str] = None) -> None:
+        """
+        Writes the JSON summary of the profiler to the file given, or stderr.
+
+        :param status: "ok" if the command completed, "error" otherwise
+        :param profile_file: the file to write the summary to
+        """
+        summary = self.profiler.summary(
+            command=self.__module__.rsplit('.', 1)[-1], connections=self.connection_names, status=status
+        )
+        output = json.dumps(summary, indent=2)
+        if profile_file:
+            with open(profile_file, 'w') as f:
+                f.write(output + '\n')
+        else:
+            sys.stderr.write(output + '\n')
 
     def create_migration_helper(self, connection=None) -> MigrationRecordsHelper:
         """
         Initializes a connection and returns an instance of MigrationRecordsHelper initialized to the connection
         provided.
 
-        :param connection: optional connection to use. If not provided, a connection to the current connection name
-            is created and used. If a connection is provided, its prepare_database() MUST have been called.
+        :param connection: optional connection to use. If not provided, the shared helper is returned if it is for
+            the current connection name; otherwise a connection to the current connection name is created and used. If
+            a connection is provided, its prepare_database() MUST have been called.
 
         :returns: an instance of MigrationRecordsHelper
         """
+        shared_helper = self.shared_migration_helper
+        if not connection and shared_helper:
+            if shared_helper.migration_recorder.connection.alias == self.connection_name:
+                return shared_helper
         if not connection:
             connection = connections[self.connection_name]
-            connection.prepare_database()
+            with self.profiler.phase('connect', connection=self.connection_name):
+                if self.profiler.enabled:
+                    connection.ensure_connection()
+                connection.prepare_database()
         return MigrationRecordsHelper(MigrationRecorder(connection))
 
+    def create_migration_loader(self, helper: MigrationRecordsHelper) -> MigrationLoader:
+        """
+        Returns a loader of the migration graph (with the applied migrations of the helper's connection) for planning.
+        The graph cache is used unless "--no-graph-cache" was given.
+
+        :param helper: the helper whose connection the applied migrations are read from
+        """
+        connection = helper.migration_recorder.connection
+        with self.profiler.phase('load_graph', connection=connection.alias, cached=self.use_graph_cache):
+            return create_migration_loader(connection, use_cache=self.use_graph_cache)
+
+    def run_for_connections(self, func: Callable[[MigrationRecordsHelper], Any]) -> List[ConnectionResult]:
+        """
+        Runs the function for each of the connection names given to the command, concurrently (one thread and
+        connection per connection name) and with the timeout given to the command. A failure of one connection is
+        reported in its result and does not affect the others.
+
+        :param func: the function to run. It is given a MigrationRecordsHelper initialized to the connection.
+
+        :returns: the results in the same order as the connection names
+        """
+        def run(alias: str) -> Any:
+            connection = connections[alias]
+            with self.profiler.phase('connect', connection=alias):
+                if self.profiler.enabled:
+                    connection.ensure_connection()
+                connection.prepare_database()
+            return func(MigrationRecordsHelper(MigrationRecorder(connection)))
+
+        return fan_out(self.connection_names, run, max_workers=self.max_workers, timeout=self.connection_timeout)
+
+    @property
+    def is_multiple_connections(self) -> bool:
+        return len(self.connection_names) > 1
+
     @property
     def connection_name(self) -> str:
         return self._connection_name
@@ -49,3 +254,224 @@ class MigrationCommand(BaseCommand, ABC):
     @connection_name.setter
     def connection_name(self, value: str) -> None:
         self._connection_name = value
+
+
+class MigrateTargetsCommand(MigrationCommand, ABC):
+    """
+    Abstract base class for commands that migrate apps to target migrations (e.g. to roll back).
+
+    It registers the "dry-run", "migrate-cmd" and "in-process" optional parameters, creates the MigrationRunner they
+    select, and runs the (app, migration name) targets planned by the command, either in order or as independent
+    groups running concurrently.
+
+    How long each migration run took is added to the "timing_history" (see TimingHistory) when the command ends,
+    unless "no-timing-history" or "dry-run" is given.
+    """
+
+    timing_history = None  # type: Optional[TimingHistory]
+    record_timings = False
+    # Where the runners write the output of the migrations when not told otherwise (e.g. the output of a command run
+    # by migration_batch, so that the output of migrate subprocesses is relayed into it). Defaults to sys.stdout.
+    runner_stdout = None  # type: Optional[TextIO]
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help=f'Show the commands that would have run but do not run them'
+        )
+
+        parser.add_argument(
+            '--migrate-cmd',
+            default=MIGRATE_COMMAND,
+            help=f'The migration command template (accepts {{app}} and {{name}}). Default is: "{MIGRATE_COMMAND}"'
+        )
+
+        parser.add_argument(
+            '--in-process',
+            action='store_true',
+            help='Run the migrations in this process instead of running the migration command for each target'
+        )
+
+        parser.add_argument(
+            '--no-timing-history',
+            action='store_true',
+            help='Do not record how long the migrations run take in the timing history'
+        )
+
+    def execute(self, *args, **options):
+        # The timing history is only read (and the state directory created) when migrations are to be run and timed.
+        self.record_timings = not options.get('no_timing_history') and not options.get('dry_run')
+        self.timing_history = TimingHistory() if self.record_timings else None
+        try:
+            super().execute(*args, **options)
+        finally:
+            if self.timing_history:
+                self.timing_history.save()
+
+    def get_timing_history(self) -> TimingHistory:
+        """
+        Returns the timing history, reading it if it was not read when the command started (e.g. for a dry run).
+        """
+        if self.timing_history is None:
+            self.timing_history = TimingHistory()
+        return self.timing_history
+
+    def create_migration_runner(
+        self,
+        helper: MigrationRecordsHelper,
+        options,
+        connection: Optional[BaseDatabaseWrapper] = None,
+        stdout: Optional[TextIO] = None,
+    ) -> MigrationRunner:
+        """
+        Returns the MigrationRunner selected by the options of the command.
+
+        :param helper: the helper whose connection the migrations are to run on
+        :param options: the options of the command
+        :param connection: the connection to run in-process migrations on if not the helper's (e.g. the connection of
+            another thread). Its prepare_database() MUST have been called.
+        :param stdout: where the runner writes the output of the migrations to. Defaults to runner_stdout (or
+            sys.stdout).
+        """
+        stdout = stdout or self.runner_stdout
+        if options['in_process']:
+            runner = InProcessMigrationRunner(
+                connection or helper.migration_recorder.connection,
+                options['migrate_cmd'],
+                stdout=stdout,
+                profiler=self.profiler,
+            )
+        else:
+            runner = SubprocessMigrationRunner(options['migrate_cmd'], stdout=stdout, profiler=self.profiler)
+        runner.record_timings = self.record_timings
+        return runner
+
+    def run_target(self, runner: MigrationRunner, app: str, name: str) -> None:
+        """
+        Migrates the app to the target with the runner, recording the run as a "migrate" phase of the profiler and the
+        timings of the migrations in the timing history, then calls target_completed().
+        """
+        start = time.perf_counter()
+        try:
+            with self.profiler.phase('migrate', app=app, migration=name):
+                runner.run(app, name)
+        finally:
+            if self.record_timings:
+                self.timing_history.record(self.connection_name, runner.timings)
+        self.target_completed(app, name, time.perf_counter() - start)
+
+    def target_completed(self, app: str, name: str, seconds: float) -> None:
+        """
+        Called (possibly from several threads at the same time) after each target has been migrated to. Does nothing
+        by default.
+
+        :param app: the app migrated
+        :param name: the migration name migrated to
+        :param seconds: how long the migration took
+        """
+
+    def run_targets(
+        self, helper: MigrationRecordsHelper, runner: MigrationRunner, targets: List[Tuple[str, str]], dry_run: bool
+    ) -> None:
+        """
+        Migrates to each of the targets in order, printing the (equivalent) migration command of each. Stops at the
+        first failure.
+
+        :param helper: the helper of the connection migrated. Its index is invalidated once migrations have run.
+        :param runner: the runner to migrate with
+        :param targets: the (app, migration name) targets to migrate to
+        :param dry_run: if True, only print the commands
+        """
+        out = runner.stdout or sys.stdout
+        try:
+            for target in targets:
+                out.write(runner.describe(*target) + '\n')
+                if not dry_run:
+                    self.run_target(runner, *target)
+                    out.write('\n')
+        finally:
+            if not dry_run and targets:
+                helper.invalidate_index()
+
+    def run_target_groups(
+        self,
+        helper: MigrationRecordsHelper,
+        options,
+        groups: List[List[Tuple[str, str]]],
+        dry_run: bool,
+        jobs: int,
+    ) -> None:
+        """
+        Runs groups of targets concurrently. The targets of each group run in order, in a thread of their own (with
+        their own connection for in-process migrations); at most "jobs" groups run at the same time, further limited by
+        max_jobs_for_connection(). Output lines are prefixed with the app being migrated.
+
+        In-process migrations run one group at a time: the pre_migrate and post_migrate signal handlers (e.g. of
+        contenttypes and auth) and the rendering of the migration state with the app registry are not thread-safe.
+
+        As soon as a target fails, no further targets are started; groups already running finish their current target.
+        A summary of the groups completed, failed and not (fully) run is printed at the end.
+
+        :param helper: the helper of the connection migrated. Its index is invalidated once migrations have run.
+        :param options: the options of the command
+        :param groups: the groups of (app, migration name) targets, e.g. from RollbackPlanner.group_independent()
+        :param dry_run: if True, only print the commands
+        :param jobs: the max number of groups to run at the same time
+        """
+        jobs = max_jobs_for_connection(helper.migration_recorder.connection, jobs)
+        if options['in_process'] and not dry_run and jobs > 1:
+            print('In-process migrations run one group at a time; use the migration command to run groups concurrently')
+            jobs = 1
+        lock = threading.Lock()
+        failed = threading.Event()
+        completed = []  # type: List[int]
+        errors = {}  # type: Dict[int, str]
+
+        def run_group(index: int) -> None:
+            writer = PrefixedWriter(sys.stdout, lock)
+            connection = None
+            if options['in_process'] and not dry_run:
+                connection = connections[self.connection_name]
+                connection.prepare_database()
+            runner = self.create_migration_runner(helper, options, connection=connection, stdout=writer)
+            try:
+                for target in groups[index]:
+                    if failed.is_set():
+                        return
+                    writer.prefix = f'[{target[0]}] '
+                    writer.write(runner.describe(*target) + '\n')
+                    if not dry_run:
+                        self.run_target(runner, *target)
+                completed.append(index)
+            except Exception as e:
+                failed.set()
+                errors[index] = f'{type(e).__name__}: {e}'
+            finally:
+                writer.flush()
+                if connection is not None:
+                    connection.close()
+
+        try:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                for index in range(len(groups)):
+                    executor.submit(run_group, index)
+        finally:
+            if not dry_run:
+                helper.invalidate_index()
+
+        def describe_group(index: int) -> str:
+            return ', '.join(f'{app} {name}' for app, name in groups[index])
+
+        print()
+        print(f'Ran {len(groups)} group(s) of targets with up to {jobs} job(s):')
+        for index in range(len(groups)):
+            if index in completed:
+                print(f'  completed: {describe_group(index)}')
+            elif index in errors:
+                print(f'  FAILED: {describe_group(index)} ({errors[index]})')
+            else:
+                print(f'  not completed: {describe_group(index)}')
+        if errors:
+            raise CommandError('Stopped after a failure; see the groups not completed above')
@@ -0,0 +1,94 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from django.db import connections
+
+POLL_INTERVAL_SECONDS = 0.05
+
+
+class ConnectionResult(NamedTuple):
+    """
+    The outcome of running a function against one connection.
+    """
+    alias: str
+    value: Any
+    error: Optional[str]
+    seconds: float
+
+
+def fan_out(
+    aliases: List[str],
+    func: Callable[[str], Any],
+    max_workers: int = 8,
+    timeout: Optional[float] = None,
+) -> List[ConnectionResult]:
+    """
+    Runs the function for each connection alias concurrently in a bounded pool of threads. Each thread uses its own
+    connection (Django connections are per thread), which is closed once the function returns. Failing to close it is
+reported as the error of the alias (unless the function already failed).
+
+    A failure (or timeout) of one alias is reported in its result only; the other aliases are not affected. Threads
+    still running when their alias times out are abandoned (they are daemon threads, so they do not hold up the
+    process from exiting).
+
+    :param aliases: the connection aliases to run the function for
+    :param func: the function to run. It is given the connection alias and its return value is kept in the result.
+    :param max_workers: the max number of threads to run at the same time
+    :param timeout: the max number of seconds to allow per alias (measured from when the alias starts running)
+
+    :returns: the results, in the same order as the aliases given
+    """
+    pending = queue.Queue()  # type: queue.Queue
+    for alias in aliases:
+        pending.put(alias)
+    finished = queue.Queue()  # type: queue.Queue
+    started = {}  # type: Dict[str, float]
+    lock = threading.Lock()
+
+    def work() -> None:
+        while True:
+            try:
+                alias = pending.get_nowait()
+            except queue.Empty:
+                return
+            start = time.monotonic()
+            with lock:
+                started[alias] = start
+            value = None
+            error = None
+            try:
+                value = func(alias)
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+            # A result is always put, even if the connection cannot be closed, or the alias would be waited for forever.
+            try:
+                connections[alias].close()
+            except Exception as e:
+                error = error or f'{type(e).__name__}: {e}'
+            finished.put(ConnectionResult(alias, value, error, time.monotonic() - start))
+
+    for _ in range(max(1, min(max_workers, len(aliases)))):
+        threading.Thread(target=work, daemon=True).start()
+
+    results = {}  # type: Dict[str, ConnectionResult]
+    while len(results) < len(aliases):
+        try:
+            result = finished.get(timeout=POLL_INTERVAL_SECONDS)
+            if result.alias not in results:
+                results[result.alias] = result
+        except queue.Empty:
+            pass
+        if timeout is not None:
+            now = time.monotonic()
+            with lock:
+                running = [(alias, start) for alias, start in started.items() if alias not in results]
+            for alias, start in running:
+                if now - start > timeout:
+                    results[alias] = ConnectionResult(alias, None, f'Timed out after {timeout} seconds', now - start)
+                    # The thread running the alias is lost to the pool; replace it so the remaining aliases still run.
+                    if not pending.empty():
+                        threading.Thread(target=work, daemon=True).start()
+
+    return [results[alias] for alias in aliases]
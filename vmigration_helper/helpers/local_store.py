@@ -0,0 +1,49 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any
+
+from django.conf import settings
+
+STATE_DIR_SETTING = 'VMIGRATION_HELPER_STATE_DIR'
+DEFAULT_STATE_DIR = '.vmigration_helper'
+
+
+def get_state_dir() -> Path:
+    """
+    Returns the directory where this app keeps its local state (snapshots, caches, etc.), creating it if needed.
+
+    The directory is set with ``settings.VMIGRATION_HELPER_STATE_DIR`` and defaults to ".vmigration_helper" in the
+    current directory.
+    """
+    state_dir = Path(getattr(settings, STATE_DIR_SETTING, None) or DEFAULT_STATE_DIR)
+    state_dir.mkdir(parents=True, exist_ok=True)
+    return state_dir
+
+
+def read_json(path: Path, default: Any = None) -> Any:
+    """
+    Reads the JSON file given, returning the default if the file does not exist.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+
+def write_json(path: Path, data: Any) -> None:
+    """
+    Writes the data to the JSON file given. The file is replaced atomically so that readers never see a partial file.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
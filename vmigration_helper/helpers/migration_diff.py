@@ -0,0 +1,219 @@
+import csv
+import json
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from django.db.models import F, Func
+from django.db.models.functions import Collate
+
+from vmigration_helper.helpers.migration_records import MigrationRecordsHelper
+from vmigration_helper.helpers.record_writer import parse_applied, Record, RECORD_FIELDS
+
+DIFF_ONLY_LEFT = 'only_left'
+DIFF_ONLY_RIGHT = 'only_right'
+DIFF_SKEW = 'skew'
+
+# Collations ordering strings by code point (as Python does), per DB vendor. SQLite already does by default, and MySQL
+# is ordered by the binary value of the columns instead.
+BINARY_COLLATIONS = {
+    'postgresql': 'C',
+    'oracle': 'BINARY',
+}
+
+
+class DiffEntry(NamedTuple):
+    """
+    A difference between two sets of migration records: a migration recorded on one side only, or recorded on both
+    sides with applied times further apart than the skew allowed.
+    """
+    kind: str
+    app: str
+    name: str
+    left: Optional[Record]
+    right: Optional[Record]
+
+    @property
+    def skew(self) -> Optional[float]:
+        """
+        How many seconds later the migration was applied on the right than on the left (if recorded on both sides).
+        """
+        if self.left is None or self.right is None:
+            return None
+        return (self.right[1] - self.left[1]).total_seconds()
+
+
+def iter_db_records(helper: MigrationRecordsHelper, chunk_size: int) -> Iterator[Record]:
+    """
+    Streams the migration records of the helper's connection in (app, name) order, in chunks.
+    """
+    vendor = helper.migration_recorder.connection.vendor
+    if vendor == 'mysql':
+        ordering = [Func(F(field), template='CAST(%(expressions)s AS BINARY)') for field in ('app', 'name')]
+    elif vendor in BINARY_COLLATIONS:
+        ordering = [Collate(F('app'), BINARY_COLLATIONS[vendor]), Collate(F('name'), BINARY_COLLATIONS[vendor])]
+    else:
+        ordering = ['app', 'name']
+    qs = helper.get_migration_records_qs().order_by(*ordering)
+    return qs.values_list(*RECORD_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def read_records_file(path: str) -> List[Record]:
+    """
+    Reads the migration records exported (from one connection) with "migration_records --format csv|tsv|jsonl" and
+    returns them in (app, name) order. Raises ValueError if the file is not such an export.
+    """
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        first_line = f.readline()
+        f.seek(0)
+        if first_line.lstrip().startswith('{'):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = [
+                {key.lower(): value for key, value in row.items()}
+                for row in csv.DictReader(f, delimiter='\t' if '\t' in first_line else ',')
+            ]
+    records = []  # type: List[Record]
+    connections = set()
+    for row in rows:
+        try:
+            # Compared with the times of the DB: aware or naive depending on USE_TZ, whatever the export has.
+            record_id, applied = int(row['id']), parse_applied(row['applied'])
+            app, name = row['app'], row['name']
+            if applied is None:
+                raise ValueError(f'invalid applied date and time: {row["applied"]}')
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f'{path} is not an export of "migration_records --format csv|tsv|jsonl": {e}')
+        records.append((record_id, applied, app, name))
+        connections.add(row.get('connection'))
+    if len(connections) > 1:
+        raise ValueError(f'{path} has the records of several connections; export one connection only')
+    records.sort(key=lambda record: (record[2], record[3]))
+    return records
+
+
+def _in_order(records: Iterable[Record], side: str) -> Iterator[Record]:
+    """
+    Yields the records, checking that they come in strictly increasing (app, name) order, which the merge-join relies
+    on. Raises ValueError otherwise.
+    """
+    previous = None
+    for record in records:
+        key = (record[2], record[3])
+        if previous is not None and key <= previous:
+            raise ValueError(
+                f'The records of {side} are not in (app, name) order: {key[0]} {key[1]} came after '
+                f'{previous[0]} {previous[1]} (DB collation not supported?)'
+            )
+        previous = key
+        yield record
+
+
+class MigrationDiff:
+    """
+    Compares two sets of migration records by (app, name), since record IDs differ between environments. Both sides
+    are merge-joined as they are streamed in (app, name) order, so memory use does not grow with the number of
+    records: only the latest record of the app being compared is kept per side.
+
+    While comparing, the targets to migrate the right side to in order to converge to the left side are planned: each
+    app that differs is migrated to its latest migration on the left (or "zero" if it has none there).
+    """
+
+    def __init__(
+        self,
+        left: Iterable[Record],
+        right: Iterable[Record],
+        max_skew: Optional[float] = None,
+        left_name: str = 'left',
+        right_name: str = 'right',
+    ) -> None:
+        """
+        :param left: the records of the left side, in (app, name) order
+        :param right: the records of the right side, in (app, name) order
+        :param max_skew: if given, migrations recorded on both sides with applied times more than this many seconds
+            apart are reported
+        :param left_name: the name of the left side (for errors)
+        :param right_name: the name of the right side (for errors)
+        """
+        self.left = _in_order(left, left_name)
+        self.right = _in_order(right, right_name)
+        self.max_skew = max_skew
+        self.counts = {DIFF_ONLY_LEFT: 0, DIFF_ONLY_RIGHT: 0, DIFF_SKEW: 0, 'left': 0, 'right': 0, 'common': 0}
+        self.largest_skew = None  # type: Optional[float]
+        self._backwards = []  # type: List[Tuple[int, str, str]]
+        self._forwards = []  # type: List[Tuple[int, str, str]]
+
+    def _app_compared(self, app: str, state: Dict[str, Optional[Record]], only_left: bool, only_right: bool) -> None:
+        """
+        Plans the target of the app compared, if it differs.
+        """
+        left_latest = state['left']
+        target = left_latest[3] if left_latest else 'zero'
+        if only_right:
+            # Roll back the apps changed latest on the right first.
+            self._backwards.append((state['right'][0], app, target))
+        elif only_left:
+            self._forwards.append((left_latest[0], app, target))
+
+    def entries(self) -> Iterator[DiffEntry]:
+        """
+        Yields the differences in (app, name) order. Must be consumed fully before targets() is called.
+        """
+        left = next(self.left, None)
+        right = next(self.right, None)
+        app = None  # type: Optional[str]
+        state = {'left': None, 'right': None}  # type: Dict[str, Optional[Record]]
+        only_left = only_right = False
+        while left is not None or right is not None:
+            if right is None or (left is not None and (left[2], left[3]) < (right[2], right[3])):
+                current, kind = left, DIFF_ONLY_LEFT
+            elif left is None or (right[2], right[3]) < (left[2], left[3]):
+                current, kind = right, DIFF_ONLY_RIGHT
+            else:
+                current, kind = left, None
+
+            if current[2] != app:
+                if app is not None:
+                    self._app_compared(app, state, only_left, only_right)
+                app = current[2]
+                state = {'left': None, 'right': None}
+                only_left = only_right = False
+
+            if kind == DIFF_ONLY_LEFT:
+                only_left = True
+                left = self._take('left', left, state)
+                self.counts[kind] += 1
+                yield DiffEntry(kind, current[2], current[3], current, None)
+            elif kind == DIFF_ONLY_RIGHT:
+                only_right = True
+                right = self._take('right', right, state)
+                self.counts[kind] += 1
+                yield DiffEntry(kind, current[2], current[3], None, current)
+            else:
+                entry = DiffEntry(DIFF_SKEW, current[2], current[3], left, right)
+                left = self._take('left', left, state)
+                right = self._take('right', right, state)
+                self.counts['common'] += 1
+                skew = abs(entry.skew)
+                self.largest_skew = skew if self.largest_skew is None else max(self.largest_skew, skew)
+                if self.max_skew is not None and skew > self.max_skew:
+                    self.counts[DIFF_SKEW] += 1
+                    yield entry
+        if app is not None:
+            self._app_compared(app, state, only_left, only_right)
+
+    def _take(self, side: str, record: Record, state: Dict[str, Optional[Record]]) -> Optional[Record]:
+        """
+        Counts the record of the side given (keeping it if it is the latest of its app) and returns the next one.
+        """
+        self.counts[side] += 1
+        if state[side] is None or record[0] > state[side][0]:
+            state[side] = record
+        return next(self.left if side == 'left' else self.right, None)
+
+    def targets(self) -> List[Tuple[str, str]]:
+        """
+        Returns the (app, migration name) targets to migrate the right side to, in order, for it to converge to the left
+        side: the apps to roll back first (latest changed first), then the apps to migrate forward.
+        """
+        backwards = [(app, name) for _, app, name in sorted(self._backwards, reverse=True)]
+        forwards = [(app, name) for _, app, name in sorted(self._forwards)]
+        return backwards + forwards
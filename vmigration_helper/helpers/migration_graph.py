@@ -0,0 +1,303 @@
+import os
+import pkgutil
+import sys
+from importlib import import_module, reload
+from importlib.util import find_spec
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import django
+from django.apps import apps
+from django.apps.config import AppConfig
+from django.conf import settings
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.migrations import Migration, RunPython, RunSQL
+from django.db.migrations.exceptions import BadMigrationError
+from django.db.migrations.loader import MIGRATIONS_MODULE_NAME, MigrationLoader
+
+from vmigration_helper.helpers.local_store import get_state_dir, read_json, write_json
+
+GRAPH_CACHE_FILE = 'graph_cache.json'
+GRAPH_CACHE_VERSION = 1
+
+
+class CachedMigration(Migration):
+    """
+    A migration restored from the graph cache. It carries what is needed to build the migration graph and plan
+    (dependencies, replaces, reversibility) but no operations, so it refuses to be applied or unapplied.
+    """
+
+    irreversible_operations = []  # type: List[str]
+    data_operations = []  # type: List[str]
+
+    def apply(self, project_state, schema_editor, collect_sql=False):
+        raise RuntimeError(f'{self} was loaded from the migration graph cache and cannot be applied')
+
+    def unapply(self, project_state, schema_editor, collect_sql=False):
+        raise RuntimeError(f'{self} was loaded from the migration graph cache and cannot be unapplied')
+
+
+def irreversible_operations(migration: Migration) -> List[str]:
+    """
+    Returns the descriptions of the operations of the migration that cannot be reversed (e.g. RunPython without
+    reverse_code), whether the migration was loaded from disk or from the graph cache.
+    """
+    if isinstance(migration, CachedMigration):
+        return migration.irreversible_operations
+    return [op.describe() for op in migration.operations if not op.reversible]
+
+
+def data_operations(migration: Migration) -> List[str]:
+    """
+    Returns the descriptions of the operations of the migration that run code or SQL (RunPython and RunSQL), whose cost
+    depends on the data, whether the migration was loaded from disk or from the graph cache.
+    """
+    if isinstance(migration, CachedMigration):
+        return migration.data_operations
+    return [op.describe() for op in migration.operations if isinstance(op, (RunPython, RunSQL))]
+
+
+def describe_migration(migration: Migration) -> Dict[str, Any]:
+    """
+    Returns the cacheable description of a migration loaded from disk.
+    """
+    return {
+        'dependencies': [list(dependency) for dependency in migration.dependencies],
+        'run_before': [list(key) for key in migration.run_before],
+        'replaces': [list(key) for key in migration.replaces],
+        'initial': migration.initial,
+        'atomic': migration.atomic,
+        'irreversible_operations': irreversible_operations(migration),
+        'data_operations': data_operations(migration),
+    }
+
+
+def restore_migration(name: str, app_label: str, description: Dict[str, Any]) -> CachedMigration:
+    """
+    Returns the migration described by the cache entry given.
+    """
+    migration = CachedMigration(name, app_label)
+    migration.dependencies = [tuple(dependency) for dependency in description['dependencies']]
+    migration.run_before = [tuple(key) for key in description['run_before']]
+    migration.replaces = [tuple(key) for key in description['replaces']]
+    migration.initial = description['initial']
+    migration.atomic = description['atomic']
+    migration.irreversible_operations = description['irreversible_operations']
+    migration.data_operations = description['data_operations']
+    return migration
+
+
+def fingerprint_migrations_module(module_name: str) -> Optional[List[List[Any]]]:
+    """
+    Returns the (file name, size, mtime) of the files of the migrations package given, found without importing the
+    package. An empty list is returned if there is no such module, and None if it cannot be located without importing
+    it (and therefore cannot be cached).
+    """
+    try:
+        spec = find_spec(module_name)
+    except (ImportError, ValueError):
+        return None
+    if spec is None:
+        return []
+    if not spec.submodule_search_locations:
+        return None
+    fingerprint = []
+    for location in spec.submodule_search_locations:
+        with os.scandir(location) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(('.py', '.pyc')):
+                    stat = entry.stat()
+                    fingerprint.append([os.path.join(location, entry.name), stat.st_size, stat.st_mtime_ns])
+    return sorted(fingerprint)
+
+
+class CachedMigrationLoader(MigrationLoader):
+    """
+    A MigrationLoader that keeps the migrations it loads from disk in a cache file, keyed by the path, size and mtime
+    of the files of each migrations package. Apps whose migration files did not change are restored from the cache
+    instead of importing their migration modules; only apps whose files changed are loaded from disk (and the cache
+    is updated).
+
+    Migrations restored from the cache have no operations: the loader is meant for planning (graph, applied state,
+    reversibility). Use the regular MigrationLoader (or MigrationExecutor) to actually run migrations.
+    """
+
+    def __init__(self, connection: Optional[BaseDatabaseWrapper], cache_path: Optional[Path] = None, **kwargs) -> None:
+        """
+        :param connection: the connection to get the applied migrations from (None to load only the graph)
+        :param cache_path: the cache file. Defaults to "graph_cache.json" in the state directory of this app.
+        """
+        self._cache_path = Path(cache_path) if cache_path else None
+        self.loaded_apps = []  # type: List[str]
+        self.cached_apps = []  # type: List[str]
+        super().__init__(connection, **kwargs)
+
+    @property
+    def cache_path(self) -> Path:
+        if self._cache_path is None:
+            self._cache_path = get_state_dir() / GRAPH_CACHE_FILE
+        return self._cache_path
+
+    @staticmethod
+    def cache_key() -> Dict[str, Any]:
+        """
+        Settings that affect the migrations loaded regardless of their files (e.g. swappable dependencies).
+        """
+        return {
+            'version': GRAPH_CACHE_VERSION,
+            'django': django.get_version(),
+            'auth_user_model': getattr(settings, 'AUTH_USER_MODEL', None),
+            'migration_modules': {label: module for label, module in settings.MIGRATION_MODULES.items()},
+        }
+
+    def _load_app_from_disk(self, app_config: AppConfig, module_name: str, explicit: bool) -> bool:
+        """
+        Loads the migrations of the app from disk (the same way MigrationLoader.load_disk() does).
+
+        :returns: True if the app has migrations
+        """
+        was_loaded = module_name in sys.modules
+        try:
+            module = import_module(module_name)
+        except ModuleNotFoundError as e:
+            if (explicit and self.ignore_no_migrations) or (
+                not explicit and MIGRATIONS_MODULE_NAME in e.name.split('.')
+            ):
+                return False
+            raise
+        else:
+            # Module is not a package (e.g. migrations.py), or an empty directory (namespace package).
+            if not hasattr(module, '__path__'):
+                return False
+            if getattr(module, '__file__', None) is None and not isinstance(module.__path__, list):
+                return False
+            if was_loaded:
+                reload(module)
+        migration_names = {
+            name
+            for _, name, is_pkg in pkgutil.iter_modules(module.__path__)
+            if not is_pkg and name[0] not in '_~'
+        }
+        for migration_name in migration_names:
+            migration_path = f'{module_name}.{migration_name}'
+            try:
+                migration_module = import_module(migration_path)
+            except ImportError as e:
+                if 'bad magic number' in str(e):
+                    raise ImportError(
+                    f"Couldn't import {migration_path!r} as it appears to be a stale .pyc file."
+                ) from e
+                raise
+            if not hasattr(migration_module, 'Migration'):
+                raise BadMigrationError(
+                    f'Migration {migration_name} in app {app_config.label} has no Migration class'
+                )
+            self.disk_migrations[app_config.label, migration_name] = migration_module.Migration(
+                migration_name, app_config.label,
+            )
+        return True
+
+    def _read_cache(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns the cached apps by label. The cache is an optimization only: if it cannot be read, is corrupt or was
+        written for other settings, it is treated as empty.
+        """
+        try:
+            cache = read_json(self.cache_path, default={})
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(cache, dict) or cache.get('key') != self.cache_key():
+            return {}
+        if not isinstance(cache.get('apps'), dict):
+            return {}
+        return cache['apps']
+
+    @staticmethod
+    def _restore_app(
+        label: str, module_name: str, fingerprint: List[List[Any]], cached: Any
+    ) -> Optional[Dict[Tuple[str, str], CachedMigration]]:
+        """
+        Returns the migrations of the app restored from its cache entry, or None if the entry does not match the
+        migration files (or is malformed).
+        """
+        if not isinstance(cached, dict):
+            return None
+        if cached.get('module') != module_name or cached.get('fingerprint') != fingerprint:
+            return None
+        if not isinstance(cached.get('migrated'), bool) or not isinstance(cached.get('migrations'), dict):
+            return None
+        try:
+            return {
+                (label, name): restore_migration(name, label, description)
+                for name, description in cached['migrations'].items()
+            }
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def load_disk(self):
+        self.disk_migrations = {}
+        self.unmigrated_apps = set()
+        self.migrated_apps = set()
+        self.loaded_apps = []
+        self.cached_apps = []
+
+        cached_apps = self._read_cache()
+        new_apps = {}  # type: Dict[str, Dict[str, Any]]
+
+        for app_config in apps.get_app_configs():
+            label = app_config.label
+            module_name, explicit = self.migrations_module(label)
+            if module_name is None:
+                self.unmigrated_apps.add(label)
+                continue
+
+            fingerprint = fingerprint_migrations_module(module_name)
+            cached = cached_apps.get(label)
+            restored = None
+            if fingerprint is not None:
+                restored = self._restore_app(label, module_name, fingerprint, cached)
+            if restored is not None:
+                self.cached_apps.append(label)
+                self.disk_migrations.update(restored)
+                migrated = cached['migrated']
+            else:
+                self.loaded_apps.append(label)
+                migrated = self._load_app_from_disk(app_config, module_name, explicit)
+                cached = {
+                    'module': module_name,
+                    'fingerprint': fingerprint,
+                    'migrated': migrated,
+                    'migrations': {
+                        key[1]: describe_migration(migration)
+                        for key, migration in self.disk_migrations.items() if key[0] == label
+                    },
+                }
+
+            if migrated:
+                self.migrated_apps.add(label)
+            else:
+                self.unmigrated_apps.add(label)
+            if fingerprint is not None:
+                new_apps[label] = cached
+
+        if self.loaded_apps or set(new_apps) != set(cached_apps):
+            try:
+                write_json(self.cache_path, {'key': self.cache_key(), 'apps': new_apps})
+            except OSError:
+                # The cache is an optimization only; planning goes on without it (e.g. on a read-only filesystem).
+                pass
+
+
+def create_migration_loader(
+    connection: Optional[BaseDatabaseWrapper], use_cache: bool = True, cache_path: Optional[Path] = None
+) -> MigrationLoader:
+    """
+    Returns a loader of the migration graph for planning, using the graph cache unless told not to.
+
+    :param connection: the connection to get the applied migrations from (None to load only the graph)
+    :param use_cache: whether to use the graph cache
+    :param cache_path: the cache file (see CachedMigrationLoader)
+    """
+    if use_cache:
+        return CachedMigrationLoader(connection, cache_path=cache_path)
+    return MigrationLoader(connection)
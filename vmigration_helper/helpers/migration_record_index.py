@@ -0,0 +1,130 @@
+import hashlib
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from django.db.models import QuerySet
+
+
+class IndexedRecord(NamedTuple):
+    """
+    A migration record as kept by MigrationRecordIndex (without the applied timestamp).
+    """
+    id: int
+    app: str
+    name: str
+
+
+class MigrationRecordIndex:
+    """
+    In-memory index of the migration records (django_migrations) loaded with a single ordered query.
+
+    Records are kept as compact arrays sorted by ID (overall and per app) rather than model instances, and lookups such
+    as the previous migration of an app are answered by bisection without going back to the DB.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[int, str, str]]) -> None:
+        """
+        :param rows: (id, app, name) of the migration records in ascending order of ID
+        """
+        self._ids = array('q')
+        self._names = []  # type: List[str]
+        self._app_codes = array('I')
+        self._app_ids = {}  # type: Dict[str, array]
+        self._app_names = {}  # type: Dict[str, List[str]]
+        self._app_codes_by_app = {}  # type: Dict[str, int]
+        for migration_id, app, name in rows:
+            self._ids.append(migration_id)
+            self._names.append(name)
+            if app not in self._app_ids:
+                self._app_ids[app] = array('q')
+                self._app_names[app] = []
+            self._app_codes.append(self._app_codes_by_app.setdefault(app, len(self._app_codes_by_app)))
+            self._app_ids[app].append(migration_id)
+            self._app_names[app].append(name)
+
+    @classmethod
+    def load(cls, migration_query_set: QuerySet) -> 'MigrationRecordIndex':
+        """
+        Loads the index from the query set given with one query.
+
+        :param migration_query_set: the query set of MigrationRecorder.Migration records to index
+        """
+        return cls(migration_query_set.order_by('id').values_list('id', 'app', 'name').iterator())
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def max_id(self) -> int:
+        """
+        The max ID of the records, or 0 if there are no records.
+        """
+        return self._ids[-1] if self._ids else 0
+
+    @property
+    def apps(self) -> List[str]:
+        """
+        The apps having records, in the order of their first record.
+        """
+        return list(self._app_ids)
+
+    @property
+    def max_app_name_width(self) -> int:
+        return max((len(app) for app in self._app_ids), default=0)
+
+    def max_name_width(self, app: str) -> int:
+        """
+        Returns the length of the longest migration name recorded for the app (0 if the app has no records).
+        """
+        return max((len(name) for name in self._app_names.get(app, ())), default=0)
+
+    def contains(self, app: str, name: str) -> bool:
+        return name in self._app_names.get(app, ())
+
+    def latest(self, app: str) -> Optional[IndexedRecord]:
+        """
+        Returns the record of the app with the highest ID if the app has records.
+        """
+        app_ids = self._app_ids.get(app)
+        if not app_ids:
+            return None
+        return IndexedRecord(app_ids[-1], app, self._app_names[app][-1])
+
+    def previous(self, app: str, migration_id: int) -> Optional[IndexedRecord]:
+        """
+        Returns the record of the app with the highest ID lower than the ID given if one exists.
+        """
+        app_ids = self._app_ids.get(app)
+        if not app_ids:
+            return None
+        pos = bisect_left(app_ids, migration_id)
+        if pos == 0:
+            return None
+        return IndexedRecord(app_ids[pos - 1], app, self._app_names[app][pos - 1])
+
+    def range(self, after_id: Optional[int] = None, until_id: Optional[int] = None) -> List[IndexedRecord]:
+        """
+        Returns the records whose IDs are greater than after_id and at most until_id, in ascending order of ID.
+
+        :param after_id: only records with IDs greater than this are included (no lower bound if None)
+        :param until_id: only records with IDs at most this are included (no upper bound if None)
+        """
+        start = 0 if after_id is None else bisect_right(self._ids, after_id)
+        end = len(self._ids) if until_id is None else bisect_right(self._ids, until_id)
+        apps = list(self._app_ids)
+        return [IndexedRecord(self._ids[i], apps[self._app_codes[i]], self._names[i]) for i in range(start, end)]
+
+    def fingerprint(self, until_id: Optional[int] = None) -> str:
+        """
+        Returns a digest of the records (ID, app and name), which changes whenever any record is added, removed or
+        changed.
+
+        :param until_id: only records with IDs at most this are included (all records if None)
+        """
+        digest = hashlib.sha256()
+        apps = list(self._app_ids)
+        end = len(self._ids) if until_id is None else bisect_right(self._ids, until_id)
+        for i in range(end):
+            digest.update(f'{self._ids[i]}\t{apps[self._app_codes[i]]}\t{self._names[i]}\n'.encode())
+        return digest.hexdigest()
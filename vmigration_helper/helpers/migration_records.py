@@ -1,8 +1,13 @@
-from typing import List, Optional
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterable, List, Optional, Pattern, Tuple
 
-from django.db import connections, DEFAULT_DB_ALIAS
+from django.db import connections, DEFAULT_DB_ALIAS, transaction
 from django.db.migrations.recorder import MigrationRecorder
-from django.db.models import QuerySet
+from django.db.models import Max, Q, QuerySet
+
+from vmigration_helper.helpers.migration_record_index import IndexedRecord, MigrationRecordIndex
+
+DELETE_BATCH_SIZE = 500
 
 
 class MigrationRecordsHelper:
@@ -20,6 +25,7 @@ class MigrationRecordsHelper:
 
             migration_recorder = MigrationRecorder(connection)
         self.migration_recorder = migration_recorder
+        self._index = None  # type: Optional[MigrationRecordIndex]
 
     def get_migration_records_qs(self) -> QuerySet:
         """
@@ -30,17 +36,75 @@ class MigrationRecordsHelper:
         """
         return self.migration_recorder.migration_qs
 
+    def get_index(self) -> MigrationRecordIndex:
+        """
+        Gets the in-memory index of the migration records. The index is loaded (with one query) on first use and
+        reused until invalidate_index() is called.
+
+        :returns: the index of the migration records
+        """
+        if self._index is None:
+            self._index = MigrationRecordIndex.load(self.get_migration_records_qs())
+        return self._index
+
+    def invalidate_index(self) -> None:
+        """
+        Discards the index of the migration records so that it is reloaded on next use. Call this after the records
+        have been changed (e.g. after migrating).
+        """
+        self._index = None
+
+    def latest_migration_id(self) -> int:
+        """
+        Gets the max ID of the migration records, or 0 if there are no records. The index is used if it has been
+        loaded; otherwise the max ID is queried directly.
+
+        :returns: the max ID of the migration records
+        """
+        if self._index is not None:
+            return self._index.max_id
+        return self.get_migration_records_qs().aggregate(Max('id'))['id__max'] or 0
+
+    async def alatest_migrations(self) -> Tuple[int, Dict[str, str]]:
+        """
+        Gets (asynchronously, with one query) the max ID of the migration records and the name of the latest
+        migration record of each app.
+
+        :returns: the max ID (0 if there are no records) and the latest migration name keyed by app
+        """
+        qs = self.get_migration_records_qs()
+        latest_ids = qs.values('app').annotate(latest_id=Max('id')).values('latest_id')
+        max_id = 0
+        latest = {}  # type: Dict[str, str]
+        async for record_id, app, name in qs.filter(id__in=latest_ids).order_by('app').values_list('id', 'app', 'name'):
+            max_id = max(max_id, record_id)
+            latest[app] = name
+        return max_id, latest
+
     def previous_migration(self, migration: MigrationRecorder.Migration) -> Optional[MigrationRecorder.Migration]:
         """
-        Retrieve the previous migration record (based on the app and ID) from the DB if one exists.
+        Retrieve the previous migration record (based on the app and ID) from the DB if one exists. The previous record
+        is found on the index of the migration records (see previous_record()), then fetched by its ID.
 
         :param migration: the migration to retrieve the previous migration for.
 
         :returns: the previous migration if one exists
         """
-        return self.migration_recorder.migration_qs.filter(
-            app=migration.app, id__lt=migration.id
-        ).order_by('-id').first()
+        record = self.previous_record(migration)
+        if record is None:
+            return None
+        return self.get_migration_records_qs().filter(id=record.id).first()
+
+    def previous_record(self, migration: MigrationRecorder.Migration) -> Optional[IndexedRecord]:
+        """
+        Retrieve the previous migration record (based on the app and ID) if one exists, from the index of the migration
+        records: no query is made once the index has been loaded.
+
+        :param migration: the migration to retrieve the previous record for (anything with "app" and "id").
+
+        :returns: the ID, app and name of the previous record if one exists
+        """
+        return self.get_index().previous(migration.app, migration.id)
 
     def delete_migration(self, app: str, name: str) -> bool:
         """
@@ -52,6 +116,79 @@ class MigrationRecordsHelper:
         :returns: True if a record was deleted
         """
         deleted, _ = self.migration_recorder.migration_qs.filter(app=app, name=name).delete()
+        self.invalidate_index()
+        return deleted
+
+    def find_migrations(
+        self,
+        migrations: Iterable[Tuple[str, str]] = (),
+        app: Optional[str] = None,
+        name_pattern: Optional[Pattern] = None,
+    ) -> List[IndexedRecord]:
+        """
+        Finds the migration records matching any of the (app, name) pairs given, or of the app given (whose name
+        matches the pattern, if any), with one query. Only the records of the pairs (and of the app) are read.
+
+        :param migrations: the (app, name) pairs of the records to find
+        :param app: the name of the Django app to find records of
+        :param name_pattern: the pattern the names of the records of the app must match (all if None)
+
+        :returns: the records found, in ascending order of ID
+        """
+        wanted = set(migrations)
+        names_by_app = {}  # type: Dict[str, List[str]]
+        for migration_app, migration_name in sorted(wanted):
+            names_by_app.setdefault(migration_app, []).append(migration_name)
+        condition = Q()
+        for migration_app, names in names_by_app.items():
+            condition |= Q(app=migration_app, name__in=names)
+        if app:
+            condition |= Q(app=app)
+        if not condition:
+            return []
+
+        records = []  # type: List[IndexedRecord]
+        for record_id, record_app, record_name in self.get_migration_records_qs().filter(
+            condition
+        ).order_by('id').values_list('id', 'app', 'name'):
+            if (record_app, record_name) in wanted or (
+                record_app == app and (name_pattern is None or name_pattern.fullmatch(record_name))
+            ):
+                records.append(IndexedRecord(record_id, record_app, record_name))
+        return records
+
+    def delete_migrations(
+        self,
+        ids: List[int],
+        batch_size: int = DELETE_BATCH_SIZE,
+        atomic: bool = True,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> int:
+        """
+        Delete the migration records with the IDs given, in batches of DELETE statements within one transaction (so
+        either all or none of the records are deleted).
+
+        :param ids: the IDs of the records to delete
+        :param batch_size: the max number of records to delete per statement
+        :param atomic: if False, each batch is committed on its own instead, so that locks are held for one batch at a
+            time (and the batches deleted so far stay deleted if one fails)
+        :param progress: called after each batch with the number of records deleted so far and the number of IDs
+
+        :returns: the number of records deleted
+        """
+        deleted = 0
+        qs = self.get_migration_records_qs()
+        alias = self.migration_recorder.connection.alias
+        try:
+            with transaction.atomic(using=alias) if atomic else nullcontext():
+                for start in range(0, len(ids), batch_size):
+                    with nullcontext() if atomic else transaction.atomic(using=alias):
+                        batch_deleted, _ = qs.filter(id__in=ids[start:start + batch_size]).delete()
+                    deleted += batch_deleted
+                    if progress:
+                        progress(deleted, len(ids))
+        finally:
+            self.invalidate_index()
         return deleted
 
     @staticmethod
@@ -0,0 +1,130 @@
+import io
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+
+from vmigration_helper.helpers.migration_records import MigrationRecordsHelper
+from vmigration_helper.helpers.migration_runner import InProcessMigrationRunner
+from vmigration_helper.helpers.migration_snapshots import MigrationSnapshot
+from vmigration_helper.helpers.rollback_planner import RollbackPlanner
+
+
+class _Checkpoint:
+    """
+    The migration state of a test database captured after it was set up.
+    """
+
+    def __init__(self, helper: MigrationRecordsHelper) -> None:
+        index = helper.get_index()
+        self.helper = helper
+        self.snapshot = MigrationSnapshot.capture('checkpoint', index)
+        self.runner = InProcessMigrationRunner(helper.migration_recorder.connection, stdout=io.StringIO())
+        self.update(index)
+
+    def update(self, index) -> None:
+        """
+        Takes the records given as those of the checkpoint (they may differ from the captured ones by IDs only).
+        """
+        self.max_id = index.max_id
+        self.fingerprint = index.fingerprint()
+
+
+class MigrationResetter:
+    """
+    Resets test databases to the migration state they had once set up (e.g. after a test module migrated them to
+    another state), as an alternative to recreating them.
+
+    The migration ID (and state) of each database is captured once with capture(). reset() then checks each database
+    with one query and, when its migration records changed, migrates it back in this process (no subprocess), with the
+    migration graph loaded once per database for all resets:
+
+    * when only records after the captured ID changed, just that delta is rolled back (planned as migration_rollback
+      does)
+    * otherwise (e.g. captured migrations were unapplied), each app is migrated back to its captured migration (as
+      "migration_snapshot restore" does)
+
+    How long the resets took is compared with the time it took to set the databases up, to report the time saved by
+    not recreating them.
+    """
+
+    def __init__(self) -> None:
+        self._checkpoints = {}  # type: Dict[str, _Checkpoint]
+        self.setup_seconds = None  # type: Optional[float]
+        self.resets = 0
+        self.reset_seconds = 0.0
+
+    @staticmethod
+    def default_aliases() -> List[str]:
+        """
+        Returns the aliases of the databases that are not mirrors of others.
+        """
+        return [alias for alias in connections if not connections[alias].settings_dict.get('TEST', {}).get('MIRROR')]
+
+    @property
+    def captured(self) -> bool:
+        return bool(self._checkpoints)
+
+    def capture(self, aliases: Optional[Iterable[str]] = None, setup_seconds: Optional[float] = None) -> None:
+        """
+        Captures the migration state of the databases given (all but mirrors by default), once they have been set up.
+
+        :param aliases: the aliases of the test databases
+        :param setup_seconds: how long setting up the databases took (to compare the resets with)
+        """
+        self.setup_seconds = setup_seconds
+        for alias in self.default_aliases() if aliases is None else aliases:
+            connection = connections[alias]
+            connection.prepare_database()
+            self._checkpoints[alias] = _Checkpoint(MigrationRecordsHelper(MigrationRecorder(connection)))
+
+    def _targets(self, checkpoint: _Checkpoint) -> List[Tuple[str, str]]:
+        """
+        Plans the targets to migrate to for the database to go back to its checkpoint.
+        """
+        index = checkpoint.helper.get_index()
+        checkpoint.runner.refresh()
+        if index.fingerprint(until_id=checkpoint.max_id) == checkpoint.fingerprint:
+            records = index.range(after_id=checkpoint.max_id)[::-1]
+            return RollbackPlanner(checkpoint.helper, checkpoint.runner.executor.loader).plan(records)
+        return checkpoint.snapshot.plan_restore(index)
+
+    def reset(self) -> List[str]:
+        """
+        Migrates the databases whose migration records changed since they were captured back to their captured state.
+
+        :returns: the aliases of the databases reset
+        """
+        reset_aliases = []
+        for alias, checkpoint in self._checkpoints.items():
+            checkpoint.helper.invalidate_index()
+            if checkpoint.helper.get_index().fingerprint() == checkpoint.fingerprint:
+                continue
+            start = time.perf_counter()
+            try:
+                for app, name in self._targets(checkpoint):
+                    checkpoint.runner.run(app, name)
+            finally:
+                checkpoint.helper.invalidate_index()
+                self.reset_seconds += time.perf_counter() - start
+            checkpoint.update(checkpoint.helper.get_index())
+            reset_aliases.append(alias)
+        if reset_aliases:
+            self.resets += 1
+        return reset_aliases
+
+    def summary(self) -> Optional[str]:
+        """
+        Returns a summary of the resets done and the time saved, if any reset was done.
+        """
+        if not self.resets:
+            return None
+        summary = f'Migration resets: {self.resets} reset(s) in {self.reset_seconds:.2f}s'
+        if self.setup_seconds is not None:
+            rebuild_seconds = self.resets * self.setup_seconds
+            summary += (
+                f'; recreating the test databases ({self.setup_seconds:.2f}s each) would have taken '
+                f'{rebuild_seconds:.2f}s, saved {rebuild_seconds - self.reset_seconds:.2f}s'
+            )
+        return summary
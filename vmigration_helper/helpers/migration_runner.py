@@ -0,0 +1,259 @@
+import codecs
+import locale
+import re
+import subprocess
+import sys
+import time
+from abc import ABC, abstractmethod
+from importlib import import_module
+from typing import List, Optional, TextIO, Tuple
+
+from django.apps import apps
+from django.core.management.sql import emit_post_migrate_signal, emit_pre_migrate_signal
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.migrations.executor import MigrationExecutor
+from django.db.migrations.state import ModelState
+from django.utils.module_loading import module_has_submodule
+
+from vmigration_helper.helpers.profiling import Profiler
+from vmigration_helper.helpers.timing_history import MigrationTiming
+
+MIGRATE_COMMAND = 'python manage.py migrate {app} {name}'
+
+# A migration reported done by the migrate command, e.g. "  Unapplying myapp.0003_add_field... OK"
+MIGRATION_DONE_LINE = re.compile(r'^\s*(Applying|Unapplying) (\w+)\.(\w+)\.\.\.\s*OK')
+
+
+class MigrationRunner(ABC):
+    """
+    Abstract base class for the strategies used to migrate an app to a target migration (e.g. when rolling back).
+    """
+
+    def __init__(
+        self, migrate_cmd: str = MIGRATE_COMMAND, stdout: Optional[TextIO] = None, profiler: Optional[Profiler] = None
+    ) -> None:
+        """
+        :param migrate_cmd: the migration command template (accepts {app} and {name})
+        :param stdout: where to write the output of the migrations to. Defaults to sys.stdout.
+        :param profiler: the profiler to record the subprocesses run with, if any
+        """
+        self.migrate_cmd = migrate_cmd
+        self.stdout = stdout
+        self.profiler = profiler or Profiler(enabled=False)
+        # Whether to time the migrations of each run, and the timings of the last run
+        self.record_timings = False
+        self.timings = []  # type: List[MigrationTiming]
+
+    def describe(self, app: str, name: str) -> str:
+        """
+        Returns the migration command that (would) migrate the app to the migration given.
+
+        :param app: the name of the Django app to migrate
+        :param name: the name of the migration to migrate to ("zero" to unapply all migrations of the app)
+        """
+        return self.migrate_cmd.format(app=app, name=name)
+
+    @abstractmethod
+    def run(self, app: str, name: str) -> None:
+        """
+        Migrates the app to the migration given. Raises an exception if the migration fails.
+
+        :param app: the name of the Django app to migrate
+        :param name: the name of the migration to migrate to ("zero" to unapply all migrations of the app)
+        """
+
+
+class SubprocessMigrationRunner(MigrationRunner):
+    """
+    Runs each migration in a separate process using the migration command template.
+    """
+
+    def run(self, app: str, name: str) -> None:
+        command = self.describe(app, name)
+        self.timings = []
+        start = time.perf_counter()
+        returncode = 0
+        try:
+            self._run_command(command)
+        except subprocess.CalledProcessError as e:
+            returncode = e.returncode
+            raise
+        finally:
+            self.profiler.record_subprocess(command, time.perf_counter() - start, returncode)
+
+    def _time_line(self, line: str, seconds: float) -> None:
+        """
+        Records the timing of the migration reported done by the line of output given, if it is such a line. The
+        migration is assumed to have taken the time since the previous line of output.
+        """
+        match = MIGRATION_DONE_LINE.match(line)
+        if match:
+            self.timings.append(MigrationTiming(match[2], match[3], match[1] == 'Unapplying', seconds))
+
+    def _run_command(self, command: str) -> None:
+        if self.stdout is None and not self.record_timings:
+            subprocess.run(command, check=True, shell=True)
+            return
+
+        # Relay the output of the process to the stdout given as it comes, timing the migrations it reports done. When
+        # writing to sys.stdout, the errors of the process are left to go to stderr.
+        out = self.stdout or sys.stdout
+        stderr = subprocess.STDOUT if self.stdout is not None else None
+        decoder = codecs.getincrementaldecoder(locale.getpreferredencoding(False))(errors='replace')
+        partial = ''
+        last_line_time = time.perf_counter()
+        with subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=stderr) as process:
+            while True:
+                chunk = process.stdout.read1(4096)
+                text = decoder.decode(chunk, final=not chunk)
+                if text:
+                    out.write(text)
+                    if self.stdout is None:
+                        out.flush()
+                    lines = (partial + text).split('\n')
+                    partial = lines.pop()
+                    now = time.perf_counter()
+                    for line in lines:
+                        self._time_line(line, now - last_line_time)
+                        last_line_time = now
+                if not chunk:
+                    break
+            out.flush()
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, command)
+
+
+class InProcessMigrationRunner(MigrationRunner):
+    """
+    Runs each migration in the current process through Django's MigrationExecutor. The migration graph is loaded once
+    (on the first run) and reused for all subsequent runs, and the output mirrors what "manage.py migrate" prints.
+    """
+
+    def __init__(
+        self,
+        connection: BaseDatabaseWrapper,
+        migrate_cmd: str = MIGRATE_COMMAND,
+        stdout: Optional[TextIO] = None,
+        profiler: Optional[Profiler] = None,
+    ) -> None:
+        """
+        :param connection: the connection to migrate. Its prepare_database() MUST have been called.
+        :param migrate_cmd: the migration command template (accepts {app} and {name}). Used only to describe the
+            equivalent command of each run.
+        :param stdout: where to write the output to. Defaults to sys.stdout.
+        :param profiler: the profiler to record the loading of the migration graph with, if any
+        """
+        super().__init__(migrate_cmd, stdout, profiler)
+        self.connection = connection
+        self._executor = None  # type: Optional[MigrationExecutor]
+        self._migration_start = 0.0
+
+    def _write(self, message: str, ending: str = '\n') -> None:
+        out = self.stdout or sys.stdout
+        out.write(message + ending)
+        out.flush()
+
+    def _progress_callback(self, action: str, migration=None, fake: bool = False) -> None:
+        if action == 'render_start':
+            self._write('  Rendering model states...', ending='')
+        elif action == 'render_success':
+            self._write(' DONE')
+        elif action in ('apply_start', 'unapply_start'):
+            verb = 'Applying' if action == 'apply_start' else 'Unapplying'
+            self._write(f'  {verb} {migration}...', ending='')
+            self._migration_start = time.perf_counter()
+        elif action in ('apply_success', 'unapply_success'):
+            self._write(' FAKED' if fake else ' OK')
+            if not fake:
+                self.timings.append(MigrationTiming(
+                    migration.app_label,
+                    migration.name,
+                    action == 'unapply_success',
+                    time.perf_counter() - self._migration_start,
+                ))
+
+    @property
+    def executor(self) -> MigrationExecutor:
+        """
+        The MigrationExecutor shared by all runs. Created (and the migration graph loaded) on first access.
+        """
+        if self._executor is None:
+            # Import the 'management' module within each installed app to register dispatcher events, just like
+            # the migrate command does.
+            for app_config in apps.get_app_configs():
+                if module_has_submodule(app_config.module, 'management'):
+                    import_module('.management', app_config.name)
+
+            with self.profiler.phase('load_graph', connection=self.connection.alias):
+                self._executor = MigrationExecutor(self.connection, self._progress_callback)
+                self._executor.loader.check_consistent_history(self.connection)
+        return self._executor
+
+    def refresh(self) -> None:
+        """
+        Brings the loader up-to-date with the migration records (done after each run, and needed if migrations were run
+        by other means since). Only the applied migrations are reloaded unless squashed migrations are involved, in
+        which case the graph itself depends on what is applied.
+        """
+        loader = self.executor.loader
+        if loader.replacements:
+            loader.build_graph()
+        else:
+            loader.applied_migrations = self.executor.recorder.applied_migrations()
+
+    def resolve_target(self, app: str, name: str) -> Tuple[str, Optional[str]]:
+        """
+        Returns the target of the migration graph to migrate the app to the migration given (a prefix of its name, or
+        "zero"), as the migrate command does.
+        """
+        if name == 'zero':
+            return app, None
+        loader = self.executor.loader
+        migration = loader.get_migration_by_prefix(app, name)
+        target = (app, migration.name)
+        # Partially applied squashed migrations are not included in the graph, use the last replacement instead.
+        if target not in loader.graph.nodes and target in loader.replacements:
+            target = loader.replacements[target].replaces[-1]
+        return target
+
+    def run(self, app: str, name: str) -> None:
+        executor = self.executor
+        self.timings = []
+        target = self.resolve_target(app, name)
+        targets = [target]
+        plan = executor.migration_plan(targets)
+
+        self._write('Operations to perform:')
+        if target[1] is None:
+            self._write(f'  Unapply all migrations: {app}')
+        else:
+            self._write(f'  Target specific migration: {target[1]}, from {target[0]}')
+
+        pre_migrate_state = executor._create_project_state(with_applied_migrations=True)
+        emit_pre_migrate_signal(
+            1, False, self.connection.alias, stdout=self.stdout or sys.stdout, apps=pre_migrate_state.apps, plan=plan
+        )
+
+        self._write('Running migrations:')
+        if not plan:
+            self._write('  No migrations to apply.')
+        try:
+            post_migrate_state = executor.migrate(targets, plan=plan, state=pre_migrate_state.clone())
+        finally:
+            self.refresh()
+
+        # Re-render the models of real apps to include relationships before sending post_migrate (same as the
+        # migrate command).
+        post_migrate_state.clear_delayed_apps_cache()
+        post_migrate_apps = post_migrate_state.apps
+        with post_migrate_apps.bulk_update():
+            model_keys = []
+            for model_state in post_migrate_apps.real_models:
+                model_key = model_state.app_label, model_state.name_lower
+                model_keys.append(model_key)
+                post_migrate_apps.unregister_model(*model_key)
+        post_migrate_apps.render_multiple([ModelState.from_model(apps.get_model(*model)) for model in model_keys])
+
+        emit_post_migrate_signal(
+            1, False, self.connection.alias, stdout=self.stdout or sys.stdout, apps=post_migrate_apps, plan=plan
+        )
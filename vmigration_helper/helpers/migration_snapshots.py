@@ -0,0 +1,99 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from django.db import DEFAULT_DB_ALIAS
+
+from vmigration_helper.helpers.local_store import get_state_dir, read_json, write_json
+from vmigration_helper.helpers.migration_record_index import MigrationRecordIndex
+
+SNAPSHOTS_FILE = 'snapshots.json'
+
+
+class MigrationSnapshot(NamedTuple):
+    """
+    The migration state of a DB at a point in time: the latest migration applied per app, and the max record ID.
+    """
+    name: str
+    max_id: int
+    applied: Dict[str, str]
+    created: str
+
+    @classmethod
+    def capture(cls, name: str, index: MigrationRecordIndex) -> 'MigrationSnapshot':
+        """
+        Captures the current migration state from the index of the migration records.
+        """
+        return cls(
+            name=name,
+            max_id=index.max_id,
+            applied={app: index.latest(app).name for app in index.apps},
+            created=datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        )
+
+    def plan_restore(self, index: MigrationRecordIndex) -> List[Tuple[str, str]]:
+        """
+        Plans the (app, migration name) targets to migrate to in order to go back to this snapshot from the current
+        state given by the index. The plan comes from comparing the latest migration of each app in the snapshot
+        with the current one (rather than from record IDs), so it stays correct even if records were deleted or IDs
+        reused since the snapshot was saved.
+
+        Apps to roll back come first, latest changed first (and "zero" for apps migrated only after the snapshot),
+        followed by apps whose snapshot migration is no longer recorded, which are migrated forward.
+
+        :param index: the index of the current migration records
+
+        :returns: the targets to migrate to, in the order to run them
+        """
+        backwards = []  # type: List[Tuple[int, str, str]]
+        for app in index.apps:
+            latest = index.latest(app)
+            snapshot_name = self.applied.get(app)
+            if snapshot_name is None:
+                backwards.append((latest.id, app, 'zero'))
+            elif snapshot_name != latest.name and index.contains(app, snapshot_name):
+                backwards.append((latest.id, app, snapshot_name))
+
+        forwards = [
+            (app, name) for app, name in self.applied.items()
+            if not index.contains(app, name)
+        ]
+        return [(app, name) for _, app, name in sorted(backwards, reverse=True)] + forwards
+
+
+class MigrationSnapshotStore:
+    """
+    Stores named migration snapshots, per connection, in a local JSON file.
+    """
+
+    def __init__(self, path: Optional[Path] = None, connection_name: str = DEFAULT_DB_ALIAS) -> None:
+        """
+        :param path: the file to store the snapshots in. Defaults to "snapshots.json" in the state directory of this app.
+        :param connection_name: the connection whose snapshots to work with
+        """
+        self.path = Path(path) if path else get_state_dir() / SNAPSHOTS_FILE
+        self.connection_name = connection_name
+
+    def _read_all(self) -> Dict[str, Dict[str, dict]]:
+        return read_json(self.path, default={})
+
+    def list(self) -> List[MigrationSnapshot]:
+        snapshots = self._read_all().get(self.connection_name, {})
+        return [MigrationSnapshot(**snapshot) for snapshot in snapshots.values()]
+
+    def get(self, name: str) -> Optional[MigrationSnapshot]:
+        snapshot = self._read_all().get(self.connection_name, {}).get(name)
+        return MigrationSnapshot(**snapshot) if snapshot else None
+
+    def save(self, snapshot: MigrationSnapshot) -> bool:
+        """
+        Saves the snapshot, replacing any snapshot of the same name.
+
+        :returns: True if a snapshot of the same name was replaced
+        """
+        all_snapshots = self._read_all()
+        snapshots = all_snapshots.setdefault(self.connection_name, {})
+        replaced = snapshot.name in snapshots
+        snapshots[snapshot.name] = snapshot._asdict()
+        write_json(self.path, all_snapshots)
+        return replaced
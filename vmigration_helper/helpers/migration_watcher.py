@@ -0,0 +1,127 @@
+import sys
+from array import array
+from typing import Any, Dict, List, Tuple
+
+from django.db.models import Count, Max
+
+from vmigration_helper.helpers.migration_records import MigrationRecordsHelper
+from vmigration_helper.helpers.record_writer import DATETIME_FORMAT
+
+CHUNK_SIZE = 2000
+
+EVENT_ADDED = 'added'
+EVENT_REMOVED = 'removed'
+
+
+class MigrationWatcher:
+    """
+    Tracks the migration records of a connection and reports the records added and removed since the previous poll.
+
+    The records are loaded once (IDs in an array, app and migration names interned), then each poll only checks the
+    max ID and the row count, which the DB answers from the primary key index. Only when they move are the records
+    above the previous max ID fetched; records removed are located with a binary search of range counts and only the
+    range from the earliest removed record up is fetched. Memory use is proportional to the size of the table and does
+    not grow over time.
+
+    IDs are assumed to only grow (as with Django's auto-incremented primary keys), so new records have IDs above the
+    max ID seen.
+    """
+
+    def __init__(self, helper: MigrationRecordsHelper, chunk_size: int = CHUNK_SIZE) -> None:
+        """
+        :param helper: the helper of the connection to watch
+        :param chunk_size: the number of records to fetch from the DB at a time
+        """
+        self.helper = helper
+        self.chunk_size = chunk_size
+        self.ids = array('q')
+        self.apps = []  # type: List[str]
+        self.names = []  # type: List[str]
+
+    @property
+    def max_id(self) -> int:
+        return self.ids[-1] if self.ids else 0
+
+    def _append(self, rows) -> List[Tuple[int, Any, str, str]]:
+        added = []
+        for record_id, applied, app, name in rows:
+            self.ids.append(record_id)
+            self.apps.append(sys.intern(app))
+            self.names.append(sys.intern(name))
+            added.append((record_id, applied, app, name))
+        return added
+
+    def load(self) -> None:
+        """
+        Loads the current records.
+        """
+        self.ids = array('q')
+        self.apps = []
+        self.names = []
+        qs = self.helper.get_migration_records_qs().order_by('id')
+        self._append(qs.values_list('id', 'applied', 'app', 'name').iterator(chunk_size=self.chunk_size))
+
+    def _first_changed_position(self) -> int:
+        """
+        Returns the position of the earliest known record that has been removed from the DB (or the number of known
+        records if none has), found by comparing range counts in the DB with the known records.
+        """
+        qs = self.helper.get_migration_records_qs()
+        low, high = 0, len(self.ids)
+        while low < high:
+            middle = (low + high) // 2
+            if qs.filter(id__lte=self.ids[middle]).count() == middle + 1:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def poll(self) -> List[Dict[str, Any]]:
+        """
+        Checks for records added or removed since the last poll (or load()).
+
+        :returns: the changes, as dicts with the "event" ("removed" or "added"), "id", "app" and "name" of the records
+            (and "applied" for records added). Records removed come first, latest first; then records added, in order.
+        """
+        qs = self.helper.get_migration_records_qs()
+        state = qs.aggregate(max_id=Max('id'), count=Count('id'))
+        if (state['max_id'] or 0) == self.max_id and state['count'] == len(self.ids):
+            return []
+
+        known_max_id = self.max_id
+        known_count = len(self.ids)
+        new_rows = list(
+            qs.filter(id__gt=known_max_id).order_by('id').values_list('id', 'applied', 'app', 'name')
+        )
+        changes = []  # type: List[Dict[str, Any]]
+        if known_count + len(new_rows) != state['count']:
+            position = self._first_changed_position()
+            if position < known_count:
+                remaining = set(
+                    qs.filter(id__gte=self.ids[position], id__lte=known_max_id).values_list('id', flat=True)
+                )
+                kept = [i for i in range(position, known_count) if self.ids[i] in remaining]
+                for i in reversed(range(position, known_count)):
+                    if self.ids[i] not in remaining:
+                        changes.append({
+                            'event': EVENT_REMOVED, 'id': self.ids[i], 'app': self.apps[i], 'name': self.names[i]
+                        })
+                kept_ids = array('q', (self.ids[i] for i in kept))
+                kept_apps = [self.apps[i] for i in kept]
+                kept_names = [self.names[i] for i in kept]
+                del self.ids[position:]
+                del self.apps[position:]
+                del self.names[position:]
+                self.ids.extend(kept_ids)
+                self.apps.extend(kept_apps)
+                self.names.extend(kept_names)
+
+        for record_id, applied, app, name in self._append(new_rows):
+            changes.append({
+                'event': EVENT_ADDED,
+                'id': record_id,
+                'app': app,
+                'name': name,
+                'applied': applied.strftime(DATETIME_FORMAT),
+            })
+        return changes
@@ -0,0 +1,132 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+from django.db import connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.backends.signals import connection_created
+
+
+class Profiler:
+    """
+    Records the wall time of the phases of a command (e.g. connecting, planning, running each target), the number and
+    total time of the SQL queries issued (through connection execute wrappers), and the duration and exit code of the
+    subprocesses run.
+
+    Queries are counted on every connection of every thread while the profiler is installed, and attributed to the
+    innermost phase running in the thread that issued them. A disabled profiler records nothing.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.phases = []  # type: List[Dict[str, Any]]
+        self.subprocesses = []  # type: List[Dict[str, Any]]
+        self.queries = {}  # type: Dict[str, Dict[str, Any]]
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._start = time.perf_counter()
+
+    def _phase_stack(self) -> List[Dict[str, Any]]:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def __call__(self, execute, sql, params, many, context):
+        """
+        The execute wrapper installed on the connections (see BaseDatabaseWrapper.execute_wrapper()).
+        """
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            seconds = time.perf_counter() - start
+            stack = self._phase_stack()
+            with self._lock:
+                totals = self.queries.setdefault(context['connection'].alias, {'count': 0, 'seconds': 0.0})
+                totals['count'] += 1
+                totals['seconds'] += seconds
+                if stack:
+                    stack[-1]['queries'] += 1
+                    stack[-1]['query_seconds'] += seconds
+
+    def _wrap_connection(self, connection: BaseDatabaseWrapper, **kwargs) -> None:
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def install(self) -> None:
+        """
+        Starts counting the queries of the connections already initialized in this thread and of every connection
+        established from now on (in any thread).
+        """
+        if not self.enabled:
+            return
+        self._start = time.perf_counter()
+        for connection in connections.all(initialized_only=True):
+            self._wrap_connection(connection)
+        connection_created.connect(self._wrap_connection, dispatch_uid=id(self))
+
+    def uninstall(self) -> None:
+        """
+        Stops counting queries.
+        """
+        if not self.enabled:
+            return
+        connection_created.disconnect(dispatch_uid=id(self))
+        for connection in connections.all(initialized_only=True):
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+    @contextmanager
+    def phase(self, name: str, **details) -> Iterator[None]:
+        """
+        Records the wall time (and queries) of the block as a phase.
+
+        :param name: the name of the phase (e.g. "planning")
+        :param details: more attributes of the phase (e.g. the app and migration name of a target)
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        entry = {
+            'phase': name, **details, 'started': start - self._start, 'seconds': 0.0, 'queries': 0, 'query_seconds': 0.0
+        }
+        stack = self._phase_stack()
+        stack.append(entry)
+        try:
+            yield
+        finally:
+            entry['seconds'] = time.perf_counter() - start
+            stack.pop()
+            with self._lock:
+                self.phases.append(entry)
+
+    def record_subprocess(self, command: str, seconds: float, returncode: int) -> None:
+        """
+        Records a subprocess run.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.subprocesses.append({'command': command, 'seconds': seconds, 'returncode': returncode})
+
+    def summary(self, **details) -> Dict[str, Any]:
+        """
+        Returns the JSON-serializable summary of what was recorded.
+
+        :param details: more attributes of the summary (e.g. the command name)
+        """
+        with self._lock:
+            return {
+                **details,
+                'seconds': time.perf_counter() - self._start,
+                'queries': {
+                    'count': sum(totals['count'] for totals in self.queries.values()),
+                    'seconds': sum(totals['seconds'] for totals in self.queries.values()),
+                    'by_connection': {alias: dict(totals) for alias, totals in self.queries.items()},
+                },
+                'phases': sorted(self.phases, key=lambda entry: entry['started']),
+                'subprocesses': list(self.subprocesses),
+            }
+
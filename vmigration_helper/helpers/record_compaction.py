@@ -0,0 +1,85 @@
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from django.db.migrations import Migration
+from django.db.migrations.loader import MigrationLoader
+
+from vmigration_helper.helpers.migration_record_index import IndexedRecord, MigrationRecordIndex
+
+
+class SquashedMigration(NamedTuple):
+    """
+    A squashed migration on disk that still declares the migrations it replaces, with the records of those.
+    """
+    app: str
+    name: str
+    fully_recorded: bool
+    replaced_records: List[IndexedRecord]
+
+
+class CompactionPlan(NamedTuple):
+    """
+    The migration records that can be deleted (superseded), and the squashed migrations whose replaced records must be
+    kept for now.
+    """
+    superseded: List[IndexedRecord]
+    squashed: List[SquashedMigration]
+
+
+def plan_compaction(
+    index: MigrationRecordIndex, loader: MigrationLoader, apps: Optional[List[str]] = None
+) -> CompactionPlan:
+    """
+    Finds the migration records superseded by squashed migrations, using the migration graph on disk.
+
+    A record is superseded when its migration no longer exists on disk, is not replaced by any migration on disk, and a
+    migration of the same app that does exist on disk was recorded after it (e.g. the squashed migration replacing it,
+    once the replaced migration files and the "replaces" of the squashed migration have been removed). Only apps with
+    migrations on disk are considered.
+
+    While a squashed migration still declares "replaces", Django decides whether it is applied from the records of the
+    migrations it replaces, so those records are never superseded; the squashed migrations are returned instead, with
+    whether they and all the migrations they replace are recorded (then the transition can be completed).
+
+    Records of migrations on disk are always kept, so MigrationRecordsHelper.previous_record() finds the same
+    rollback target as before wherever that target exists on disk; where it pointed to a migration that no longer
+    exists, it finds the nearest earlier record kept instead.
+
+    :param index: the index of the migration records
+    :param loader: the loader of the migration graph on disk
+    :param apps: if given, only records of these apps are considered
+    """
+    replaced_by = {}  # type: Dict[Tuple[str, str], Migration]
+    for migration in loader.disk_migrations.values():
+        for key in migration.replaces:
+            replaced_by[tuple(key)] = migration
+
+    records = [
+        record for record in index.range()
+        if record.app in loader.migrated_apps and (not apps or record.app in apps)
+    ]
+    latest_on_disk = {}  # type: Dict[str, int]
+    for record in records:
+        if (record.app, record.name) in loader.disk_migrations:
+            latest_on_disk[record.app] = record.id
+
+    superseded = []  # type: List[IndexedRecord]
+    replaced_records = {}  # type: Dict[Tuple[str, str], List[IndexedRecord]]
+    for record in records:
+        key = (record.app, record.name)
+        squashed = replaced_by.get(key)
+        if squashed is not None:
+            replaced_records.setdefault((squashed.app_label, squashed.name), []).append(record)
+        elif key not in loader.disk_migrations and record.id < latest_on_disk.get(record.app, 0):
+            superseded.append(record)
+
+    squashed_migrations = []
+    for (app, name), app_records in replaced_records.items():
+        migration = loader.disk_migrations[app, name]
+        recorded = {(record.app, record.name) for record in app_records}
+        squashed_migrations.append(SquashedMigration(
+            app,
+            name,
+            index.contains(app, name) and all(tuple(key) in recorded for key in migration.replaces),
+            app_records,
+        ))
+    return CompactionPlan(superseded, squashed_migrations)
@@ -0,0 +1,216 @@
+import json
+import pickle
+import tempfile
+from datetime import datetime
+from functools import partial
+from typing import Callable, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+FORMAT_CSV = 'csv'
+FORMAT_TSV = 'tsv'
+FORMAT_JSONL = 'jsonl'
+FORMAT_CONSOLE = 'console'
+FORMATS = (FORMAT_CONSOLE, FORMAT_CSV, FORMAT_TSV, FORMAT_JSONL)
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S%z'
+
+# The fields of the migration records written, in order
+RECORD_FIELDS = ('id', 'applied', 'app', 'name')
+
+Record = Tuple[int, datetime, str, str]
+
+
+def parse_applied(value: str) -> Optional[datetime]:
+    """
+    Parses an (ISO 8601) "applied" date and time, e.g. given on the command line or written by MigrationRecordWriter,
+    into the kind of datetime the migration records have: aware if settings.USE_TZ (a naive value is taken in the
+    current time zone), naive otherwise (an aware value is converted to the current time zone).
+
+    Django is only imported when called, so that the fast-start console script can use it without django.setup().
+
+    :returns: the date and time, or None if the value is not a date and time
+    """
+    from django.conf import settings
+    from django.utils import timezone
+    from django.utils.dateparse import parse_datetime
+
+    parsed = parse_datetime(value)
+    if parsed is None:
+        return None
+    if settings.USE_TZ and timezone.is_naive(parsed):
+        return timezone.make_aware(parsed)
+    if not settings.USE_TZ and timezone.is_aware(parsed):
+        return timezone.make_naive(parsed)
+    return parsed
+
+
+class RecordSpool:
+    """
+    Migration records written to a temporary file (in pickled chunks) and read back in order, e.g. to fetch the records
+    of several connections concurrently without holding them in memory. The length of the longest app name written is
+    kept, for the console format.
+    """
+
+    def __init__(self) -> None:
+        self._file = tempfile.TemporaryFile()
+        self.count = 0
+        self.app_name_width = 0
+
+    def write(self, records: Iterable[Record], chunk_size: int = 2000) -> None:
+        chunk = []  # type: List[Record]
+        for record in records:
+            chunk.append(record)
+            self.app_name_width = max(self.app_name_width, len(record[2]))
+            if len(chunk) >= chunk_size:
+                pickle.dump(chunk, self._file)
+                self.count += len(chunk)
+                chunk = []
+        if chunk:
+            pickle.dump(chunk, self._file)
+            self.count += len(chunk)
+
+    def read(self) -> Iterator[Record]:
+        self._file.seek(0)
+        while True:
+            try:
+                chunk = pickle.load(self._file)
+            except EOFError:
+                return
+            yield from chunk
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class MigrationRecordWriter:
+    """
+    Writes migration records, given as (id, applied, app, name) tuples, in one of the supported formats. Lines are
+    buffered and written out in chunks rather than one write per record.
+
+    When records of several connections are written together, a leading "Connection" column (or a "connection" key
+    for JSON lines) identifies the connection of each record.
+    """
+
+    def __init__(
+        self,
+        out: TextIO,
+        print_format: str,
+        app_name_width: Optional[int] = None,
+        buffer_size: int = 2000,
+        connection_width: Optional[int] = None,
+    ) -> None:
+        """
+        :param out: where to write the records to
+        :param print_format: one of FORMATS
+        :param app_name_width: the width of the app column (used only for the console format). If None, it is the
+            length of the longest app name of the first buffer of records: the lines are held until the buffer is full
+            (or flushed), and longer app names after that are not padded.
+        :param buffer_size: the number of lines to buffer before writing them out
+        :param connection_width: if given, a connection column of this width (for the console format) is included
+        """
+        if print_format not in FORMATS:
+            raise ValueError(f'Unsupported format "{print_format}". Use one of: {", ".join(FORMATS)}')
+        self.out = out
+        self.print_format = print_format
+        self.app_name_width = max(app_name_width or 0, 5)
+        self.buffer_size = buffer_size
+        self.with_connection = connection_width is not None
+        self.connection_width = max(connection_width or 0, len('Connection'))
+        self._lines = []  # type: List[str]
+        # The lines held (to be formatted) until the app name width is known
+        self._held = [] if print_format == FORMAT_CONSOLE and app_name_width is None else None
+
+    def _with_connection(self, line: str, connection: Optional[str]) -> str:
+        if not self.with_connection:
+            return line
+        if self.print_format == FORMAT_CONSOLE:
+            return f"{connection.rjust(self.connection_width, ' ')} {line}"
+        if self.print_format == FORMAT_TSV:
+            return f"{connection}\t{line}"
+        return f"{connection},{line}"
+
+    def format_header(self) -> str:
+        if self.print_format == FORMAT_CONSOLE:
+            # alloc width 6 for IDs
+            # alloc width 24 for the date: YYYY-MM-DDTHH:MM:SSZZZZZ (DATETIME_FORMAT)
+            header = (
+                f"{'ID'.rjust(6, ' ')} {'Applied'.ljust(24, ' ')} "
+                f"{'App'.rjust(self.app_name_width, ' ')} Name"
+            )
+        elif self.print_format == FORMAT_TSV:
+            header = "ID\tApplied\tApp\tName"
+        else:
+            header = "ID,Applied,App,Name"
+        return self._with_connection(header, 'Connection')
+
+    def format_record(self, record: Record, connection: Optional[str] = None) -> str:
+        migration_id, applied, app, name = record
+        applied_str = applied.strftime(DATETIME_FORMAT)
+        if self.print_format == FORMAT_JSONL:
+            values = {'id': migration_id, 'applied': applied_str, 'app': app, 'name': name}
+            if self.with_connection:
+                values = {'connection': connection, **values}
+            return json.dumps(values)
+        if self.print_format == FORMAT_CSV:
+            line = f"{migration_id},{applied_str},{app},{name}"
+        elif self.print_format == FORMAT_TSV:
+            line = f"{migration_id}\t{applied_str}\t{app}\t{name}"
+        else:
+            line = (
+                f"{str(migration_id).rjust(6, ' ')} {applied_str.ljust(24, ' ')} "
+                f"{app.rjust(self.app_name_width, ' ')} {name}"
+            )
+        return self._with_connection(line, connection)
+
+    def format_error(self, connection: str, error: str) -> str:
+        """
+        Formats the error of a connection that could not be read (when records of several connections are written).
+        """
+        if self.print_format == FORMAT_JSONL:
+            return json.dumps({'connection': connection, 'error': error})
+        return self._with_connection(f'DB ERROR: {error}', connection)
+
+    def _hold(self, format_line: Callable[[], str], app: str = '') -> None:
+        self._held.append(format_line)
+        self.app_name_width = max(self.app_name_width, len(app))
+        if len(self._held) >= self.buffer_size:
+            self._release()
+
+    def _release(self) -> None:
+        """
+        Fixes the app name width and writes the lines held.
+        """
+        held, self._held = self._held, None
+        for format_line in held:
+            self.write_line(format_line())
+
+    def write_line(self, line: str) -> None:
+        if self._held is not None:
+            self._hold(partial(str, line))
+            return
+        self._lines.append(line)
+        if len(self._lines) >= self.buffer_size:
+            self.flush()
+
+    def write_header(self) -> None:
+        """
+        Writes the header line. JSON lines have no header, so nothing is written for that format.
+        """
+        if self._held is not None:
+            self._hold(self.format_header)
+        elif self.print_format != FORMAT_JSONL:
+            self.write_line(self.format_header())
+
+    def write_records(self, records: Iterable[Record], connection: Optional[str] = None) -> None:
+        for record in records:
+            if self._held is not None:
+                self._hold(partial(self.format_record, record, connection), record[2])
+            else:
+                self.write_line(self.format_record(record, connection))
+
+    def flush(self) -> None:
+        if self._held is not None:
+            self._release()
+        if self._lines:
+            self._lines.append('')
+            self.out.write('\n'.join(self._lines))
+            self._lines = []
+        self.out.flush()
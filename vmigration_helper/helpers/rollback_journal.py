@@ -0,0 +1,237 @@
+import sys
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from vmigration_helper.helpers.local_store import get_state_dir, read_json, write_json
+from vmigration_helper.helpers.migration_record_index import MigrationRecordIndex
+from vmigration_helper.helpers.rollback_plan import RollbackPlan
+
+JOURNAL_VERSION = 1
+JOURNALS_DIR = 'journals'
+
+STATUS_RUNNING = 'running'
+STATUS_FAILED = 'failed'
+STATUS_COMPLETED = 'completed'
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def journals_dir() -> Path:
+    """
+    Returns the "journals" directory of the state directory, where journals are written by default.
+    """
+    return get_state_dir() / JOURNALS_DIR
+
+
+def default_journal_path(connection: str) -> Path:
+    """
+    Returns a new journal path in the "journals" directory of the state directory, named after the connection and the
+    current time.
+    """
+    timestamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+    return journals_dir() / f'rollback-{connection}-{timestamp}.json'
+
+
+def clean_journals(connection: str, index: MigrationRecordIndex) -> List[Path]:
+    """
+    Deletes the journals of the connection in the "journals" directory that are completed, or that can no longer be
+    resumed because the migration records do not match their checkpoint. Files that are not journals are left alone.
+
+    :param connection: the connection whose journals are cleaned
+    :param index: the migration records of the connection
+
+    :returns: the journals deleted
+    """
+    directory = journals_dir()
+    deleted = []
+    for path in sorted(directory.glob('rollback-*.json')):
+        try:
+            journal = RollbackJournal.load(path)
+        except (OSError, ValueError, KeyError, TypeError):
+            continue
+        if journal.plan.connection != connection:
+            continue
+        if journal.status == STATUS_COMPLETED or journal.check(index):
+            path.unlink()
+            deleted.append(path)
+    return deleted
+
+
+class RollbackJournal:
+    """
+    The checkpoint journal of a rollback: the plan being run, the targets completed so far (with how long each took)
+    and how the run ended. The journal file is rewritten (atomically) after each completed target, so that a rollback
+    that failed or was interrupted can be resumed from its first incomplete target without planning again.
+
+    The checkpoint the run is resumed from is the state of the migration records the plan was made from, less any of
+    the records being rolled back: nothing up to the ID rolled back to may have changed, and no record may have been
+    added since.
+
+    Only creating the journal fails if it cannot be written. Once migrations run, a failed write prints a warning and
+    the run goes on: resuming from the journal then runs again the targets completed after the last write, which are
+    already migrated to.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        plan: RollbackPlan,
+        base_fingerprint: str,
+        completed: Optional[List[Dict[str, Any]]] = None,
+        status: str = STATUS_RUNNING,
+        error: Optional[str] = None,
+        started: Optional[str] = None,
+        updated: Optional[str] = None,
+    ) -> None:
+        """
+        :param path: the file the journal is written to
+        :param plan: the plan being run
+        :param base_fingerprint: the fingerprint of the records up to the ID rolled back to
+        :param completed: the targets completed, as dicts of "app", "name", "seconds" and "finished"
+        :param status: "running", "failed" or "completed"
+        :param error: why the run failed
+        """
+        self.path = Path(path)
+        self.plan = plan
+        self.base_fingerprint = base_fingerprint
+        self.completed = completed or []
+        self.status = status
+        self.error = error
+        self.started = started or _now()
+        self.updated = updated or self.started
+        self._lock = threading.Lock()
+        self._warned = False
+
+    @classmethod
+    def create(cls, path: Path, plan: RollbackPlan, index: MigrationRecordIndex) -> 'RollbackJournal':
+        """
+        Creates (and writes) the journal of a run of the plan, made from the records of the index given.
+        """
+        journal = cls(path, plan, index.fingerprint(until_id=plan.to_id))
+        journal.save()
+        return journal
+
+    @classmethod
+    def load(cls, path: Path) -> 'RollbackJournal':
+        """
+        Loads a journal written by a previous run. Raises ValueError if the file is not a journal that can be resumed.
+        """
+        try:
+            data = read_json(path)  # type: Dict[str, Any]
+        except ValueError as e:
+            raise ValueError(f'{path} is not a valid journal: {e}')
+        if data is None:
+            raise ValueError(f'No journal found at {path}')
+        if not isinstance(data, dict) or data.get('version') != JOURNAL_VERSION:
+            raise ValueError(f'{path} is not a journal of version {JOURNAL_VERSION}')
+        try:
+            plan = RollbackPlan.from_json(data['plan'])
+        except ValueError as e:
+            raise ValueError(f'{path} has an invalid plan: {e}')
+        return cls(
+            path,
+            plan,
+            data['base_fingerprint'],
+            completed=data['completed'],
+            status=data['status'],
+            error=data.get('error'),
+            started=data['started'],
+            updated=data['updated'],
+        )
+
+    def save(self) -> None:
+        write_json(self.path, {
+            'version': JOURNAL_VERSION,
+            'status': self.status,
+            'error': self.error,
+            'started': self.started,
+            'updated': self.updated,
+            'base_fingerprint': self.base_fingerprint,
+            'completed': self.completed,
+            'plan': self.plan.to_json(),
+        })
+
+    def _save_or_warn(self) -> None:
+        try:
+            self.save()
+        except OSError as e:
+            if not self._warned:
+                print(f'WARNING: could not write the rollback journal {self.path}: {e}', file=sys.stderr)
+                self._warned = True
+
+    def delete(self) -> None:
+        """
+        Deletes the journal file, e.g. once the run completed.
+        """
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f'WARNING: could not delete the rollback journal {self.path}: {e}', file=sys.stderr)
+
+    def _completed_targets(self) -> Set[Tuple[str, str]]:
+        return {(target['app'], target['name']) for target in self.completed}
+
+    def complete_target(self, app: str, name: str, seconds: float) -> None:
+        """
+        Records a completed target and writes the journal. Safe to call from several threads.
+        """
+        with self._lock:
+            self.updated = _now()
+            self.completed.append({'app': app, 'name': name, 'seconds': round(seconds, 3), 'finished': self.updated})
+            self._save_or_warn()
+
+    def finish(self, error: Optional[str] = None) -> None:
+        """
+        Records the end of the run (failed if an error is given) and writes the journal.
+        """
+        with self._lock:
+            self.status = STATUS_FAILED if error else STATUS_COMPLETED
+            self.error = error
+            self.updated = _now()
+            self._save_or_warn()
+
+    def restart(self) -> None:
+        """
+        Records that the run is being resumed and writes the journal.
+        """
+        self.status = STATUS_RUNNING
+        self.error = None
+        self.updated = _now()
+        self.save()
+
+    def remaining_targets(self) -> List[Tuple[str, str]]:
+        """
+        Returns the targets of the plan not completed yet, in order.
+        """
+        completed = self._completed_targets()
+        return [target for target in self.plan.targets if target not in completed]
+
+    def remaining_groups(self) -> List[List[Tuple[str, str]]]:
+        """
+        Returns the independent groups of the plan with the targets not completed yet (groups left empty are dropped).
+        """
+        completed = self._completed_targets()
+        groups = [[target for target in group if target not in completed] for group in self.plan.groups]
+        return [group for group in groups if group]
+
+    def check(self, index: MigrationRecordIndex) -> List[str]:
+        """
+        Checks that the migration records given by the index are at the checkpoint of the journal: the records up to
+        the ID rolled back to are unchanged, and the others are records of the plan not rolled back yet.
+
+        :returns: what does not match the checkpoint (empty if everything does)
+        """
+        problems = []
+        if index.fingerprint(until_id=self.plan.to_id) != self.base_fingerprint:
+            problems.append(f'records up to ID {self.plan.to_id} changed')
+        planned = set(self.plan.records)
+        for record in index.range(after_id=self.plan.to_id):
+            if record not in planned:
+                problems.append(f'record {record.id} ({record.app} {record.name}) was added')
+        return problems
@@ -0,0 +1,118 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+from vmigration_helper.helpers.local_store import read_json, write_json
+from vmigration_helper.helpers.migration_record_index import IndexedRecord, MigrationRecordIndex
+from vmigration_helper.helpers.rollback_planner import PreflightIssue
+
+PLAN_VERSION = 1
+
+
+class RollbackPlan(NamedTuple):
+    """
+    A rollback planned ahead of time, to be reviewed and run later without planning again: the targets to migrate to
+    (and their independent groups), the records being rolled back, and a fingerprint of all the records the plan was
+    made from, so that running it can check that the records have not changed since. The issues found by the pre-flight
+    check of the targets are kept too.
+    """
+    connection: str
+    to_id: int
+    records: List[IndexedRecord]
+    targets: List[Tuple[str, str]]
+    groups: List[List[Tuple[str, str]]]
+    issues: List[PreflightIssue]
+    fingerprint: str
+    created: str
+
+    @classmethod
+    def create(
+        cls,
+        connection: str,
+        to_id: int,
+        index: MigrationRecordIndex,
+        targets: List[Tuple[str, str]],
+        groups: List[List[Tuple[str, str]]],
+        issues: List[PreflightIssue],
+    ) -> 'RollbackPlan':
+        """
+        Creates the plan of the targets given, made from the records of the index given.
+        """
+        return cls(
+            connection=connection,
+            to_id=to_id,
+            records=index.range(after_id=to_id),
+            targets=targets,
+            groups=groups,
+            issues=issues,
+            fingerprint=index.fingerprint(),
+            created=datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        )
+
+    def to_json(self) -> Dict[str, Any]:
+        """
+        Returns the plan as a JSON-serializable dict (the inverse of from_json()).
+        """
+        data = {'version': PLAN_VERSION, **self._asdict()}
+        data['records'] = [list(record) for record in self.records]
+        data['issues'] = [issue._asdict() for issue in self.issues]
+        return data
+
+    @classmethod
+    def from_json(cls, data: Any) -> 'RollbackPlan':
+        """
+        Returns the plan of a dict made by to_json(). Raises ValueError if it is not a plan that can be run.
+        """
+        if not isinstance(data, dict) or data.get('version') != PLAN_VERSION:
+            raise ValueError(f'not a plan of version {PLAN_VERSION}')
+        return cls(
+            connection=data['connection'],
+            to_id=data['to_id'],
+            records=[IndexedRecord(*record) for record in data['records']],
+            targets=[(app, name) for app, name in data['targets']],
+            groups=[[(app, name) for app, name in group] for group in data['groups']],
+            issues=[PreflightIssue(**issue) for issue in data.get('issues', [])],
+            fingerprint=data['fingerprint'],
+            created=data['created'],
+        )
+
+    def save(self, path: Path) -> None:
+        write_json(path, self.to_json())
+
+    @classmethod
+    def load(cls, path: Path) -> 'RollbackPlan':
+        """
+        Loads a plan saved with save(). Raises ValueError if the file is not a plan that can be run.
+        """
+        try:
+            data = read_json(path)  # type: Dict[str, Any]
+        except ValueError as e:
+            raise ValueError(f'{path} is not a valid plan: {e}')
+        if data is None:
+            raise ValueError(f'No plan found at {path}')
+        try:
+            return cls.from_json(data)
+        except ValueError as e:
+            raise ValueError(f'{path} is {e}')
+
+    def check(self, index: MigrationRecordIndex) -> List[str]:
+        """
+        Checks that the migration records given by the index are those the plan was made from.
+
+        :returns: what changed since the plan was made (empty if nothing did)
+        """
+        if index.fingerprint() == self.fingerprint:
+            return []
+        problems = []
+        current = index.range(after_id=self.to_id)
+        current_ids = {record.id: record for record in current}
+        planned_ids = {record.id for record in self.records}
+        for record in self.records:
+            if current_ids.get(record.id) != record:
+                problems.append(f'record {record.id} ({record.app} {record.name}) is no longer recorded as planned')
+        for record in current:
+            if record.id not in planned_ids:
+                problems.append(f'record {record.id} ({record.app} {record.name}) was added')
+        if not problems:
+            problems.append(f'records up to ID {self.to_id} changed')
+        return problems
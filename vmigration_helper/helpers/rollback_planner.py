@@ -0,0 +1,220 @@
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from django.db.migrations.loader import MigrationLoader
+
+from vmigration_helper.helpers.migration_graph import data_operations, irreversible_operations
+from vmigration_helper.helpers.migration_record_index import IndexedRecord
+from vmigration_helper.helpers.migration_records import MigrationRecordsHelper
+
+MigrationKey = Tuple[str, str]
+
+SEVERITY_ERROR = 'error'
+SEVERITY_WARNING = 'warning'
+
+
+class PreflightIssue(NamedTuple):
+    """
+    A problem found before rolling back: an error (the rollback would fail partway) or a warning (it may be slow).
+    """
+    severity: str
+    app: str
+    name: str
+    message: str
+
+
+class RollbackPlanner:
+    """
+    Plans the (app, target) pairs to migrate to in order to roll back a set of migration records, using the migration
+    graph on disk so that migrations in other apps that depend on a rolled-back migration are taken into account.
+
+    Rolling an app back to a target also unapplies everything (in any app) that depends on the migrations being
+    unapplied. The planner uses this to skip targets whose migrations are already unapplied as a side effect of another
+    target, so at most one target is planned per affected app.
+    """
+
+    def __init__(self, helper: MigrationRecordsHelper, loader: MigrationLoader) -> None:
+        """
+        :param helper: the helper to look up migration records with
+        :param loader: the migration loader holding the migration graph. It must have been created with a connection
+            so that its applied migrations are known.
+        """
+        self.helper = helper
+        self.loader = loader
+
+    def _unapplied_by(self, app: str, name: str) -> Optional[Set[MigrationKey]]:
+        """
+        Returns the applied migrations that migrating the app to the target would unapply (the same backwards plan
+        MigrationExecutor.migration_plan() computes), or None if the graph does not know about the target.
+        """
+        graph = self.loader.graph
+        applied = self.loader.applied_migrations
+        if name == 'zero':
+            starts = [root for root in graph.root_nodes() if root[0] == app]
+        elif (app, name) in graph.node_map:
+            starts = sorted(n for n in graph.node_map[(app, name)].children if n[0] == app)
+        else:
+            return None
+
+        unapplied = set()  # type: Set[MigrationKey]
+        for start in starts:
+            unapplied.update(key for key in graph.backwards_plan(start) if key in applied)
+        return unapplied
+
+    def plan(self, migrations: List[IndexedRecord]) -> List[Tuple[str, str]]:
+        """
+        Plans the targets needed to roll back the migration records given.
+
+        :param migrations: the migration records to roll back, in descending order of ID
+
+        :returns: the (app, migration name) targets to migrate to, in the order to run them. The migration name is
+            "zero" when all migrations of the app are to be unapplied.
+        """
+        to_unapply = {(m.app, m.name) for m in migrations}
+
+        # The earliest record of each app determines its target. Apps are ordered by their latest record so that
+        # dependent migrations (applied later) are rolled back first.
+        earliest = {}  # type: Dict[str, IndexedRecord]
+        for migration in migrations:
+            earliest[migration.app] = migration
+        apps = list(dict.fromkeys(m.app for m in migrations))
+        order = {app: i for i, app in enumerate(apps)}
+        owned = {}  # type: Dict[str, Set[MigrationKey]]
+        for key in to_unapply:
+            owned.setdefault(key[0], set()).add(key)
+
+        targets = {}  # type: Dict[str, str]
+        effects = {}  # type: Dict[str, Set[MigrationKey]]
+        required = []  # type: List[str]
+        for app in apps:
+            previous_record = self.helper.previous_record(earliest[app])
+            targets[app] = previous_record.name if previous_record else 'zero'
+            own = owned[app]
+            effect = self._unapplied_by(app, targets[app])
+            if effect is None or not own.issubset(effect):
+                # The graph cannot account for these records (e.g. migration files removed from disk), so the app
+                # must be migrated on its own.
+                required.append(app)
+                effect = own if effect is None else effect | own
+            effects[app] = effect
+
+        # Greedily pick the targets covering the most migrations still to unapply.
+        chosen = list(required)
+        uncovered = set(to_unapply)
+        for app in chosen:
+            uncovered -= effects[app]
+        while uncovered:
+            best = max(
+                (app for app in apps if app not in chosen),
+                key=lambda a: (len(effects[a] & uncovered), -order[a])
+            )
+            chosen.append(best)
+            uncovered -= effects[best]
+
+        # Drop targets made redundant by targets chosen after them.
+        for app in list(reversed(chosen)):
+            if app in required:
+                continue
+            others = set()  # type: Set[MigrationKey]
+            for other in chosen:
+                if other != app:
+                    others |= effects[other]
+            if (effects[app] & to_unapply).issubset(others):
+                chosen.remove(app)
+
+        return [(app, targets[app]) for app in apps if app in chosen]
+
+    def unapplied_by_targets(self, targets: List[Tuple[str, str]]) -> List[Optional[List[MigrationKey]]]:
+        """
+        Returns, for each of the targets (in the order to run them), the applied migrations that migrating to it would
+        unapply and that no earlier target does, sorted; or None if the graph does not know about the target.
+        """
+        result = []  # type: List[Optional[List[MigrationKey]]]
+        seen = set()  # type: Set[MigrationKey]
+        for app, name in targets:
+            unapplied = self._unapplied_by(app, name)
+            if unapplied is None:
+                result.append(None)
+                continue
+            result.append(sorted(unapplied - seen))
+            seen.update(unapplied)
+        return result
+
+    def preflight(self, targets: List[Tuple[str, str]]) -> List[PreflightIssue]:
+        """
+        Walks every migration that migrating to the targets would unapply (before anything is run) and reports:
+
+        * errors for irreversible operations (e.g. RunPython without reverse_code), which would stop the rollback
+          partway, and for targets the migration graph does not know about
+        * warnings for (reversible) data operations (RunPython and RunSQL), whose cost depends on the data
+
+        :param targets: the (app, migration name) targets, in the order to run them
+
+        :returns: the issues found, in the order of the targets
+        """
+        issues = []  # type: List[PreflightIssue]
+        for (app, name), unapplied in zip(targets, self.unapplied_by_targets(targets)):
+            if unapplied is None:
+                issues.append(PreflightIssue(
+                    SEVERITY_ERROR, app, name, 'the target is not in the migration graph (migration files missing?)'
+                ))
+                continue
+            for key in unapplied:
+                migration = self.loader.graph.nodes.get(key)
+                if migration is None:
+                    continue
+                irreversible = irreversible_operations(migration)
+                for operation in irreversible:
+                    issues.append(
+                        PreflightIssue(SEVERITY_ERROR, key[0], key[1], f'irreversible operation: {operation}')
+                    )
+                for operation in data_operations(migration):
+                    if operation in irreversible:
+                        continue
+                    issues.append(PreflightIssue(SEVERITY_WARNING, key[0], key[1], f'data operation: {operation}'))
+        return issues
+
+    def group_independent(self, targets: List[Tuple[str, str]]) -> List[List[Tuple[str, str]]]:
+        """
+        Splits the targets into groups that have no dependency between them, so the groups can be run concurrently.
+        Two targets depend on each other if the migrations they unapply overlap (the migrations unapplied by a target
+        include everything depending on them, so any dependency path between the targets shows up as an overlap).
+        Targets of the same app, or that the graph does not know about, are never separated.
+
+        :param targets: the (app, migration name) targets, in the order to run them
+
+        :returns: the groups of targets. Targets keep their relative order within each group, and groups are ordered
+            by their first target.
+        """
+        parents = list(range(len(targets)))
+
+        def find(i: int) -> int:
+            while parents[i] != i:
+                parents[i] = parents[parents[i]]
+                i = parents[i]
+            return i
+
+        def union(i: int, j: int) -> None:
+            parents[find(i)] = find(j)
+
+        owners = {}  # type: Dict[Tuple[str, str], int]
+        unknown = []  # type: List[int]
+        for i, (app, name) in enumerate(targets):
+            effect = self._unapplied_by(app, name)
+            if effect is None:
+                unknown.append(i)
+                effect = set()
+            # Targets of the same app always go together.
+            for key in effect | {(app, '')}:
+                if key in owners:
+                    union(i, owners[key])
+                else:
+                    owners[key] = i
+        # Without the graph, nothing can be said about a target's dependencies, so it goes with everything else.
+        for i in unknown:
+            for j in range(len(targets)):
+                union(i, j)
+
+        groups = {}  # type: Dict[int, List[Tuple[str, str]]]
+        for i, target in enumerate(targets):
+            groups.setdefault(find(i), []).append(target)
+        return list(groups.values())
@@ -0,0 +1,156 @@
+from typing import Dict, List, Optional, TextIO, Tuple
+
+from django.db.migrations import Migration
+from django.db.migrations.exceptions import IrreversibleError
+from django.db.migrations.operations import RunPython
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.migrations.state import ProjectState
+
+from vmigration_helper.helpers.migration_runner import InProcessMigrationRunner
+from vmigration_helper.helpers.rollback_planner import PreflightIssue, SEVERITY_ERROR
+
+
+def non_sql_operations(migration: Migration) -> List[str]:
+    """
+    Returns the descriptions of the (reversible) operations of the migration whose reverse cannot be written as SQL,
+    e.g. RunPython with reverse_code (other than RunPython.noop).
+    """
+    return [
+        op.describe() for op in migration.operations
+        if op.reversible and not op.reduces_to_sql
+        and not (isinstance(op, RunPython) and op.reverse_code is RunPython.noop)
+    ]
+
+
+class RollbackSqlWriter:
+    """
+    Writes the SQL script of a rollback: the backwards SQL of every migration the targets would unapply (the same as
+    "sqlmigrate --backwards" gives), in the order they would be unapplied, each followed by the DELETE statements of its
+    migration records. The script is written one migration at a time, and is wrapped in a single transaction when the
+    database can roll back DDL and all the migrations are atomic.
+
+    The migration graph of the runner is used for everything (it is loaded only once), and the project state before
+    each migration is computed in a single pass over the graph, as the migration executor does when migrating
+    backwards, rather than rendered again for each migration.
+    """
+
+    def __init__(self, runner: InProcessMigrationRunner, out: Optional[TextIO] = None) -> None:
+        """
+        :param runner: the runner whose executor (and connection) to generate the SQL with
+        :param out: where to write the script to (only needed by write())
+        """
+        self.runner = runner
+        self.out = out
+
+    def unapply_plan(self, targets: List[Tuple[str, str]]) -> List[Migration]:
+        """
+        Returns the migrations that migrating to the targets in order would unapply, in the order they would be
+        unapplied. Raises ValueError if a target would apply migrations.
+        """
+        executor = self.runner.executor
+        loader = executor.loader
+        applied = dict(loader.applied_migrations)
+        migrations = []  # type: List[Migration]
+        try:
+            for app, name in targets:
+                for migration, backwards in executor.migration_plan([self.runner.resolve_target(app, name)]):
+                    if not backwards:
+                        raise ValueError(
+                            f'Migrating {app} to {name} would apply {migration.app_label}.{migration.name}'
+                        )
+                    migrations.append(migration)
+                    # Later targets are planned as if the migration had been unapplied.
+                    del loader.applied_migrations[(migration.app_label, migration.name)]
+        finally:
+            loader.applied_migrations = applied
+        return migrations
+
+    def preflight(self, targets: List[Tuple[str, str]]) -> List[PreflightIssue]:
+        """
+        Reports an error for every operation the targets would unapply whose reverse cannot be written as SQL: the
+        script would still mark its migration unapplied without reversing it, unlike the rollback itself. Raises
+        ValueError if a target would apply migrations.
+
+        :param targets: the (app, migration name) targets to migrate to, in order
+        """
+        return [
+            PreflightIssue(
+                SEVERITY_ERROR, migration.app_label, migration.name, f'cannot be written as SQL: {operation}'
+            )
+            for migration in self.unapply_plan(targets)
+            for operation in non_sql_operations(migration)
+        ]
+
+    def _states(self, migrations: List[Migration]) -> Dict[Migration, ProjectState]:
+        """
+        Returns the project state before each of the migrations given is applied.
+        """
+        executor = self.runner.executor
+        graph = executor.loader.graph
+        to_run = set(migrations)
+        applied = {graph.nodes[key] for key in executor.loader.applied_migrations if key in graph.nodes}
+        state = executor._create_project_state()
+        states = {}  # type: Dict[Migration, ProjectState]
+        for migration, _ in executor.migration_plan(graph.leaf_nodes(), clean_start=True):
+            if not to_run:
+                break
+            if migration in to_run:
+                if 'apps' not in state.__dict__:
+                    state.apps  # Render all models once, as the executor does (performance critical).
+                states[migration] = state
+                state = migration.mutate_state(state, preserve=True)
+                to_run.remove(migration)
+            elif migration in applied:
+                migration.mutate_state(state, preserve=False)
+        return states
+
+    def _write(self, text: str) -> None:
+        self.out.write(text + '\n')
+
+    def write(self, targets: List[Tuple[str, str]], description: str = '') -> int:
+        """
+        Writes the script of the rollback to the targets.
+
+        :param targets: the (app, migration name) targets to migrate to, in order
+        :param description: what the script does, written as a comment at the top
+        :returns: the number of migrations unapplied by the script
+        """
+        connection = self.runner.connection
+        migrations = self.unapply_plan(targets)
+        states = self._states(migrations)
+        meta = MigrationRecorder.Migration._meta
+        table = connection.ops.quote_name(meta.db_table)
+        app_column = connection.ops.quote_name(meta.get_field('app').column)
+        name_column = connection.ops.quote_name(meta.get_field('name').column)
+
+        if description:
+            self._write(f'-- {description}')
+        self._write(f'-- {len(migrations)} migration(s) to unapply on {connection.vendor} ({connection.alias})')
+        in_transaction = connection.features.can_rollback_ddl and all(migration.atomic for migration in migrations)
+        if in_transaction:
+            self._write(connection.ops.start_transaction_sql())
+        elif migrations:
+            self._write(
+                '-- Not wrapped in a transaction: the database cannot roll back DDL or a migration is not atomic'
+            )
+
+        for migration in migrations:
+            self._write(f'\n-- Unapply {migration.app_label}.{migration.name}')
+            with connection.schema_editor(collect_sql=True, atomic=migration.atomic) as schema_editor:
+                try:
+                    migration.unapply(states[migration], schema_editor, collect_sql=True)
+                except IrreversibleError as e:
+                    schema_editor.collected_sql.append(f'-- IRREVERSIBLE, NO SQL WRITTEN: {e}')
+            for statement in schema_editor.collected_sql:
+                self._write(statement)
+            # Replacing (squashed) migrations are recorded as unapplied together with the migrations they replace.
+            for app, name in [*migration.replaces, (migration.app_label, migration.name)]:
+                self._write(
+                    f'DELETE FROM {table} WHERE {app_column} = {schema_editor.quote_value(app)} '
+                    f'AND {name_column} = {schema_editor.quote_value(name)};'
+                )
+            self.out.flush()
+
+        if in_transaction:
+            self._write('\n' + connection.ops.end_transaction_sql())
+        return len(migrations)
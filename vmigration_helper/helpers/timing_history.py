@@ -0,0 +1,158 @@
+import statistics
+import sys
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from vmigration_helper.helpers.local_store import get_state_dir, read_json, write_json
+
+TIMINGS_FILE = 'timings.json'
+TIMINGS_VERSION = 1
+MAX_SAMPLES = 10
+
+BACKWARDS = 'backwards'
+FORWARDS = 'forwards'
+
+
+class MigrationTiming(NamedTuple):
+    """
+    How long applying (or unapplying) a migration took.
+    """
+    app: str
+    name: str
+    backwards: bool
+    seconds: float
+
+
+class TimingStats(NamedTuple):
+    """
+    The timing history of a migration in one direction on one connection.
+    """
+    connection: str
+    app: str
+    name: str
+    direction: str
+    runs: int
+    median: float
+    max: float
+    last: float
+    last_run: str
+
+
+class TimingHistory:
+    """
+    A small local store of how long each migration took to apply and to unapply, per connection, kept in the state
+    directory of this app (see local_store). The last few durations of each migration are kept, and estimates are
+    their median.
+
+    Timings recorded are only written by save(), which reads the file again and adds them to it, so that several
+    processes recording timings at the same time do not lose each other's timings.
+
+    The history is only an aid: if the file cannot be read or written, a warning is printed and there is no history.
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        """
+        :param path: the file to store the timings in. Defaults to "timings.json" in the state directory of this app.
+        """
+        self._path = Path(path) if path else None
+        self._connections = {}  # type: Dict[str, Dict[str, Dict[str, Dict[str, Any]]]]
+        self._pending = []  # type: List[Tuple[str, MigrationTiming, str]]
+        self._lock = threading.Lock()
+        self._warned = False
+        self._read()
+
+    @property
+    def path(self) -> Path:
+        if self._path is None:
+            self._path = get_state_dir() / TIMINGS_FILE
+        return self._path
+
+    def _warn(self, message: str) -> None:
+        if not self._warned:
+            print(f'WARNING: {message}', file=sys.stderr)
+            self._warned = True
+
+    def _read(self) -> bool:
+        """
+        Reads the timings from the file. If it cannot be read (or is not a timing history), there is no history.
+
+        :returns: whether the file could be read
+        """
+        self._connections = {}
+        try:
+            data = read_json(self.path, default={})
+        except (OSError, ValueError) as e:
+            self._warn(f'Cannot read the timing history, continuing without it: {e}')
+            return False
+        if not isinstance(data, dict) or data.get('version') != TIMINGS_VERSION:
+            return True
+        if not isinstance(data.get('connections'), dict):
+            self._warn(f'Ignoring the timing history in {self.path}: unexpected content')
+            return False
+        self._connections = data['connections']
+        return True
+
+    def _add(self, connection: str, timing: MigrationTiming, when: str) -> None:
+        direction = BACKWARDS if timing.backwards else FORWARDS
+        migration = self._connections.setdefault(connection, {}).setdefault(timing.app, {}).setdefault(timing.name, {})
+        entry = migration.setdefault(direction, {'samples': [], 'runs': 0})
+        entry['samples'] = (entry['samples'] + [round(timing.seconds, 3)])[-MAX_SAMPLES:]
+        entry['runs'] += 1
+        entry['last_run'] = when
+
+    def record(self, connection: str, timings: Iterable[MigrationTiming]) -> None:
+        """
+        Records the timings of migrations run on the connection given. Safe to call from several threads.
+        """
+        when = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        with self._lock:
+            for timing in timings:
+                self._add(connection, timing, when)
+                self._pending.append((connection, timing, when))
+
+    def save(self) -> None:
+        """
+        Adds the timings recorded since the last save() to the file. They are dropped (with a warning) if the file
+        cannot be read or written.
+        """
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            if not self._read():
+                return
+            for connection, timing, when in pending:
+                self._add(connection, timing, when)
+            try:
+                write_json(self.path, {'version': TIMINGS_VERSION, 'connections': self._connections})
+            except OSError as e:
+                self._warn(f'Cannot write the timing history: {e}')
+
+    def estimate(self, connection: str, app: str, name: str, backwards: bool = True) -> Optional[float]:
+        """
+        Returns the estimated seconds to apply (or unapply) the migration on the connection, or None if it has no
+        history.
+        """
+        migration = self._connections.get(connection, {}).get(app, {}).get(name, {})
+        entry = migration.get(BACKWARDS if backwards else FORWARDS)
+        return statistics.median(entry['samples']) if entry else None
+
+    def stats(self, connection: Optional[str] = None) -> List[TimingStats]:
+        """
+        Returns the timing history of every migration (of the connection given, if any), in no particular order.
+        """
+        stats = []
+        for alias, app_migrations in self._connections.items():
+            if connection and alias != connection:
+                continue
+            for app, migrations in app_migrations.items():
+                for name, directions in migrations.items():
+                    for direction, entry in directions.items():
+                        samples = entry['samples']
+                        stats.append(TimingStats(
+                            alias, app, name, direction, entry['runs'], statistics.median(samples), max(samples),
+                            samples[-1], entry['last_run'],
+                        ))
+        return stats
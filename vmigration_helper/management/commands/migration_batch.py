@@ -0,0 +1,163 @@
+import io
+import json
+import shlex
+import sys
+import time
+from contextlib import redirect_stdout
+from typing import List, Optional, Tuple
+
+from django.core.management import CommandError, load_command_class
+from django.db import OperationalError
+
+from vmigration_helper.helpers.command import MigrateTargetsCommand, MigrationCommand
+from vmigration_helper.helpers.migration_records import MigrationRecordsHelper
+
+APP_NAME = 'vmigration_helper'
+BATCH_COMMAND = 'migration_batch'
+DEFAULT_DELIMITER = '---'
+OUTPUT_DELIMITED = 'delimited'
+OUTPUT_JSONL = 'jsonl'
+
+
+class Command(MigrationCommand):
+    """
+    Runs a sequence of the commands of this app in one process, over one prepared connection and one shared
+    MigrationRecordsHelper, so that a pipeline of helper operations pays for Django's startup only once.
+
+    The commands are read from a script file (or stdin), one per line, with their arguments as on the command line
+    (the "migration_" prefix of the command name is optional). Blank lines and lines starting with "#" are ignored::
+
+        migration_current_id
+        records --format csv --since-id 20
+        migration_rollback 23 --dry-run
+
+    The output of each command is followed by a delimiter line with its exit code (e.g. "--- 0"), or (with
+    "--output jsonl") each command produces one JSON line with its output, exit code, error and duration. Commands
+    that do not give "--connection-name" run against the connection of the batch.
+
+    Optional parameters:
+        --output ("delimited" | "jsonl") how to stream the results (default is "delimited")
+        --delimiter <text> the delimiter line (default is "---")
+        --stop-on-error stop at the first command that fails
+    """
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            'script',
+            nargs='?',
+            default='-',
+            help='The file to read the commands from, one per line. Defaults to stdin ("-").'
+        )
+        parser.add_argument(
+            '--output',
+            default=OUTPUT_DELIMITED,
+            choices=(OUTPUT_DELIMITED, OUTPUT_JSONL),
+            help=f'How to stream the results of the commands. Default is: "{OUTPUT_DELIMITED}"'
+        )
+        parser.add_argument(
+            '--delimiter',
+            default=DEFAULT_DELIMITER,
+            help=f'The line written after the output of each command (followed by its exit code). '
+                 f'Default is: "{DEFAULT_DELIMITER}"'
+        )
+        parser.add_argument(
+            '--stop-on-error',
+            action='store_true',
+            help='Stop at the first command that fails'
+        )
+
+    @staticmethod
+    def _read_script(script: str) -> List[str]:
+        try:
+            if script == '-':
+                lines = sys.stdin.readlines()
+            else:
+                with open(script) as f:
+                    lines = f.readlines()
+        except OSError as e:
+            raise CommandError(f'Cannot read {script}: {e}')
+        return [line.strip() for line in lines if line.strip() and not line.strip().startswith('#')]
+
+    def _load_command(self, name: str) -> Tuple[str, MigrationCommand]:
+        """
+        Returns the (full) name and a new instance of the command of this app given.
+        """
+        for candidate in (name, f'migration_{name}'):
+            if candidate == BATCH_COMMAND:
+                break
+            try:
+                command = load_command_class(APP_NAME, candidate)
+            except ModuleNotFoundError:
+                continue
+            if isinstance(command, MigrationCommand):
+                return candidate, command
+        raise CommandError(f'Unknown command: {name}')
+
+    def _run_line(self, line: str, helper: MigrationRecordsHelper) -> Tuple[int, Optional[str]]:
+        """
+        Runs the command line given with the shared helper.
+
+        :returns: the exit code of the command and its error message, if any
+        """
+        try:
+            name, *args = shlex.split(line)
+            name, command = self._load_command(name)
+            if not any(arg.startswith(('--connection-name', '--all-connections')) for arg in args):
+                args = ['--connection-name', self.connection_name] + args
+            command.shared_migration_helper = helper
+            if isinstance(command, MigrateTargetsCommand):
+                # Relay the output of migrate subprocesses through the (possibly captured) stdout of the batch rather
+                # than letting them write to the file descriptor of stdout directly.
+                command.runner_stdout = sys.stdout
+
+            parser = command.create_parser('manage.py', name)
+            options = vars(parser.parse_args(args))
+            # The system checks already ran for the batch.
+            options['skip_checks'] = True
+            command.execute(*options.pop('args', ()), **options)
+            return 0, None
+        except SystemExit as e:
+            # The command has already reported why it exited (e.g. "DB ERROR: ...").
+            return e.code if isinstance(e.code, int) else 1, None
+        except CommandError as e:
+            return e.returncode, f'CommandError: {e}'
+        except Exception as e:
+            return 1, f'{type(e).__name__}: {e}'
+
+    def handle(self, *args, **options):
+        lines = self._read_script(options['script'])
+        as_jsonl = options['output'] == OUTPUT_JSONL
+        try:
+            helper = self.create_migration_helper()
+        except OperationalError as e:
+            print(f'DB ERROR: {e}')
+            exit(1)
+
+        failed = False
+        for line in lines:
+            start = time.perf_counter()
+            if as_jsonl:
+                output = io.StringIO()
+                with redirect_stdout(output):
+                    exit_code, error = self._run_line(line, helper)
+                print(json.dumps({
+                    'command': line,
+                    'exit_code': exit_code,
+                    'error': error,
+                    'seconds': round(time.perf_counter() - start, 6),
+                    'output': output.getvalue(),
+                }))
+            else:
+                exit_code, error = self._run_line(line, helper)
+                if error:
+                    print(error, file=sys.stderr)
+                print(f"{options['delimiter']} {exit_code}")
+            sys.stdout.flush()
+
+            if exit_code:
+                failed = True
+                if options['stop_on_error']:
+                    break
+        if failed:
+            exit(1)
@@ -0,0 +1,122 @@
+from itertools import groupby
+from typing import List
+
+from django.core.management import CommandError
+from django.db import OperationalError
+
+from vmigration_helper.helpers.command import MigrationCommand
+from vmigration_helper.helpers.migration_record_index import IndexedRecord
+from vmigration_helper.helpers.migration_records import DELETE_BATCH_SIZE
+from vmigration_helper.helpers.record_compaction import plan_compaction
+
+
+class Command(MigrationCommand):
+    """
+    Deletes the migration records (from the ``django_migrations`` table) superseded by squashed migrations, so that
+    Django and the commands here have fewer records to read.
+
+    A record is superseded when its migration no longer exists on disk, is not replaced by a migration on disk, and a
+    migration of the same app that does exist on disk was recorded after it: typically the records of migrations
+    replaced by a squashed migration once the squash has been completed (the replaced migration files deleted and the
+    "replaces" of the squashed migration removed). While a squashed migration still declares "replaces", Django needs
+    the records of the migrations it replaces to know that it is applied, so those are kept; the squashed migrations
+    fully recorded (whose transition can be completed) are listed instead.
+
+    Records of migrations on disk are never deleted, so the rollback targets planned by "migration_rollback" (from the
+    record preceding each record rolled back) stay the same wherever they are migrations that exist.
+
+    The records are deleted in batches, each committed on its own (so locks are only held for one batch at a time),
+    with the progress printed after each batch.
+
+    Optional parameters:
+        --app <app> only compact the records of the app given (can be repeated)
+        --dry-run only show the records that would be deleted
+        --batch-size <n> the number of records to delete per batch (default is 500)
+        --yes delete without asking for confirmation
+    """
+
+    uses_migration_graph = True
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--app',
+            action='append',
+            help='Only compact the records of this app. Can be repeated.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only show the records that would be deleted'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DELETE_BATCH_SIZE,
+            help=f'The number of records to delete per batch. Default is: {DELETE_BATCH_SIZE}'
+        )
+        parser.add_argument(
+            '--yes',
+            action='store_true',
+            help='Delete the records without asking for confirmation'
+        )
+
+    @staticmethod
+    def _print_records(records: List[IndexedRecord], verbosity: int) -> None:
+        for app, app_records in groupby(sorted(records, key=lambda record: (record.app, record.id)), lambda r: r.app):
+            app_records = list(app_records)
+            print(f'  {app}: {len(app_records)} record(s), IDs {app_records[0].id} to {app_records[-1].id}')
+            if verbosity > 1:
+                for record in app_records:
+                    print(f'    {record.id}: {record.app}:{record.name}')
+
+    @staticmethod
+    def _progress(deleted: int, total: int) -> None:
+        print(f'  Deleted {deleted} of {total} record(s)', flush=True)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        try:
+            helper = self.create_migration_helper()
+            loader = self.create_migration_loader(helper)
+            with self.profiler.phase('planning'):
+                plan = plan_compaction(helper.get_index(), loader, apps=options['app'])
+
+            for squashed in plan.squashed:
+                kept = (
+                    f'Keeping {len(squashed.replaced_records)} record(s) replaced by {squashed.app}:{squashed.name}'
+                )
+                if squashed.fully_recorded:
+                    print(
+                        f'{kept}, which still declares "replaces"; it is fully recorded, so once it is in every '
+                        'environment, delete the migrations it replaces and remove its "replaces", then compact again'
+                    )
+                else:
+                    print(f'{kept}, which is not fully recorded')
+
+            records = plan.superseded
+            if not records:
+                print('No superseded migration records found.')
+                return
+            print(f'Superseded migration records to delete ({len(records)}):')
+            self._print_records(records, options['verbosity'])
+            if options['dry_run']:
+                return
+
+            yes = options['yes']
+            if not yes and 'yes' == input(f'Confirm deletion of {len(records)} record(s) (yes or no): '):
+                yes = True
+            if not yes:
+                print('Nothing done.')
+                return
+            with self.profiler.phase('delete', records=len(records)):
+                deleted = helper.delete_migrations(
+                    [record.id for record in records], batch_size=batch_size, atomic=False, progress=self._progress
+                )
+            print(f'Migration records deleted: {deleted}')
+        except OperationalError as e:
+            print(f'DB ERROR: {e}')
+            exit(1)
@@ -1,5 +1,6 @@
+import json
+
 from django.db import OperationalError
-from django.db.models import Max
 
 from vmigration_helper.helpers.command import MigrationCommand
 
@@ -7,20 +8,58 @@ from vmigration_helper.helpers.command import MigrationCommand
 class Command(MigrationCommand):
     """
     Displays the ID of the last entry in the migration records (from the ``django_migrations`` table).
+
+    When run against several connections (see "--connection-name" and "--all-connections"), the connections are
+    queried concurrently and the IDs are shown per connection, as a table or (with "--json") a JSON document keyed by
+    connection name. A connection that fails shows its error without affecting the others.
     """
 
+    supports_multiple_connections = True
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Show the ID(s) as a JSON document keyed by connection name'
+        )
+
     def create_snapshot_name(self) -> int:
         """
         Returns the current max ID of the migration records table (django_migrations). If there are no records,
         0 is returned.
         """
         helper = self.create_migration_helper()
-        latest_migration_id = helper.get_migration_records_qs().aggregate(Max('id'))['id__max']
-        return latest_migration_id or 0
+        return helper.latest_migration_id()
 
     def handle(self, *args, **options):
-        try:
-            print(self.create_snapshot_name())
-        except OperationalError as e:
-            print(f'DB ERROR: {e}')
+        as_json = options['json']
+        if not self.is_multiple_connections:
+            try:
+                latest_migration_id = self.create_snapshot_name()
+            except OperationalError as e:
+                if as_json:
+                    print(json.dumps({self.connection_name: {'error': str(e)}}))
+                else:
+                    print(f'DB ERROR: {e}')
+                exit(1)
+            if as_json:
+                print(json.dumps({self.connection_name: {'id': latest_migration_id}}))
+            else:
+                print(latest_migration_id)
+            return
+
+        results = self.run_for_connections(lambda helper: helper.latest_migration_id())
+        if as_json:
+            print(json.dumps({
+                result.alias: {'error': result.error} if result.error else {'id': result.value}
+                for result in results
+            }, indent=2))
+        else:
+            alias_width = max(max(len(result.alias) for result in results), len('Connection'))
+            print(f"{'Connection'.rjust(alias_width, ' ')} ID")
+            for result in results:
+                value = f'DB ERROR: {result.error}' if result.error else result.value
+                print(f"{result.alias.rjust(alias_width, ' ')} {value}")
+        if any(result.error for result in results):
             exit(1)
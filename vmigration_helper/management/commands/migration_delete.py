@@ -1,26 +1,73 @@
+import fnmatch
+import re
+import sys
+from typing import List, Tuple
+
+from django.core.management import CommandError
+from django.db import OperationalError
+
 from vmigration_helper.helpers.command import MigrationCommand
 
 
+def parse_migration(text: str) -> Tuple[str, str]:
+    """
+    Parses an "app:name" (or "app name") migration given on the command line or in a file.
+    """
+    app, sep, name = text.strip().partition(':')
+    if not sep:
+        app, _, name = text.strip().partition(' ')
+    app, name = app.strip(), name.strip()
+    if not app or not name:
+        raise CommandError(f'Invalid migration "{text.strip()}": expected "app:name"')
+    return app, name
+
+
 class Command(MigrationCommand):
     """
-    Deletes a migration record from django_migrations. This operation is a low-level operation and
+    Deletes migration records from django_migrations. This operation is a low-level operation and
     should be used only as a last resort when a migration cannot be rolled back, and deleting a record that is a
     dependency of other migrations will cause those migrations to be broken, so avoid deleting non-leaf migrations
     unless you plan to also delete other migrations that depend on the record.
+
+    The records to delete can be given as "app name" (one record), as any number of "app:name" pairs, with "--app"
+    (optionally with "--name" or "--name-regex" to match their names) and/or listed in a file ("--file", "-" for
+    stdin, which requires "--yes") with one "app:name" per line. All the matching records are shown (found with one
+    query) and deleted, once confirmed, in a single transaction.
     """
 
     def add_arguments(self, parser):
         super().add_arguments(parser)
         parser.add_argument(
-            'app',
+            'migrations',
+            nargs='*',
+            help=(
+                'The migration records to delete, as "app:name" pairs (or a single "app name" pair).'
+            )
+        )
+        parser.add_argument(
+            '--app',
+            help=(
+                'Delete the records of this app (all of them unless --name or --name-regex is given).'
+            )
+        )
+        name_group = parser.add_mutually_exclusive_group()
+        name_group.add_argument(
+            '--name',
+            help=(
+                'A glob pattern (e.g. "0003_*") the names of the records of --app to delete must match.'
+            )
+        )
+        name_group.add_argument(
+            '--name-regex',
             help=(
-                'The application name of the migration record to delete.'
+                'A regular expression the names of the records of --app to delete must (fully) match.'
             )
         )
         parser.add_argument(
-            'name',
+            '--file',
             help=(
-                'The migration name of the migration record to delete.'
+                'A file listing the records to delete, one "app:name" per line ("-" to read stdin, with --yes). '
+                'Blank lines and lines starting with "#" are ignored.'
             )
         )
         parser.add_argument(
@@ -31,23 +78,80 @@ class Command(MigrationCommand):
             )
         )
 
+    def _get_migrations(self, options) -> List[Tuple[str, str]]:
+        """
+        Returns the (app, name) pairs given as arguments and in the file, if any.
+        """
+        arguments = options['migrations']
+        if len(arguments) == 2 and ':' not in arguments[0] + arguments[1]:
+            # The original "app name" form.
+            migrations = [(arguments[0], arguments[1])]
+        else:
+            migrations = [parse_migration(argument) for argument in arguments]
+
+        if options['file']:
+            try:
+                if options['file'] == '-':
+                    lines = sys.stdin.readlines()
+                else:
+                    with open(options['file']) as f:
+                        lines = f.readlines()
+            except OSError as e:
+                raise CommandError(f'Cannot read {options["file"]}: {e}')
+            migrations.extend(
+                parse_migration(line) for line in lines if line.strip() and not line.strip().startswith('#')
+            )
+        return list(dict.fromkeys(migrations))
+
     def handle(self, *args, **options):
         app = options['app']
-        name = options['name']
         yes = options['yes']
-        if app and name:
+        if options['file'] == '-' and not yes:
+            raise CommandError('--yes is required with "--file -": stdin cannot be used for the confirmation too')
+        migrations = self._get_migrations(options)
+
+        if (options['name'] or options['name_regex']) and not app:
+            raise CommandError('--name and --name-regex require --app')
+        if not migrations and not app:
+            raise CommandError('No migration records to delete were given')
+        name_pattern = None
+        if options['name']:
+            name_pattern = re.compile(fnmatch.translate(options['name']))
+        elif options['name_regex']:
+            try:
+                name_pattern = re.compile(options['name_regex'])
+            except re.error as e:
+                raise CommandError(f'Invalid --name-regex: {e}')
+
+        try:
             helper = self.create_migration_helper()
+            records = helper.find_migrations(migrations, app=app, name_pattern=name_pattern)
 
+            found = {(record.app, record.name) for record in records}
+            for migration_app, migration_name in migrations:
+                if (migration_app, migration_name) not in found:
+                    print(f"No records found for {migration_app}:{migration_name}")
+            if app and not any(record.app == app for record in records):
+                print(f"No matching records found for app {app}")
+            if not records:
+                print("Nothing done.")
+                return
+
+            print(f"Migration records to delete ({len(records)}):")
+            for record in records:
+                print(f"  {record.id}: {record.app}:{record.name}")
             if not yes:
-                record = helper.get_migration_records_qs().filter(app=app, name=name)
-                if record.exists():
-                    if 'yes' == input(f'Confirm deletion of {app}:{name} (yes or no): '):
-                        yes = True
-                else:
-                    print(f"No records found for {app}:{name}")
+                try:
+                    yes = 'yes' == input(f'Confirm deletion of {len(records)} record(s) (yes or no): ')
+                except EOFError:
+                    # stdin is closed or empty: take it as a no.
+                    print()
             if yes:
-                deleted = helper.delete_migration(app, name)
+                deleted = helper.delete_migrations([record.id for record in records])
 
-                print(f"Migration record {app}:{name} deleted: {deleted}")
+                print(f"Migration records deleted: {deleted}")
             else:
                 print("Nothing done.")
+        except OperationalError as e:
+            print(f'DB ERROR: {e}')
+            exit(1)
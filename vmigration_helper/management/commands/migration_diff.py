@@ -0,0 +1,169 @@
+import json
+import os
+from typing import Iterable
+
+from django.conf import settings
+from django.core.management import CommandError
+from django.db import connections, OperationalError
+
+from vmigration_helper.helpers.command import MigrationCommand
+from vmigration_helper.helpers.migration_diff import (
+    DIFF_ONLY_LEFT, DIFF_ONLY_RIGHT, DiffEntry, iter_db_records, MigrationDiff, read_records_file
+)
+from vmigration_helper.helpers.record_writer import DATETIME_FORMAT, Record
+
+CHUNK_SIZE = 2000
+
+FORMAT_CONSOLE = 'console'
+FORMAT_JSONL = 'jsonl'
+FORMATS = (FORMAT_CONSOLE, FORMAT_JSONL)
+
+MARKERS = {DIFF_ONLY_LEFT: '<', DIFF_ONLY_RIGHT: '>'}
+
+
+class Command(MigrationCommand):
+    """
+    Compares the migration records of two connections (or of a connection and a file exported with
+    "migration_records --format csv|tsv|jsonl"), e.g. to find what is applied in staging but not in prod. Records are
+    matched by app and migration name, since their IDs differ between environments.
+
+    Both sides are streamed in (app, name) order and merge-joined, so memory use does not grow with the size of the
+    tables (exported files are read and sorted in memory).
+
+    The migrations recorded only on the left ("<") or only on the right (">") are listed, followed by a summary and
+    the targets to migrate the right side to so that it converges to the left side. For example::
+
+        python manage.py migration_diff --left staging --right default
+
+        Comparing staging (left) with default (right)
+        < myapp 0005_add_index (left ID 23, applied 2024-12-06T18:15:03+0000)
+        > other 0002_backfill (right ID 40, applied 2024-12-01T10:00:00+0000)
+        Left: 23 records, right: 21 records, 21 in common; 2 only in left, 1 only in right; largest skew: 3600s
+        Targets to converge default to staging:
+          other 0001_initial
+          myapp 0005_add_index
+
+    Parameters:
+        --left <connection or file> the left side
+        --right <connection or file> the right side (default is the connection of "--connection-name")
+
+    Optional parameters:
+        --max-skew <seconds> also list ("~") the migrations recorded on both sides with applied times more than this
+            many seconds apart
+        --format ("console" | "jsonl") show the differences in human-friendly format (default) or as JSON lines
+        --chunk-size <n> the number of records to fetch from the DB at a time
+    """
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--left',
+            required=True,
+            help='The connection (or exported records file) of the left side'
+        )
+        parser.add_argument(
+            '--right',
+            help='The connection (or exported records file) of the right side. Default is the "--connection-name"'
+        )
+        parser.add_argument(
+            '--max-skew',
+            type=float,
+            help='List the migrations applied on both sides more than this many seconds apart'
+        )
+        parser.add_argument(
+            '--format',
+            default=FORMAT_CONSOLE,
+            choices=FORMATS,
+            help=f'The format to display the differences ({", ".join(FORMATS)}). Default is: "{FORMAT_CONSOLE}"'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help=f'The number of records to fetch from the DB at a time. Default is: {CHUNK_SIZE}'
+        )
+
+    def _records(self, side: str, chunk_size: int) -> Iterable[Record]:
+        """
+        Returns the records of the side given (a connection or a file), in (app, name) order.
+        """
+        if side in settings.DATABASES:
+            connection = connections[side]
+            with self.profiler.phase('connect', connection=side):
+                connection.prepare_database()
+            return iter_db_records(self.create_migration_helper(connection), chunk_size)
+        if os.path.isfile(side):
+            with self.profiler.phase('read_file', file=side):
+                try:
+                    return read_records_file(side)
+                except ValueError as e:
+                    raise CommandError(str(e))
+        raise CommandError(f'{side} is neither a connection nor a file')
+
+    @staticmethod
+    def _format_entry(entry: DiffEntry) -> str:
+        if entry.kind in MARKERS:
+            side, record = ('left', entry.left) if entry.left else ('right', entry.right)
+            return (
+                f'{MARKERS[entry.kind]} {entry.app} {entry.name} '
+                f'({side} ID {record[0]}, applied {record[1].strftime(DATETIME_FORMAT)})'
+            )
+        return (
+            f'~ {entry.app} {entry.name} (applied {entry.left[1].strftime(DATETIME_FORMAT)} on the left, '
+            f'{entry.right[1].strftime(DATETIME_FORMAT)} on the right: {entry.skew:+.0f}s)'
+        )
+
+    @staticmethod
+    def _entry_json(entry: DiffEntry) -> dict:
+        values = {'event': entry.kind, 'app': entry.app, 'name': entry.name}
+        for side, record in (('left', entry.left), ('right', entry.right)):
+            if record:
+                values[f'{side}_id'] = record[0]
+                values[f'{side}_applied'] = record[1].strftime(DATETIME_FORMAT)
+        if entry.left and entry.right:
+            values['skew'] = entry.skew
+        return values
+
+    def handle(self, *args, **options):
+        left_side = options['left']
+        right_side = options['right'] or self.connection_name
+        jsonl = options['format'] == FORMAT_JSONL
+        try:
+            diff = MigrationDiff(
+                self._records(left_side, options['chunk_size']),
+                self._records(right_side, options['chunk_size']),
+                max_skew=options['max_skew'],
+                left_name=left_side,
+                right_name=right_side,
+            )
+            if not jsonl:
+                print(f'Comparing {left_side} (left) with {right_side} (right)')
+            with self.profiler.phase('diff'):
+                for entry in diff.entries():
+                    print(json.dumps(self._entry_json(entry)) if jsonl else self._format_entry(entry))
+        except ValueError as e:
+            raise CommandError(str(e))
+        except OperationalError as e:
+            print(f'DB ERROR: {e}')
+            exit(1)
+
+        counts = diff.counts
+        targets = diff.targets()
+        if jsonl:
+            print(json.dumps({'event': 'summary', **counts, 'largest_skew': diff.largest_skew}))
+            for app, name in targets:
+                print(json.dumps({'event': 'target', 'app': app, 'name': name}))
+            return
+
+        largest_skew = 'n/a' if diff.largest_skew is None else f'{diff.largest_skew:.0f}s'
+        print(
+            f'Left: {counts["left"]} records, right: {counts["right"]} records, {counts["common"]} in common; '
+            f'{counts[DIFF_ONLY_LEFT]} only in left, {counts[DIFF_ONLY_RIGHT]} only in right; '
+            f'largest skew: {largest_skew}'
+        )
+        if targets:
+            print(f'Targets to converge {right_side} to {left_side}:')
+            for app, name in targets:
+                print(f'  {app} {name}')
+        else:
+            print(f'{right_side} has the same migrations as {left_side}')
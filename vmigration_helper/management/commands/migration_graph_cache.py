@@ -0,0 +1,31 @@
+from vmigration_helper.helpers.command import MigrationCommand
+from vmigration_helper.helpers.migration_graph import CachedMigrationLoader
+
+
+class Command(MigrationCommand):
+    """
+    Builds (or refreshes) the cache of the migration graph used for planning, so that later commands do not have to
+    import the migration modules of apps whose migration files have not changed.
+
+    Optional parameter:
+        --clear delete the cache before building it, so all the migration files are loaded again
+    """
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Delete the cache before building it'
+        )
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            # Load nothing, just to find out where the cache is.
+            CachedMigrationLoader(None, load=False).cache_path.unlink(missing_ok=True)
+
+        loader = CachedMigrationLoader(None)
+        print(
+            f'Migration graph cache {loader.cache_path}: {len(loader.graph.nodes)} migrations, '
+            f'{len(loader.loaded_apps)} app(s) loaded from disk, {len(loader.cached_apps)} app(s) from the cache'
+        )
@@ -1,76 +1,157 @@
+import sys
+from datetime import datetime
+from typing import Optional
+
+from django.core.management import CommandError
 from django.db import OperationalError
-from django.db.migrations.recorder import MigrationRecorder
 from django.db.models import QuerySet
 
 from vmigration_helper.helpers.command import MigrationCommand
+from vmigration_helper.helpers.migration_records import MigrationRecordsHelper
+from vmigration_helper.helpers.record_writer import (
+    FORMAT_CONSOLE, FORMATS, MigrationRecordWriter, parse_applied, RECORD_FIELDS, RecordSpool
+)
 
-FORMAT_CSV = 'csv'
-FORMAT_CONSOLE = 'console'
-DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S%z'
+CHUNK_SIZE = 2000
 
 
 class Command(MigrationCommand):
     """
     Displays all the migration records (from the ``django_migrations`` table).
 
-    Optional parameter:
-        --format ("csv" | "console") show all the records of past migrations in CSV or human-friendly format (default)
-    """
+    Records are streamed from the DB in chunks and written out in batches, so memory use does not grow with the size
+    of the table. The width of the app column of the console format is that of the longest app name of the first
+    batch, so no other query is made.
 
-    @staticmethod
-    def _format_csv(record: MigrationRecorder.Migration) -> str:
-        return f"{record.id},{record.applied.strftime(DATETIME_FORMAT)},{record.app},{record.name}"
+    When run against several connections (see "--connection-name" and "--all-connections"), the connections are
+    queried concurrently and their records are merged into one listing with a leading "Connection" column. The records
+    of each connection are streamed to a temporary file (see RecordSpool), then written out one connection after the
+    other. A connection that fails shows its error without affecting the others.
 
-    @staticmethod
-    def _format_console(record: MigrationRecorder.Migration, app_name_width: int) -> str:
-        return (
-            f"{str(record.id).rjust(6, ' ')} {record.applied.strftime(DATETIME_FORMAT).ljust(24, ' ')} "
-            f"{record.app.rjust(app_name_width, ' ')} {record.name}"
-        )
+    Optional parameters:
+        --format ("csv" | "tsv" | "jsonl" | "console") show all the records of past migrations in CSV, TSV, JSON lines
+            or human-friendly format (default)
+        --app <app> only show records of the app given (can be repeated)
+        --since-id <id> only show records with IDs greater than or equal to the ID given
+        --until-id <id> only show records with IDs less than or equal to the ID given
+        --applied-after <datetime> only show records applied after the (ISO 8601) date and time given
+        --chunk-size <n> the number of records to fetch from the DB at a time
+    """
 
-    @staticmethod
-    def _format_header_console(app_name_width: int) -> str:
-        # alloc width 6 for IDs
-        # alloc width 24 for the date: YYYY-MM-DDTHH:MM:SSZZZZZ (DATETIME_FORMAT)
-        return (
-            f"{'ID'.rjust(6, ' ')} {'Applied'.ljust(24, ' ')} "
-            f"{'App'.rjust(app_name_width, ' ')} Name"
-        )
-
-    @staticmethod
-    def _find_max_app_name_width(migration_query_set: QuerySet) -> int:
-        widths = [len(m['app']) for m in migration_query_set.values('app').distinct()]
-        if widths:
-            return max(*widths)
-        return 0
+    supports_multiple_connections = True
 
     def add_arguments(self, parser):
         super().add_arguments(parser)
         parser.add_argument(
             '--format',
             default=FORMAT_CONSOLE,
-            help=f'The format to display the migration records (csv or console). Default is: "{FORMAT_CONSOLE}"'
+            choices=FORMATS,
+            help=f'The format to display the migration records ({", ".join(FORMATS)}). Default is: "{FORMAT_CONSOLE}"'
+        )
+        parser.add_argument(
+            '--app',
+            action='append',
+            help='Only show records of this app. Can be repeated.'
+        )
+        parser.add_argument(
+            '--since-id',
+            type=int,
+            help='Only show records with IDs greater than or equal to this ID'
+        )
+        parser.add_argument(
+            '--until-id',
+            type=int,
+            help='Only show records with IDs less than or equal to this ID'
+        )
+        parser.add_argument(
+            '--applied-after',
+            help='Only show records applied after this date and time (ISO 8601, e.g. "2024-12-06T18:15:03+00:00")'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help=f'The number of records to fetch from the DB at a time. Default is: {CHUNK_SIZE}'
         )
 
+    @staticmethod
+    def _parse_applied_after(options) -> Optional[datetime]:
+        if not options['applied_after']:
+            return None
+        try:
+            applied_after = parse_applied(options['applied_after'])
+        except ValueError:
+            applied_after = None
+        if applied_after is None:
+            raise CommandError(f'Invalid date and time for --applied-after: {options["applied_after"]}')
+        return applied_after
+
+    @staticmethod
+    def _filter(migration_query_set: QuerySet, options, applied_after: Optional[datetime]) -> QuerySet:
+        if options['app']:
+            migration_query_set = migration_query_set.filter(app__in=options['app'])
+        if options['since_id'] is not None:
+            migration_query_set = migration_query_set.filter(id__gte=options['since_id'])
+        if options['until_id'] is not None:
+            migration_query_set = migration_query_set.filter(id__lte=options['until_id'])
+        if applied_after is not None:
+            migration_query_set = migration_query_set.filter(applied__gt=applied_after)
+        return migration_query_set
+
+    def _handle_multiple_connections(self, options, applied_after: Optional[datetime]) -> None:
+        print_format = options['format']
+
+        def fetch(helper: MigrationRecordsHelper) -> RecordSpool:
+            migrations_queryset = self._filter(helper.get_migration_records_qs(), options, applied_after).order_by('id')
+            spool = RecordSpool()
+            try:
+                spool.write(
+                    migrations_queryset.values_list(*RECORD_FIELDS).iterator(chunk_size=options['chunk_size']),
+                    chunk_size=options['chunk_size'],
+                )
+            except BaseException:
+                spool.close()
+                raise
+            return spool
+
+        results = self.run_for_connections(fetch)
+        spools = [result.value for result in results if not result.error]
+        try:
+            writer = MigrationRecordWriter(
+                sys.stdout,
+                print_format,
+                app_name_width=max((spool.app_name_width for spool in spools), default=0),
+                connection_width=max(len(result.alias) for result in results),
+            )
+            writer.write_header()
+            for result in results:
+                if result.error:
+                    writer.write_line(writer.format_error(result.alias, result.error))
+                else:
+                    writer.write_records(result.value.read(), connection=result.alias)
+            writer.flush()
+        finally:
+            for spool in spools:
+                spool.close()
+        if any(result.error for result in results):
+            exit(1)
+
     def handle(self, *args, **options):
+        applied_after = self._parse_applied_after(options)
+        if self.is_multiple_connections:
+            self._handle_multiple_connections(options, applied_after)
+            return
+
         print_format = options['format']
         try:
             helper = self.create_migration_helper()
-            migrations_queryset = helper.get_migration_records_qs().all()
-
-            app_name_width = 0
-            header = "ID,Applied,App,Name"
-            if print_format == FORMAT_CONSOLE:
-                app_name_width = max(self._find_max_app_name_width(migrations_queryset), 5)
-                header = self._format_header_console(app_name_width)
-
-            print(header)
-            for record in migrations_queryset:
-                if print_format == FORMAT_CSV:
-                    row = self._format_csv(record)
-                else:
-                    row = self._format_console(record, app_name_width)
-                print(row)
+            migrations_queryset = self._filter(helper.get_migration_records_qs(), options, applied_after).order_by('id')
+            writer = MigrationRecordWriter(sys.stdout, print_format, buffer_size=options['chunk_size'])
+            writer.write_header()
+            writer.write_records(
+                migrations_queryset.values_list(*RECORD_FIELDS).iterator(chunk_size=options['chunk_size'])
+            )
+            writer.flush()
         except OperationalError as e:
             print(f'DB ERROR: {e}')
             exit(1)
@@ -1,21 +1,36 @@
-import subprocess
-from typing import List
+import sys
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import List, Optional, Tuple
 
+from django.core.management import CommandError
 from django.db import OperationalError
-from django.db.migrations.recorder import MigrationRecorder
 
-from vmigration_helper.helpers.command import MigrationCommand
+from vmigration_helper.helpers.command import MigrateTargetsCommand
+from vmigration_helper.helpers.migration_record_index import IndexedRecord
+from vmigration_helper.helpers.migration_records import MigrationRecordsHelper
+from vmigration_helper.helpers.migration_runner import InProcessMigrationRunner
+from vmigration_helper.helpers.rollback_journal import (
+    clean_journals, default_journal_path, journals_dir, RollbackJournal
+)
+from vmigration_helper.helpers.rollback_plan import RollbackPlan
+from vmigration_helper.helpers.rollback_planner import PreflightIssue, RollbackPlanner, SEVERITY_ERROR
+from vmigration_helper.helpers.rollback_sql import RollbackSqlWriter
 
-MIGRATE_COMMAND = 'python manage.py migrate {app} {name}'
 
-
-class Command(MigrationCommand):
+class Command(MigrateTargetsCommand):
     """
     Rolls back migrations by unapplying entries in the migration records (django_migrations) whose IDs are greater
     than the ID provided.
 
     **NOTE**: the process is **NOT** atomic; As soon as any of the migrations fail, the process will halt. However,
-    successfully rolled-back migrations so far will remain rolled back.
+    successfully rolled-back migrations so far will remain rolled back. To avoid finding out partway, every migration
+    to be unapplied is checked before anything runs: irreversible operations (e.g. RunPython without reverse_code)
+    abort the rollback unless "--force" is given, and data operations (RunPython, RunSQL) are reported.
+
+    The targets to migrate to are planned with the migration graph on disk, so that at most one target is run per app
+    even when the records of several apps are interleaved: rolling back an app also rolls back the migrations of other
+    apps depending on it, and targets made redundant by that are skipped.
 
     For example, to roll back all migrations *after* ID 7::
 
@@ -24,10 +39,55 @@ class Command(MigrationCommand):
     Optional parameters:
 
         * --dry-run
-            only print the commands; don't run them
+            only print the commands; don't run them. The estimated duration of each command (and the total) is printed
+            from the timing history of the migrations it would unapply.
+        * --no-timing-history
+            don't record how long the migrations run take in the timing history (see TimingHistory)
         * --migrate-cmd "command template"
             use the template provided to invoke the migrations (default is "python manage.py migrate {app} {name}")
             the placeholders "{app}" and "{name}" indicate the app name and migration file name, respectively
+        * --in-process
+            run the migrations in this process (through Django's MigrationExecutor) instead of running the
+            migration command once per target. The migration graph is loaded only once for all targets.
+        * --legacy-plan
+            plan the targets by squashing contiguous records of the same app only (without the migration graph)
+        * --no-graph-cache
+            load the migration graph for planning from the migration files instead of the graph cache
+        * --jobs N
+            split the targets into groups with no dependency between them (using the migration graph) and roll back
+            up to N groups at the same time. Output lines are prefixed with the app being migrated. No new targets
+            are started after a failure, and a summary of the groups completed is printed at the end. The number of
+            concurrent jobs per connection can be capped with settings.VMIGRATION_HELPER_MAX_JOBS_PER_CONNECTION
+            (SQLite is always limited to 1). With --in-process, the groups run one at a time: the migrate signal
+            handlers and the app registry are not thread-safe.
+        * --force
+            roll back even if the pre-flight check finds irreversible operations
+        * --plan-out plan.json
+            plan the rollback and write the plan (the targets, the records rolled back and a fingerprint of all the
+            records) to the file, printing the commands without running them
+        * --plan-in plan.json
+            run a plan written with --plan-out (the ID is then optional) without planning again. The plan is only run
+            if the migration records have not changed since it was made (checked with one query).
+        * --journal journal.json
+            write the journal of the run (the plan, the targets completed with their timings, and how the run ended)
+            to the file. By default, a journal is written to "journals/rollback-<connection>-<time>.json" in the
+            state directory (settings.VMIGRATION_HELPER_STATE_DIR); its path is printed before anything runs, and it
+            is deleted once the run completes. If the default journal cannot be written, a warning is printed and the
+            rollback runs without one.
+        * --clean-journals
+            delete the journals of the connection in the "journals" directory that are completed or can no longer be
+            resumed (the migration records do not match their checkpoint), and do nothing else
+        * --resume journal.json
+            resume the run of a journal from its first incomplete target, without planning again. The run is only
+            resumed if the migration records match the checkpoint of the journal: the records up to the ID rolled back
+            to are unchanged, and the others are records being rolled back by the plan.
+        * --emit-sql rollback.sql
+            write the SQL script of the rollback to the file ("-" for stdout) instead of running it: the backwards SQL
+            of every migration to unapply (as "sqlmigrate --backwards" gives), in order, each followed by the DELETE
+            statements of its migration records. The migration graph is loaded only once (in this process), and the
+            script is wrapped in a single transaction when the database can roll back DDL. Operations whose reverse
+            cannot be written as SQL (e.g. RunPython with reverse_code) are pre-flight errors: nothing is written
+            unless "--force" is given.
 
         For example, to see the rollback commands using pipevn (without running them):
 
@@ -35,54 +95,374 @@ class Command(MigrationCommand):
 
     """
 
+    uses_migration_graph = True
+
     def add_arguments(self, parser):
         super().add_arguments(parser)
         parser.add_argument(
             'to_id',
             type=int,
+            nargs='?',
             help=(
                 'The ID of the migration record to rollback to. '
                 'All migrations done after this ID will be rolled back. '
-                'Use "migration_records" to see all records.'
+                'Use "migration_records" to see all records. Optional with --plan-in.'
+            )
+        )
+
+        parser.add_argument(
+            '--legacy-plan',
+            action='store_true',
+            help='Plan the targets by squashing contiguous records of the same app without using the migration graph'
+        )
+
+        parser.add_argument(
+            '--jobs',
+            type=int,
+            default=1,
+            help=(
+                'The max number of independent groups of targets (with no dependency between them) to roll back at '
+                'the same time, each with the migration command (with --in-process, the groups run one at a time). '
+                'Default is: 1'
             )
         )
 
         parser.add_argument(
-            '--dry-run',
+            '--force',
+            action='store_true',
+            help='Roll back even if the pre-flight check finds irreversible operations'
+        )
+
+        plan_group = parser.add_mutually_exclusive_group()
+        plan_group.add_argument(
+            '--plan-out',
+            help='Write the plan of the rollback to this file (JSON) instead of running it'
+        )
+        plan_group.add_argument(
+            '--plan-in',
+            help='Run the plan written to this file with --plan-out, if the migration records have not changed since'
+        )
+        plan_group.add_argument(
+            '--resume',
+            help='Resume the run of this journal from its first incomplete target'
+        )
+        plan_group.add_argument(
+            '--clean-journals',
             action='store_true',
-            help=f'Show the commands that would have run but do not run them'
+            help=(
+                'Delete the journals of the connection in the "journals" directory that are completed or can no longer '
+                'be resumed, and do nothing else'
+            )
         )
 
         parser.add_argument(
-            '--migrate-cmd',
-            default=MIGRATE_COMMAND,
-            help=f'The migration command template (accepts {{app}} and {{name}}). Default is: "{MIGRATE_COMMAND}"'
+            '--emit-sql',
+            help='Write the SQL script of the rollback to this file ("-" for stdout) instead of running it'
         )
 
+        parser.add_argument(
+            '--journal',
+            help=(
+                'Write the journal of the run to this file (JSON). Default is a new file in the "journals" directory '
+                'of the state directory, deleted once the run completes'
+            )
+        )
+
+    @staticmethod
+    def _plan_contiguous(
+        helper: MigrationRecordsHelper, migration_records: List[IndexedRecord]
+    ) -> List[Tuple[str, str]]:
+        squashed_migrations = helper.squash_migrations(migration_records)
+        targets = []
+        for migration in squashed_migrations:
+            previous_record = helper.previous_record(migration)
+            if previous_record:
+                targets.append((migration.app, previous_record.name))
+            else:
+                targets.append((migration.app, 'zero'))
+        return targets
+
+    def _load_plan(self, helper: MigrationRecordsHelper, path: str, rollback_to_id: Optional[int]) -> RollbackPlan:
+        """
+        Loads the plan from the file given and checks that it can be run against the current migration records.
+        """
+        try:
+            plan = RollbackPlan.load(path)
+        except ValueError as e:
+            raise CommandError(str(e))
+        if plan.connection != self.connection_name:
+            raise CommandError(f'The plan was made for connection {plan.connection}, not {self.connection_name}')
+        if rollback_to_id is not None and rollback_to_id != plan.to_id:
+            raise CommandError(f'The plan rolls back to ID {plan.to_id}, not {rollback_to_id}')
+        with self.profiler.phase('check_plan'):
+            problems = plan.check(helper.get_index())
+        if problems:
+            raise CommandError(
+                'The migration records changed since the plan was made; plan again:\n' +
+                '\n'.join(f'  {problem}' for problem in problems)
+            )
+        return plan
+
+    def _load_journal(
+        self, helper: MigrationRecordsHelper, path: str, rollback_to_id: Optional[int]
+    ) -> RollbackJournal:
+        """
+        Loads the journal from the file given and checks that the migration records match its checkpoint.
+        """
+        try:
+            journal = RollbackJournal.load(path)
+        except ValueError as e:
+            raise CommandError(str(e))
+        plan = journal.plan
+        if plan.connection != self.connection_name:
+            raise CommandError(f'The journal is of connection {plan.connection}, not {self.connection_name}')
+        if rollback_to_id is not None and rollback_to_id != plan.to_id:
+            raise CommandError(f'The journal rolls back to ID {plan.to_id}, not {rollback_to_id}')
+        with self.profiler.phase('check_journal'):
+            problems = journal.check(helper.get_index())
+        if problems:
+            raise CommandError(
+                'The migration records do not match the checkpoint of the journal:\n' +
+                '\n'.join(f'  {problem}' for problem in problems)
+            )
+        return journal
+
+    def _create_journal(
+        self, helper: MigrationRecordsHelper, plan: RollbackPlan, journal_path: Optional[str]
+    ) -> Optional[RollbackJournal]:
+        """
+        Creates the journal of the run, in the file given or the default location. Returns None (after a warning) if
+        the default journal cannot be written, so that the rollback still runs.
+        """
+        try:
+            return RollbackJournal.create(
+                journal_path or default_journal_path(self.connection_name), plan, helper.get_index()
+            )
+        except OSError as e:
+            if journal_path:
+                raise CommandError(f'Could not write the journal {journal_path}: {e}')
+            print(f'WARNING: could not write the rollback journal ({e}); rolling back without one', file=sys.stderr)
+            return None
+
+    @staticmethod
+    def _in_journals_dir(path: Path) -> bool:
+        try:
+            return path.resolve().parent == journals_dir().resolve()
+        except OSError:
+            return False
+
+    def _clean_journals(self, helper: MigrationRecordsHelper) -> None:
+        try:
+            deleted = clean_journals(self.connection_name, helper.get_index())
+        except OSError as e:
+            raise CommandError(f'Could not clean the journals: {e}')
+        for path in deleted:
+            print(f'Deleted {path}')
+        print(f'{len(deleted)} journal(s) deleted')
+
+    def _emit_sql(
+        self, runner: InProcessMigrationRunner, targets: List[Tuple[str, str]], path: str, rollback_to_id: int
+    ) -> None:
+        """
+        Writes the SQL script of the rollback to the targets to the file given ("-" for stdout).
+        """
+        description = f'Rollback of {self.connection_name} to migration record ID {rollback_to_id}'
+        with self.profiler.phase('emit_sql'):
+            try:
+                if path == '-':
+                    RollbackSqlWriter(runner, sys.stdout).write(targets, description)
+                    return
+                with open(path, 'w', encoding='utf-8') as f:
+                    count = RollbackSqlWriter(runner, f).write(targets, description)
+            except ValueError as e:
+                raise CommandError(str(e))
+        print(f'SQL to unapply {count} migration(s) written to {path}')
+
+    def _print_estimates(self, planner: RollbackPlanner, targets: List[Tuple[str, str]], migrate_cmd: str) -> None:
+        """
+        Prints the estimated duration of each target and the total, from the timing history of the migrations each
+        target would unapply.
+        """
+        timing_history = self.get_timing_history()
+        print()
+        print(f'Estimated duration (from the timing history of {self.connection_name}):')
+        total = 0.0
+        total_migrations = total_unknown = 0
+        for (app, name), unapplied in zip(targets, planner.unapplied_by_targets(targets)):
+            unapplied = unapplied or []
+            estimates = [
+                timing_history.estimate(self.connection_name, key[0], key[1], backwards=True) for key in unapplied
+            ]
+            known = [estimate for estimate in estimates if estimate is not None]
+            unknown = len(estimates) - len(known)
+            total += sum(known)
+            total_migrations += len(estimates)
+            total_unknown += unknown
+            print(
+                f'  {sum(known):8.2f}s {migrate_cmd.format(app=app, name=name)} '
+                f'({len(estimates)} migration(s), {unknown} without history)'
+            )
+        print(f'  {total:8.2f}s total ({total_unknown} of {total_migrations} migration(s) without history)')
+
+    def target_completed(self, app: str, name: str, seconds: float) -> None:
+        if self.journal:
+            self.journal.complete_target(app, name, seconds)
+
+    @staticmethod
+    def _check_preflight(issues: List[PreflightIssue], abort: bool, action: str = 'roll back') -> None:
+        """
+        Prints the issues found by the pre-flight check, and aborts if there are errors and abort is True.
+
+        :param action: what is aborted, for the error message
+        """
+        if not issues:
+            return
+        errors = [issue for issue in issues if issue.severity == SEVERITY_ERROR]
+        print(f'Pre-flight check: {len(errors)} error(s), {len(issues) - len(errors)} warning(s)')
+        for issue in issues:
+            print(f'  {issue.severity.upper()} {issue.app} {issue.name}: {issue.message}')
+        if errors and abort:
+            raise CommandError(f'Did not {action} because of the errors above; use --force to {action} anyway')
+
     def handle(self, *args, **options):
         rollback_to_id = options['to_id']
         dry_run = options['dry_run']
-        migrate_cmd = options['migrate_cmd']
+        legacy_plan = options['legacy_plan']
+        jobs = options['jobs']
+        plan_in = options['plan_in']
+        plan_out = options['plan_out']
+        force = options['force']
+        resume = options['resume']
+        journal_path = options['journal']
+        emit_sql = options['emit_sql']
+        if jobs < 1:
+            raise CommandError('--jobs must be at least 1')
+        if options['clean_journals']:
+            if rollback_to_id is not None:
+                raise CommandError('--clean-journals does not take an ID')
+        elif rollback_to_id is None and not (plan_in or resume):
+            raise CommandError('The ID to roll back to is required (unless --plan-in or --resume is given)')
+        if resume and journal_path:
+            raise CommandError('--journal cannot be given with --resume, which writes to the journal resumed')
+        if emit_sql and plan_out:
+            raise CommandError('--emit-sql cannot be given with --plan-out')
+        if emit_sql:
+            # The SQL is collected with the migration graph of an in-process runner, also used for planning.
+            options = {**options, 'in_process': True}
+        self.journal = None  # type: Optional[RollbackJournal]
 
         try:
             helper = self.create_migration_helper()
-            qs = helper.get_migration_records_qs().filter(id__gt=rollback_to_id).order_by('-id')
-            migration_records = list(qs)  # type: List[MigrationRecorder.Migration]
-            squashed_migrations = helper.squash_migrations(migration_records)
-            targets = []
-            for migration in squashed_migrations:
-                previous_migration = helper.previous_migration(migration)
-                if previous_migration:
-                    targets.append((migration.app, previous_migration.name))
+            if options['clean_journals']:
+                self._clean_journals(helper)
+                return
+            # Concurrent groups get runners of their own.
+            runner = self.create_migration_runner(helper, options) if jobs == 1 or emit_sql else None
+
+            plan = None  # type: Optional[RollbackPlan]
+            loader = None
+            if resume:
+                self.journal = self._load_journal(helper, resume, rollback_to_id)
+                plan = self.journal.plan
+                targets, groups, issues = self.journal.remaining_targets(), self.journal.remaining_groups(), plan.issues
+                print(
+                    f'Resuming {resume}: {len(plan.targets) - len(targets)} of {len(plan.targets)} target(s) '
+                    'already completed'
+                )
+            elif plan_in:
+                plan = self._load_plan(helper, plan_in, rollback_to_id)
+                targets, groups, issues = plan.targets, plan.groups, plan.issues
+            else:
+                with self.profiler.phase('planning'):
+                    migration_records = helper.get_index().range(
+                        after_id=rollback_to_id
+                    )[::-1]  # type: List[IndexedRecord]
+
+                    if not legacy_plan and migration_records or jobs > 1:
+                        # Share the graph with the in-process runner rather than loading it twice.
+                        if isinstance(runner, InProcessMigrationRunner):
+                            loader = runner.executor.loader
+                        else:
+                            loader = self.create_migration_loader(helper)
+                    if legacy_plan or not migration_records:
+                        targets = self._plan_contiguous(helper, migration_records)
+                    else:
+                        targets = RollbackPlanner(helper, loader).plan(migration_records)
+                    groups = None
+                    if jobs > 1 or plan_out:
+                        groups = RollbackPlanner(helper, loader).group_independent(targets) if loader else [targets]
+
+                issues = []  # type: List[PreflightIssue]
+                if targets:
+                    with self.profiler.phase('preflight'):
+                        if loader is None:
+                            loader = self.create_migration_loader(helper)
+                        issues = RollbackPlanner(helper, loader).preflight(targets)
+
+                if plan_out:
+                    plan = RollbackPlan.create(
+                        self.connection_name, rollback_to_id, helper.get_index(), targets, groups, issues
+                    )
+                    plan.save(plan_out)
+                    dry_run = True
+
+            if emit_sql:
+                # Migrations whose reverse cannot be written as SQL would be marked unapplied without being reversed.
+                try:
+                    issues = [*issues, *RollbackSqlWriter(runner).preflight(targets)]
+                except ValueError as e:
+                    raise CommandError(str(e))
+                # Keep the script on stdout clean.
+                with redirect_stdout(sys.stderr if emit_sql == '-' else sys.stdout):
+                    self._check_preflight(issues, abort=not force, action='write the SQL')
+            else:
+                self._check_preflight(issues, abort=not dry_run and not force)
+
+            if emit_sql:
+                self._emit_sql(runner, targets, emit_sql, plan.to_id if plan else rollback_to_id)
+                return
+
+            if not dry_run and targets:
+                if self.journal:
+                    try:
+                        self.journal.restart()
+                    except OSError as e:
+                        raise CommandError(f'Could not write the journal {self.journal.path}: {e}')
+                else:
+                    if plan is None:
+                        plan = RollbackPlan.create(
+                            self.connection_name,
+                            rollback_to_id,
+                            helper.get_index(),
+                            targets,
+                            groups or [targets],
+                            issues,
+                        )
+                    self.journal = self._create_journal(helper, plan, journal_path)
+                if self.journal:
+                    print(f'Rollback journal: {self.journal.path}')
+
+            try:
+                if runner:
+                    self.run_targets(helper, runner, targets, dry_run)
                 else:
-                    targets.append((migration.app, 'zero'))
-
-            for target in targets:
-                command_to_run = migrate_cmd.format(app=target[0], name=target[1])
-                print(command_to_run)
-                if not dry_run:
-                    subprocess.run(command_to_run, check=True, shell=True)
-                    print()
+                    self.run_target_groups(helper, options, groups, dry_run, jobs)
+            except BaseException as e:
+                if self.journal:
+                    self.journal.finish(error=str(e) or type(e).__name__)
+                    print(f'Rollback stopped; resume it with --resume {self.journal.path}')
+                raise
+            if self.journal:
+                self.journal.finish()
+                # A journal in the default location is only kept to resume a run that did not complete.
+                if not journal_path and self._in_journals_dir(self.journal.path):
+                    self.journal.delete()
+            if dry_run and targets:
+                if loader is None:
+                    loader = self.create_migration_loader(helper)
+                self._print_estimates(RollbackPlanner(helper, loader), targets, options['migrate_cmd'])
+            if plan_out:
+                print(f'Plan of {len(targets)} target(s) written to {plan_out}')
         except OperationalError as e:
             print(f'DB ERROR: {e}')
             exit(1)
@@ -0,0 +1,88 @@
+from django.core.management import CommandError
+from django.db import OperationalError
+
+from vmigration_helper.helpers.command import MigrateTargetsCommand
+from vmigration_helper.helpers.migration_snapshots import MigrationSnapshot, MigrationSnapshotStore
+
+ACTION_SAVE = 'save'
+ACTION_LIST = 'list'
+ACTION_RESTORE = 'restore'
+
+
+class Command(MigrateTargetsCommand):
+    """
+    Saves, lists and restores named snapshots of the migration state (the latest migration applied per app and the
+    max ID of the migration records).
+
+    For example, to save the state before deploying, and go back to it if needed::
+
+        python manage.py migration_snapshot save before-deploy
+        python manage.py migration_snapshot restore before-deploy
+
+    Snapshots are stored per connection in a local JSON file ("snapshots.json" in the state directory of this app, see
+    ``settings.VMIGRATION_HELPER_STATE_DIR``) unless "--snapshot-file" is given.
+
+    Restoring compares the latest migration of each app in the snapshot with the current records (read with one
+    query) and migrates each app that differs back to its snapshot migration, so it does not depend on record IDs
+    and stays correct after records have been deleted (e.g. with migration_delete).
+
+    Optional parameters (for "restore"):
+
+        * --dry-run
+            only print the commands; don't run them
+        * --migrate-cmd "command template"
+            use the template provided to invoke the migrations (default is "python manage.py migrate {app} {name}")
+        * --in-process
+            run the migrations in this process instead of running the migration command once per target
+    """
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            'action',
+            choices=(ACTION_SAVE, ACTION_LIST, ACTION_RESTORE),
+            help='What to do: save a snapshot, list the snapshots or restore a snapshot'
+        )
+        parser.add_argument(
+            'name',
+            nargs='?',
+            help='The name of the snapshot to save or restore'
+        )
+        parser.add_argument(
+            '--snapshot-file',
+            help='The file to store the snapshots in. Defaults to "snapshots.json" in the state directory of this app.'
+        )
+
+    def handle(self, *args, **options):
+        action = options['action']
+        name = options['name']
+        if action != ACTION_LIST and not name:
+            raise CommandError(f'A snapshot name is required to {action} a snapshot')
+
+        store = MigrationSnapshotStore(options['snapshot_file'], connection_name=self.connection_name)
+        if action == ACTION_LIST:
+            for snapshot in store.list():
+                print(f'{snapshot.name} (ID {snapshot.max_id}, {len(snapshot.applied)} apps, created {snapshot.created})')
+            return
+
+        try:
+            helper = self.create_migration_helper()
+            if action == ACTION_SAVE:
+                snapshot = MigrationSnapshot.capture(name, helper.get_index())
+                replaced = store.save(snapshot)
+                print(f'Snapshot {name} {"replaced" if replaced else "saved"} at ID {snapshot.max_id}')
+                return
+
+            snapshot = store.get(name)
+            if snapshot is None:
+                raise CommandError(f'No snapshot named {name} for connection {self.connection_name}')
+            with self.profiler.phase('planning'):
+                targets = snapshot.plan_restore(helper.get_index())
+            if not targets:
+                print(f'Already at snapshot {name}')
+                return
+            runner = self.create_migration_runner(helper, options)
+            self.run_targets(helper, runner, targets, options['dry_run'])
+        except OperationalError as e:
+            print(f'DB ERROR: {e}')
+            exit(1)
@@ -0,0 +1,79 @@
+import json
+
+from vmigration_helper.helpers.command import MigrationCommand
+from vmigration_helper.helpers.timing_history import BACKWARDS, FORWARDS, TimingHistory
+
+DEFAULT_LIMIT = 20
+
+FORMAT_CONSOLE = 'console'
+FORMAT_JSONL = 'jsonl'
+FORMATS = (FORMAT_CONSOLE, FORMAT_JSONL)
+
+
+class Command(MigrationCommand):
+    """
+    Lists the slowest migrations of a connection according to the timing history, which "migration_rollback" and
+    "migration_snapshot restore" add to whenever they run migrations. Migrations are ordered by their median duration.
+
+    No query is made: the timing history is kept in the state directory of this app.
+
+    Optional parameters:
+        --limit <n> the number of migrations to list (default is 20; 0 for all)
+        --direction ("backwards" | "forwards") only list the durations of unapplying (or applying) migrations
+        --app <app> only list migrations of the app given (can be repeated)
+        --format ("console" | "jsonl") show the migrations in human-friendly format (default) or as JSON lines
+    """
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=DEFAULT_LIMIT,
+            help=f'The number of migrations to list (0 for all). Default is: {DEFAULT_LIMIT}'
+        )
+        parser.add_argument(
+            '--direction',
+            choices=(BACKWARDS, FORWARDS),
+            help='Only list the durations of unapplying (backwards) or applying (forwards) migrations'
+        )
+        parser.add_argument(
+            '--app',
+            action='append',
+            help='Only list migrations of this app. Can be repeated.'
+        )
+        parser.add_argument(
+            '--format',
+            default=FORMAT_CONSOLE,
+            choices=FORMATS,
+            help=f'The format to display the migrations ({", ".join(FORMATS)}). Default is: "{FORMAT_CONSOLE}"'
+        )
+
+    def handle(self, *args, **options):
+        stats = [
+            stat for stat in TimingHistory().stats(self.connection_name)
+            if (not options['direction'] or stat.direction == options['direction'])
+            and (not options['app'] or stat.app in options['app'])
+        ]
+        stats.sort(key=lambda stat: stat.median, reverse=True)
+        if options['limit']:
+            stats = stats[:options['limit']]
+
+        if options['format'] == FORMAT_JSONL:
+            for stat in stats:
+                print(json.dumps(stat._asdict()))
+            return
+
+        if not stats:
+            print(f'No timing history for {self.connection_name}.')
+            return
+        migration_width = max(len(f'{stat.app} {stat.name}') for stat in stats)
+        print(
+            f"{'Median'.rjust(9)} {'Max'.rjust(9)} {'Last'.rjust(9)} {'Runs'.rjust(5)} {'Direction'.ljust(9)} "
+            f"{'Migration'.ljust(migration_width)} Last run"
+        )
+        for stat in stats:
+            print(
+                f'{stat.median:8.2f}s {stat.max:8.2f}s {stat.last:8.2f}s {stat.runs:5} {stat.direction.ljust(9)} '
+                f'{f"{stat.app} {stat.name}".ljust(migration_width)} {stat.last_run}'
+            )
@@ -0,0 +1,137 @@
+import json
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from django.core.management import CommandError
+from django.db import connections, DatabaseError
+from django.db.migrations.recorder import MigrationRecorder
+
+from vmigration_helper.helpers.command import MigrationCommand
+from vmigration_helper.helpers.migration_records import MigrationRecordsHelper
+from vmigration_helper.helpers.migration_watcher import MigrationWatcher
+
+DEFAULT_INTERVAL = 1.0
+DEFAULT_MAX_INTERVAL = 30.0
+BACKOFF_FACTOR = 2
+
+
+class Command(MigrationCommand):
+    """
+    Watches the migration records (the ``django_migrations`` table) and writes a JSON line for each record added or
+    removed, e.g. to alert when migrations are applied or unapplied anywhere.
+
+    Each connection is polled with a cheap query of its max ID and row count; only the records that changed are
+    fetched. The polling interval starts at "--interval" and doubles (up to "--max-interval") for as long as nothing
+    changes, going back to "--interval" after a change. Several connections (see "--connection-name" and
+    "--all-connections") are watched concurrently, each with its own connection and interval.
+
+    Lines written::
+
+        {"event": "watching", "connection": "default", "max_id": 18, "count": 18, "time": "..."}
+        {"event": "added", "connection": "default", "id": 19, "app": "myapp", "name": "0004_...", "applied": "...",
+         "time": "..."}
+        {"event": "removed", "connection": "default", "id": 19, "app": "myapp", "name": "0004_...", "time": "..."}
+        {"event": "error", "connection": "default", "error": "...", "time": "..."}
+
+    Optional parameters:
+        --interval <seconds> the shortest time between polls (default is 1)
+        --max-interval <seconds> the longest time between polls (default is 30)
+        --polls <n> stop after polling each connection n times, not counting the initial load (default is to run until
+            interrupted)
+    """
+
+    supports_multiple_connections = True
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=DEFAULT_INTERVAL,
+            help=f'The shortest time (in seconds) between polls. Default is: {DEFAULT_INTERVAL}'
+        )
+        parser.add_argument(
+            '--max-interval',
+            type=float,
+            default=DEFAULT_MAX_INTERVAL,
+            help=(
+                'The longest time (in seconds) between polls while nothing changes. '
+                f'Default is: {DEFAULT_MAX_INTERVAL}'
+            )
+        )
+        parser.add_argument(
+            '--polls',
+            type=int,
+            default=0,
+            help='Stop after polling each connection this many times. Default is to run until interrupted.'
+        )
+
+    def _emit(self, event: Dict[str, Any]) -> None:
+        line = json.dumps({**event, 'time': datetime.now(timezone.utc).isoformat(timespec='seconds')})
+        with self._lock:
+            sys.stdout.write(line + '\n')
+            sys.stdout.flush()
+
+    def _watch(self, alias: str, options) -> None:
+        """
+        Polls the connection given until stopped (or the number of polls is reached).
+        """
+        connection = connections[alias]
+        interval = options['interval']
+        polls = 0
+        watcher = None
+        try:
+            while not self._stop.is_set():
+                try:
+                    if watcher is None:
+                        connection.prepare_database()
+                        watcher = MigrationWatcher(MigrationRecordsHelper(MigrationRecorder(connection)))
+                        watcher.load()
+                        self._emit({
+                            'event': 'watching',
+                            'connection': alias,
+                            'max_id': watcher.max_id,
+                            'count': len(watcher.ids),
+                        })
+                        self._stop.wait(interval)
+                        continue
+
+                    changes = watcher.poll()
+                    for change in changes:
+                        self._emit({'event': change['event'], 'connection': alias, **change})
+                    interval = (
+                        options['interval'] if changes
+                        else min(interval * BACKOFF_FACTOR, options['max_interval'])
+                    )
+                except DatabaseError as e:
+                    self._emit({'event': 'error', 'connection': alias, 'error': str(e)})
+                    # Reconnect on the next poll.
+                    connection.close()
+                    interval = options['max_interval']
+
+                polls += 1
+                if options['polls'] and polls >= options['polls']:
+                    return
+                self._stop.wait(interval)
+        finally:
+            connection.close()
+
+    def handle(self, *args, **options):
+        if options['interval'] <= 0 or options['max_interval'] < options['interval']:
+            raise CommandError('--interval must be positive and no greater than --max-interval')
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        threads = [
+            threading.Thread(target=self._watch, args=(alias, options), daemon=True) for alias in self.connection_names
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=0.5)
+        except KeyboardInterrupt:
+            self._stop.set()
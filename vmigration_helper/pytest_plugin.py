@@ -0,0 +1,61 @@
+"""
+A pytest plugin (for use with pytest-django) that migrates the test databases back to the state they had once set up
+after each test module that changed their migrations, instead of having to recreate them. Enable it with:
+
+    pytest -p vmigration_helper.pytest_plugin
+
+or with ``pytest_plugins = ['vmigration_helper.pytest_plugin']`` in the root conftest.py.
+
+The migration state of the test databases is captured once "django_db_setup" has set them up, and resets are done in
+the test process. The time taken by the resets is compared with the time taken to set up the test databases, which is
+reported at the end of the run.
+"""
+import time
+from typing import TYPE_CHECKING, Optional
+
+import pytest
+
+if TYPE_CHECKING:
+    from vmigration_helper.helpers.migration_reset import MigrationResetter
+
+# Created on first use: the helpers can only be imported once pytest-django has set Django up.
+_resetter = None  # type: Optional['MigrationResetter']
+
+
+def _get_resetter() -> 'MigrationResetter':
+    global _resetter
+    if _resetter is None:
+        from vmigration_helper.helpers.migration_reset import MigrationResetter
+        _resetter = MigrationResetter()
+    return _resetter
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_fixture_setup(fixturedef, request):
+    if fixturedef.argname != 'django_db_setup':
+        yield
+        return
+    start = time.perf_counter()
+    outcome = yield
+    resetter = _get_resetter()
+    if outcome.excinfo is None and not resetter.captured:
+        with request.getfixturevalue('django_db_blocker').unblock():
+            resetter.capture(setup_seconds=time.perf_counter() - start)
+
+
+@pytest.fixture(scope='module', autouse=True)
+def vmigration_reset(request):
+    """
+    Resets the test databases to their captured migration state after the tests of each module.
+    """
+    django_db_blocker = request.getfixturevalue('django_db_blocker')
+    yield
+    if _resetter is not None and _resetter.captured:
+        with django_db_blocker.unblock():
+            _resetter.reset()
+
+
+def pytest_terminal_summary(terminalreporter):
+    summary = _resetter.summary() if _resetter is not None else None
+    if summary:
+        terminalreporter.write_line(summary)
@@ -0,0 +1,85 @@
+import time
+import unittest
+from itertools import groupby
+from typing import Optional
+
+from django.db import connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import iter_test_cases
+
+from vmigration_helper.helpers.migration_reset import MigrationResetter
+
+
+class MigrationResetTestSuite(unittest.TestSuite):
+    """
+    The tests of one test module (see MigrationResetTestRunner.build_suite()). When given a resetter, the suite
+    registers a reset of the test databases as a module cleanup (unittest.addModuleCleanup()) before running its tests:
+    unittest calls it when the module run before is torn down, after its tearDownClass() and tearDownModule(), and
+    reports a failed reset as an error of that module.
+    """
+
+    def __init__(self, tests=(), resetter: Optional[MigrationResetter] = None) -> None:
+        super().__init__(tests)
+        self.resetter = resetter
+
+    def _reset(self) -> None:
+        if self.resetter.captured:
+            self.resetter.reset()
+
+    def run(self, result, debug=False):
+        if self.resetter is not None:
+            unittest.addModuleCleanup(self._reset)
+        return super().run(result, debug)
+
+
+class MigrationResetTestRunner(DiscoverRunner):
+    """
+    A Django test runner that migrates the test databases back to the state they had once set up after each test
+    module that changed their migrations (e.g. by calling "migrate" to test a data migration), instead of having to
+    recreate them. Set it up with:
+
+        TEST_RUNNER = 'vmigration_helper.testing.MigrationResetTestRunner'
+
+    The migration state of the test databases is captured once they have been set up, and resets are done in this
+    process. The time taken by the resets is compared with the time taken to set up the test databases, which is
+    reported at the end of the run.
+
+    Resets are not done when tests run in parallel.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.resetter = MigrationResetter()
+
+    def build_suite(self, *args, **kwargs):
+        """
+        Splits the suite built into a MigrationResetTestSuite per run of tests of the same module, so that the
+        databases are reset between modules (not after the last one).
+        """
+        suite = super().build_suite(*args, **kwargs)
+        if self.parallel > 1:
+            return suite
+        modules = groupby(iter_test_cases(suite), key=lambda test: test.__class__.__module__)
+        return self.test_suite(
+            MigrationResetTestSuite(tests, resetter=self.resetter if position else None)
+            for position, (_, tests) in enumerate(modules)
+        )
+
+    def setup_databases(self, **kwargs):
+        start = time.perf_counter()
+        old_config = super().setup_databases(**kwargs)
+        if self.parallel > 1:
+            self.log('Migration resets are disabled when running tests in parallel.')
+        else:
+            mirrors = set(connections) - set(self.resetter.default_aliases())
+            self.resetter.capture(
+                [alias for alias in kwargs.get('aliases', connections) if alias not in mirrors],
+                setup_seconds=time.perf_counter() - start,
+            )
+        return old_config
+
+    def teardown_databases(self, old_config, **kwargs):
+        summary = self.resetter.summary()
+        if summary:
+            self.log(summary)
+        super().teardown_databases(old_config, **kwargs)
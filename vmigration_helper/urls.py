@@ -0,0 +1,9 @@
+from django.urls import path
+
+from vmigration_helper import views
+
+app_name = 'vmigration_helper'
+
+urlpatterns = [
+    path('migration-state/', views.migration_state, name='migration_state'),
+]
@@ -0,0 +1,108 @@
+import asyncio
+import hashlib
+import json
+import time
+from typing import Dict, NamedTuple, Tuple
+
+from django.conf import settings
+from django.db import connections, DatabaseError, DEFAULT_DB_ALIAS
+from django.db.migrations.recorder import MigrationRecorder
+from django.http import HttpRequest, HttpResponse, HttpResponseNotAllowed, JsonResponse
+from django.utils.http import parse_etags
+
+from vmigration_helper.helpers.migration_records import MigrationRecordsHelper
+
+STATE_TTL_SETTING = 'VMIGRATION_HELPER_STATE_TTL'
+DEFAULT_STATE_TTL = 2.0
+
+
+class CachedState(NamedTuple):
+    """
+    The migration state of a connection as served: the JSON body, its ETag and when it expires (time.monotonic()).
+    """
+
+    body: bytes
+    etag: str
+    expires: float
+
+
+class MigrationStateCache:
+    """
+    Caches the migration state of each connection for a short time (see ``settings.VMIGRATION_HELPER_STATE_TTL``), and
+    coalesces concurrent requests for a state that is not cached: the first one queries the DB and the others wait for
+    its result, so any number of concurrent probes cost one query per connection and TTL.
+    """
+
+    def __init__(self) -> None:
+        self._states = {}  # type: Dict[str, CachedState]
+        self._pending = {}  # type: Dict[str, Tuple[asyncio.AbstractEventLoop, asyncio.Task]]
+
+    def clear(self) -> None:
+        self._states.clear()
+
+    @staticmethod
+    async def _load(alias: str, ttl: float) -> CachedState:
+        helper = MigrationRecordsHelper(MigrationRecorder(connections[alias]))
+        max_id, latest = await helper.alatest_migrations()
+        body = json.dumps({'connection': alias, 'id': max_id, 'apps': latest}).encode()
+        return CachedState(body, f'"{hashlib.sha1(body).hexdigest()}"', time.monotonic() + ttl)
+
+    async def get(self, alias: str, ttl: float) -> CachedState:
+        """
+        Returns the migration state of the connection, from the cache if it has not expired.
+        """
+        state = self._states.get(alias)
+        if state and state.expires > time.monotonic():
+            return state
+
+        # Join the query already running for the connection, unless it runs in another event loop (e.g. another
+        # thread of a WSGI server).
+        loop = asyncio.get_running_loop()
+        pending = self._pending.get(alias)
+        if pending and pending[0] is loop and not pending[1].done():
+            task = pending[1]
+        else:
+            task = loop.create_task(self._load(alias, ttl))
+            self._pending[alias] = (loop, task)
+        try:
+            # Shielded so that a client going away does not cancel the query the others are waiting for.
+            state = await asyncio.shield(task)
+        finally:
+            if task.done() and self._pending.get(alias, (None, None))[1] is task:
+                del self._pending[alias]
+        self._states[alias] = state
+        return state
+
+
+state_cache = MigrationStateCache()
+
+
+async def migration_state(request: HttpRequest) -> HttpResponse:
+    """
+    Returns the migration state of a connection as JSON: the max ID of the migration records and the latest migration
+    of each app, e.g. ``{"connection": "default", "id": 18, "apps": {"admin": "0003_...", ...}}``. Meant for readiness
+    probes gating traffic on the schema being at the expected migration ID.
+
+    The connection is the default one unless given with the "connection" query parameter. The state is cached for
+    ``settings.VMIGRATION_HELPER_STATE_TTL`` seconds (default 2) and served with an ETag, so requests with a matching
+    "If-None-Match" header get an empty 304 response. If the DB cannot be queried, a 503 response is returned.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    alias = request.GET.get('connection', DEFAULT_DB_ALIAS)
+    if alias not in settings.DATABASES:
+        return JsonResponse({'error': f'Unknown connection {alias}'}, status=404)
+
+    ttl = float(getattr(settings, STATE_TTL_SETTING, DEFAULT_STATE_TTL))
+    try:
+        state = await state_cache.get(alias, ttl)
+    except DatabaseError as e:
+        return JsonResponse({'connection': alias, 'error': str(e)}, status=503)
+
+    if state.etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(state.body, content_type='application/json')
+    response['ETag'] = state.etag
+    response['Cache-Control'] = f'max-age={int(ttl)}'
+    return response